@@ -1,11 +1,13 @@
 # tests/test_all.py
 import os
+import json
 import sys
 import logging
 import unittest
 import importlib
 import inspect
 import zipfile
+import tempfile
 import traceback
 from pathlib import Path
 from contextlib import contextmanager
@@ -60,6 +62,12 @@ def cwd(path: Path):
 def project_path(*parts) -> Path:
     return ROOT.joinpath(*parts)
 
+def _wait_until(cond, timeout: float = 2.0):
+    import time
+    deadline = time.monotonic() + timeout
+    while not cond() and time.monotonic() < deadline:
+        time.sleep(0.001)
+
 
 # ------------------------------------------------------------------------------
 # КОНСТАНТЫ
@@ -287,6 +295,1464 @@ class TestCodingHygiene(unittest.TestCase):
         self.assertIn("torch", txt, "requirements.txt should contain 'torch' (pin version if needed)")
 
 
+class TestLogger(unittest.TestCase):
+    def setUp(self):
+        self.log_mod = safe_import("core.logger")
+        self.assertIsNotNone(self.log_mod, "core.logger import failed")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _read(self, path):
+        import json
+        return [json.loads(line) for line in Path(path).read_text(encoding="utf-8").splitlines()]
+
+    def test_jsonl_records_and_level_filter(self):
+        path = Path(self.tmp.name) / "app.log"
+        log = self.log_mod.Logger(path=str(path), level="info")
+        log.debug("hidden")
+        log.info("hello", user="u1")
+        log.interaction("ping", "pong")
+        log.close()
+
+        records = self._read(path)
+        self.assertEqual([r["msg"] for r in records], ["hello", "interaction"])
+        self.assertEqual(records[0]["user"], "u1")
+        self.assertEqual(records[1]["response"], "pong")
+        self.assertEqual(log.last, "[INFO] interaction")
+
+    def test_rotation_by_size(self):
+        path = Path(self.tmp.name) / "rot.log"
+        log = self.log_mod.Logger(path=str(path), max_bytes=200, backup_count=2, fsync_every=1)
+        for i in range(30):
+            log.info(f"line {i}")
+        log.close()
+        self.assertTrue(path.with_name("rot.log.1").exists(), "rotated file must exist")
+        self.assertFalse(path.with_name("rot.log.3").exists(), "backup_count must be respected")
+
+    def test_write_error_is_reported_and_writer_keeps_running(self):
+        import io
+        path = Path(self.tmp.name) / "full.log"
+        log = self.log_mod.Logger(path=str(path))
+        writer = log._writer
+        real_write, calls = writer._write, []
+
+        def flaky(records):
+            calls.append(len(records))
+            if len(calls) == 1:
+                raise OSError(28, "No space left on device")
+            real_write(records)
+
+        with mock.patch.object(writer, "_write", flaky), \
+                mock.patch("sys.stderr", new_callable=io.StringIO) as err:
+            log.info("lost")
+            _wait_until(lambda: calls)
+            log.info("kept")
+            log.close()
+        self.assertEqual([r["msg"] for r in self._read(path)], ["kept"])
+        self.assertEqual(writer.dropped, 1)
+        self.assertIn("No space left", err.getvalue())
+
+    def test_rotation_interval_counts_from_file_creation(self):
+        import json
+        import time
+        path = Path(self.tmp.name) / "old.log"
+        path.write_text(json.dumps({"ts": time.time() - 100, "msg": "old"}) + "\n", encoding="utf-8")
+        if getattr(os.stat(path), "st_birthtime", None):
+            self.skipTest("filesystem reports its own creation time")
+        log = self.log_mod.Logger(path=str(path), rotate_interval=50, backup_count=1)
+        log.info("new")
+        log.close()
+        self.assertEqual([r["msg"] for r in self._read(path.with_name("old.log.1"))], ["old"])
+        self.assertEqual([r["msg"] for r in self._read(path)], ["new"])
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.metrics")
+        self.assertIsNotNone(self.mod, "core.metrics import failed")
+
+    def test_spans_counters_and_percentiles(self):
+        m = self.mod.Metrics()
+        for _ in range(10):
+            with m.span("stage"):
+                pass
+        m.incr("hits", 3)
+
+        @m.timed("fn")
+        def fn(x):
+            return x * 2
+
+        self.assertEqual(fn(2), 4)
+        snap = m.snapshot()
+        self.assertEqual(snap["counters"]["hits"], 3)
+        self.assertEqual(snap["stages"]["stage"]["count"], 10)
+        for key in ("p50", "p95", "p99"):
+            self.assertIn(key, snap["stages"]["fn"])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            out = m.dump_json(str(Path(tmp) / "m.json"))
+            self.assertTrue(Path(out).exists())
+
+    def test_disabled_records_nothing(self):
+        m = self.mod.Metrics(enabled=False)
+        with m.span("stage"):
+            pass
+        m.incr("hits")
+        self.assertEqual(m.snapshot(), {"counters": {}, "stages": {}})
+
+
+class TestZipSegmentFile(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("memory.lazy_zip_file")
+        self.assertIsNotNone(self.mod, "memory.lazy_zip_file import failed")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.payload = bytes(range(256)) * 64
+        self.zip_path = Path(self.tmp.name) / "w.zip"
+        with zipfile.ZipFile(self.zip_path, "w", compression=zipfile.ZIP_STORED) as zf:
+            zf.writestr("other.txt", b"x" * 100)
+            zf.writestr("model.bin", self.payload)
+
+    def test_readinto_and_read(self):
+        with self.mod.ZipSegmentFile(str(self.zip_path), "model.bin") as f:
+            buf = bytearray(1000)
+            self.assertEqual(f.readinto(buf), 1000)
+            self.assertEqual(bytes(buf), self.payload[:1000])
+            self.assertEqual(f.read(24), self.payload[1000:1024])
+            f.seek(-10, os.SEEK_END)
+            self.assertEqual(f.read(), self.payload[-10:])
+            self.assertEqual(f.readinto(buf), 0)
+
+    def test_positional_reads_do_not_move_cursor(self):
+        from concurrent.futures import ThreadPoolExecutor
+        with self.mod.ZipSegmentFile(str(self.zip_path), "model.bin") as f:
+            ranges = [(i * 512, 512) for i in range(len(self.payload) // 512)][::-1]
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                chunks = list(pool.map(lambda r: f.read_at(*r), ranges))
+            self.assertEqual(chunks, [self.payload[o:o + n] for o, n in ranges])
+            self.assertEqual(f.read_many(ranges), chunks)
+            bufs = [bytearray(n) for _, n in ranges[:3]]
+            self.assertEqual(f.read_many(ranges[:3], buffers=bufs), [512, 512, 512])
+            self.assertEqual([bytes(b) for b in bufs], chunks[:3])
+            self.assertEqual(f.tell(), 0)
+
+    def test_reads_after_close_raise(self):
+        f = self.mod.ZipSegmentFile(str(self.zip_path), "model.bin")
+        f.close()
+        for call in (lambda: f.read_at(0, 10), lambda: f.readinto_at(bytearray(10), 0),
+                     lambda: f.read_many([(0, 10)]), lambda: f.read(10)):
+            with self.assertRaisesRegex(ValueError, "closed file"):
+                call()
+
+
+class TestSessionManager(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.session")
+        self.assertIsNotNone(self.mod, "core.session import failed")
+        self.now = 0.0
+
+    def _manager(self, **kwargs):
+        return self.mod.SessionManager(clock=lambda: self.now, **kwargs)
+
+    def test_unknown_id_is_not_created_silently(self):
+        sm = self._manager()
+        self.assertIsNone(sm.get_session("nope"))
+        self.assertEqual(sm.get_session("nope", create=True), {})
+        self.assertEqual(len(sm), 1)
+
+    def test_ttl_and_idle_expiry(self):
+        sm = self._manager(ttl=100, idle_timeout=10)
+        a, b = sm.start(), sm.start()
+        self.now = 8
+        sm.get_session(a)["x"] = 1
+        self.now = 15
+        self.assertIsNone(sm.get_session(b), "idle session must expire")
+        self.assertEqual(sm.get_session(a), {"x": 1})
+        for t in range(20, 110, 5):
+            self.now = t
+            sm.get_session(a)
+        self.assertIsNone(sm.get_session(a), "ttl must expire even an active session")
+        stats = sm.stats()
+        self.assertEqual((stats["expired_idle"], stats["expired_ttl"], stats["size"]), (1, 1, 0))
+
+    def test_local_edits_survive_and_idle_is_tracked_by_store(self):
+        store = safe_import("core.session_store").MemorySessionStore(max_idle=10, clock=lambda: self.now)
+        sm = self._manager(idle_timeout=10, store=store)
+        other = self._manager(store=store)
+        sid = sm.start()
+        sm.get_session(sid)["draft"] = "не сохранено"
+        self.assertEqual(sm.get_session(sid), {"draft": "не сохранено"}, "unsaved edits are not reloaded over")
+        other.get_session(sid)["n"] = 1
+        other.save(sid)
+        self.assertEqual(sm.get_session(sid), {"n": 1}, "a newer stored copy replaces the local one")
+
+        self.now = 8
+        other.get_session(sid)  # другой процесс ещё читает сессию
+        self.now = 15
+        self.assertEqual(sm.stats()["expired_idle"], 1, "local idle timer drops only the local copy")
+        self.assertEqual(store.get(sid), {"n": 1})
+        self.assertEqual(sm.get_session(sid), {"n": 1})
+        self.now = 30
+        self.assertIsNone(sm.get_session(sid), "the store expires the row by its last access")
+
+
+    def test_max_sessions_evicts_lru(self):
+        sm = self._manager(max_sessions=2)
+        a, b = sm.start(), sm.start()
+        sm.get_session(a)
+        c = sm.start()
+        self.assertIsNone(sm.get_session(b))
+        self.assertIsNotNone(sm.get_session(a))
+        self.assertIsNotNone(sm.get_session(c))
+        self.assertEqual(sm.stats()["evicted_lru"], 1)
+
+
+class TestSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.session_store")
+        self.assertIsNotNone(self.mod, "core.session_store import failed")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_two_workers_share_a_session(self):
+        SessionManager = safe_import("core.session").SessionManager
+        Store = self.mod.ShardedSQLiteSessionStore
+        store_a = Store(self.tmp.name, shards=4, cache_ttl=0)
+        store_b = Store(self.tmp.name, shards=4, cache_ttl=0)
+        self.addCleanup(store_a.close)
+        self.addCleanup(store_b.close)
+        worker_a = SessionManager(store=store_a)
+        worker_b = SessionManager(store=store_b)
+
+        sid = worker_a.start()
+        worker_a.get_session(sid)["history"] = ["Привет"]
+        worker_a.save(sid)
+        store_a.flush()
+
+        self.assertEqual(worker_b.get_session(sid), {"history": ["Привет"]})
+        self.assertTrue(worker_b.end(sid))
+        store_b.flush()
+        self.assertIsNone(worker_a.get_session(sid))
+
+    def test_survives_restart(self):
+        Store = self.mod.ShardedSQLiteSessionStore
+        store = Store(self.tmp.name, shards=2)
+        store.put("s1", {"n": 1})
+        store.close()
+        reopened = Store(self.tmp.name, shards=2)
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.get("s1"), {"n": 1})
+
+    def test_writer_survives_failed_flush_and_queue_is_capped(self):
+        import sqlite3
+        store = self.mod.ShardedSQLiteSessionStore(
+            self.tmp.name, shards=2, cache_ttl=0, flush_interval=60, max_pending=3)
+        self.addCleanup(store.close)
+        with mock.patch.object(store, "_write", side_effect=sqlite3.OperationalError("disk full")) as write, \
+                self.assertLogs("core.session_store", "ERROR"):
+            store.put("s1", {"n": 1})
+            store._wake.set()
+            _wait_until(lambda: write.call_count == 1 and "s1" in store._pending)
+            store.put("s2", {"n": 2})
+            store.put("s3", {"n": 3})
+            with self.assertRaises(sqlite3.OperationalError):
+                store.put("s4", {"n": 4})
+        self.assertTrue(store._thread.is_alive(), "writer thread keeps running")
+        self.assertEqual(sorted(store._pending), ["s1", "s2", "s3"], "failed batch is queued again")
+        store.put("s4", {"n": 4})
+        self.assertEqual(sorted(store._pending), ["s4"], "a full queue is flushed by the caller")
+        self.assertEqual(store.get("s1"), {"n": 1})
+
+    def test_touch_extends_idle_rows(self):
+        store = self.mod.ShardedSQLiteSessionStore(self.tmp.name, shards=2, cache_ttl=0, max_idle=100)
+        self.addCleanup(store.close)
+        store.put("s1", {"n": 1})
+        store.flush()
+        conn = store._conn(store._shard("s1"))
+        with conn:
+            conn.execute("UPDATE sessions SET updated = updated - 1000")
+        store.touch("s1")
+        store.flush()
+        self.assertEqual(store.get("s1"), {"n": 1})
+        self.assertEqual(store.purge_idle(), 0)
+
+
+    def test_close_closes_every_connection(self):
+        import sqlite3
+        import threading
+        store = self.mod.ShardedSQLiteSessionStore(self.tmp.name, shards=2, cache_ttl=0)
+        reader = threading.Thread(target=store.get, args=("from-thread",))
+        reader.start()
+        reader.join()
+        store.put("s1", {"n": 1})
+        store.flush()
+        _wait_until(lambda: len(store._conns) >= 3)
+        conns = list(store._conns)
+        store.close()
+        self.assertEqual(store._conns, [])
+        for conn in conns:
+            with self.assertRaises(sqlite3.ProgrammingError):
+                conn.execute("SELECT 1")
+
+
+class TestContextBuilder(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.prompt")
+        self.assertIsNotNone(self.mod, "core.prompt import failed")
+
+    def test_counts_each_message_once(self):
+        calls = []
+
+        def count(text):
+            calls.append(text)
+            return len(text.split())
+
+        cb = self.mod.ContextBuilder(max_tokens=1000, reserve=0, count_tokens=count)
+        for i in range(50):
+            cb.build(f"вопрос {i}")
+            cb.add("assistant", f"ответ {i}")
+        self.assertEqual(len(calls), 100)
+        self.assertTrue(cb.build().endswith("Assistant: ответ 49"))
+
+    def test_evicts_and_summarizes_over_budget(self):
+        cb = self.mod.ContextBuilder(
+            max_tokens=20, reserve=0, count_tokens=lambda t: len(t.split()),
+            summarize=lambda lines: f"{len(lines)} earlier",
+        )
+        for i in range(10):
+            cb.add("user", f"message number {i}")
+        self.assertLessEqual(cb.tokens, 20)
+        prompt = cb.build()
+        self.assertTrue(prompt.startswith("Summary:"))
+        self.assertIn("User: message number 9", prompt)
+        self.assertNotIn("message number 0", prompt)
+
+        restored = self.mod.ContextBuilder(max_tokens=20, reserve=0, count_tokens=lambda t: 1 / 0)
+        self.assertEqual(restored.load_dict(cb.to_dict()).build(), prompt)
+
+
+class TestMemoryFirstAnswers(unittest.TestCase):
+    def setUp(self):
+        self.mem_mod = safe_import("core.memory")
+        self.orch_mod = safe_import("core.orchestrator")
+        self.assertIsNotNone(self.mem_mod, "core.memory import failed")
+        self.assertIsNotNone(self.orch_mod, "core.orchestrator import failed")
+        self.mem = self.mem_mod.AssociativeMemory()
+        self.mem.set("Привет", "Здравствуйте! Чем могу помочь?")
+        self.mem.set("Как заменить ремень ГРМ?", "Откройте капот, найдите натяжитель, ослабьте болт...")
+
+    def test_exact_and_fuzzy_lookup(self):
+        self.assertEqual(self.mem.lookup("  привет!! ")[2], 1.0)
+        key, _, score = self.mem.lookup("как заменить ремень грм")
+        self.assertEqual(key, "Как заменить ремень ГРМ?")
+        key, _, score = self.mem.lookup("как поменять ремень ГРМ", min_score=0.7)
+        self.assertEqual(key, "Как заменить ремень ГРМ?")
+        self.assertLess(score, 1.0)
+        self.assertIsNone(self.mem.lookup("погода завтра"))
+
+    def test_delete_keeps_other_keys_with_same_norm(self):
+        mem = self.mem_mod.AssociativeMemory()
+        mem.set("Привет", "a")
+        mem.set("привет!", "b")
+        mem.delete("Привет")
+        self.assertEqual(mem.lookup("привет")[:2], ("привет!", "b"))
+        self.assertEqual(mem.lookup("привет всем", min_score=0.5)[0], "привет!")
+        mem.delete("привет!")
+        self.assertIsNone(mem.lookup("привет"))
+
+        mem.set("Привет", "a")
+        mem.set("привет!", "b")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "memory.snap")
+            mem.save_snapshot(path)
+            loaded = self.mem_mod.AssociativeMemory.load_snapshot(path)
+            loaded.delete("Привет")
+            self.assertEqual(loaded.lookup("привет")[:2], ("привет!", "b"))
+            self.assertEqual(loaded.lookup("привет всем", min_score=0.5)[0], "привет!")
+            loaded.clear()
+
+
+    def test_orchestrator_short_circuits_model(self):
+        engine = mock.Mock()
+        engine.generate.return_value = "model"
+        orch = self.orch_mod.Orchestrator(engine=engine, memory=self.mem)
+        self.assertEqual(orch.run_inference("Привет"), "Здравствуйте! Чем могу помочь?")
+        self.assertEqual(orch.run_inference("Что нового?"), "model")
+        engine.generate.assert_called_once_with("Что нового?")
+        self.assertEqual(orch.hit_ratio, 0.5)
+
+    def test_default_memory_loads_bundled_answers(self):
+        mem = self.orch_mod.default_memory()
+        self.assertEqual(mem.lookup("привет")[1], "Здравствуйте! Чем могу помочь?")
+        with mock.patch.object(self.orch_mod, "DEFAULT_MEMORY_PATHS", (Path("/nonexistent/memory.json"),)), \
+                self.assertLogs("core.orchestrator", level="WARNING"):
+            self.assertEqual(list(self.orch_mod.default_memory().items()), [])
+
+    def test_fuzzy_lookup_skips_frequent_words(self):
+        import random
+        rng = random.Random(3)
+        mem = self.mem_mod.AssociativeMemory()
+        words = ["".join(rng.choice("абвгдежзиклмнопрст") for _ in range(8)) for _ in range(3000)]
+        for w in words:
+            mem.set(f"как проверить {w}", w)
+        compared = []
+
+        class Counting(self.mem_mod.SequenceMatcher):
+            def set_seq1(self, a):
+                compared.append(a)
+                super().set_seq1(a)
+
+        with mock.patch.object(self.mem_mod, "SequenceMatcher", Counting):
+            hit = mem.lookup(f"как провертиь {words[7]}")
+        self.assertEqual(hit[1], words[7])
+        self.assertLess(len(compared), 10, "common words must not pull every key into the candidates")
+
+
+class TestIntentRouter(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.router")
+        self.assertIsNotNone(self.mod, "core.router import failed")
+
+    def test_keyword_automaton_matches_word_starts(self):
+        ac = self.mod.KeywordAutomaton()
+        ac.add("таймер", "command", 1.0)
+        ac.add("мер", "other", 1.0)
+        ac.add("поставь таймер", "command", 2.0)
+        self.assertEqual(sorted(ac.scan("поставь таймер")), [("command", 1.0), ("command", 2.0)])
+
+    def test_keyword_automaton_rebuild_does_not_duplicate_hits(self):
+        ac = self.mod.KeywordAutomaton()
+        ac.add("таймер", "command", 1.0)
+        ac.add("поставь таймер", "command", 2.0)
+        self.assertEqual(len(ac.scan("поставь таймер")), 2)
+        ac.add("погода", "weather", 1.0)
+        ac.build()
+        self.assertEqual(sorted(ac.scan("поставь таймер")), [("command", 1.0), ("command", 2.0)])
+        self.assertEqual(ac.scan("погода"), [("weather", 1.0)])
+
+    def test_routes_and_counters(self):
+        router = self.mod.IntentRouter()
+        self.assertEqual(router.route("Запомни, что масло менял в мае"), "memory")
+        self.assertEqual(router.route("включи фонарик"), "command")
+        self.assertEqual(router.route("почему стучит двигатель"), "llm")
+        router.add_rule("погода", "weather", 5.0)
+        self.assertEqual(router.route("какая погода завтра"), "weather")
+        self.assertEqual(router.counters["weather"], 1)
+
+    def test_routers_dispatch(self):
+        self.assertEqual(self.mod.SpeechRouter().route(b"\x00\x01"), "stt")
+        mem = safe_import("core.memory").AssociativeMemory()
+        mem.set("Привет", "Здравствуйте!")
+        self.assertEqual(self.mod.MemoryRouter(memory=mem).route("привет"), "memory")
+        self.assertEqual(safe_import("core.interaction").InteractionManager().route("открой настройки"), "command")
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.pipeline")
+        self.assertIsNotNone(self.mod, "core.pipeline import failed")
+
+    def test_independent_stages_run_concurrently(self):
+        import time
+        p = self.mod.Pipeline(max_workers=4)
+        p.add("a", lambda r: time.sleep(0.2) or 1)
+        p.add("b", lambda r: time.sleep(0.2) or 2)
+        p.add("sum", lambda r: r["a"] + r["b"] + r["x"], deps=("a", "b", "x"))
+        t0 = time.monotonic()
+        out = p.run({"x": 10})
+        self.assertLess(time.monotonic() - t0, 0.35)
+        self.assertEqual(out.get("sum"), 13)
+
+    def test_hedge_timeout_and_skip(self):
+        import time
+        started = []
+        p = self.mod.Pipeline(max_workers=4)
+        p.add("fast", lambda r: "cached")
+        p.add("slow", lambda r: started.append(1) or "model", delay=0.2)
+        p.hedge("answer", ("fast", "slow"))
+        p.add("stuck", lambda r: time.sleep(0.5), timeout=0.05)
+        p.add("after", lambda r: "never", deps=("stuck",))
+        out = p.run()
+        self.assertEqual(out.get("answer"), "cached")
+        self.assertEqual(started, [], "losing hedge candidate must not start")
+        self.assertIsInstance(out.errors["stuck"], self.mod.StageTimeout)
+        self.assertIsInstance(out.errors["after"], self.mod.StageSkipped)
+
+    def test_interaction_manager_prefers_memory(self):
+        import time
+        mem = safe_import("core.memory").AssociativeMemory()
+        mem.set("Привет", "Здравствуйте!")
+        engine = mock.Mock()
+        engine.generate.return_value = "model"
+        Orchestrator = safe_import("core.orchestrator").Orchestrator
+        im = safe_import("core.interaction").InteractionManager(
+            orchestrator=Orchestrator(engine=engine, memory=mem), hedge_delay=0.5)
+        self.assertEqual(im.respond(" Привет ").get("answer"), "Здравствуйте!")
+        engine.generate.assert_not_called()
+        t0 = time.monotonic()
+        self.assertEqual(im.respond("что нового").get("answer"), "model")
+        self.assertLess(time.monotonic() - t0, 0.4, "memory miss starts generate without waiting for the delay")
+
+    def test_command_and_memory_routes_skip_generation(self):
+        engine = mock.Mock()
+        engine.generate.return_value = "model"
+        commands = mock.Mock(return_value="настройки открыты")
+        mem = safe_import("core.memory").AssociativeMemory()
+        mem.set("вспомни где машина", "на парковке")
+        Orchestrator = safe_import("core.orchestrator").Orchestrator
+        im = safe_import("core.interaction").InteractionManager(
+            orchestrator=Orchestrator(engine=engine, memory=mem, commands=commands), hedge_delay=0)
+        out = im.respond("открой настройки")
+        self.assertEqual(out.get("answer"), "настройки открыты")
+        commands.assert_called_once_with("открой настройки")
+        self.assertIsInstance(out.errors["memory"], self.mod.StageSkipped)
+        self.assertEqual(im.respond("вспомни где машина").get("answer"), "на парковке")
+        out = im.respond("вспомни про масло")
+        self.assertNotIn("answer", out.results, "a memory route miss does not fall back to the model")
+        engine.generate.assert_not_called()
+        self.assertEqual(im.respond("почему стучит двигатель").get("answer"), "model")
+
+    def test_respond_generates_through_single_flight(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        gate = threading.Event()
+        engine = mock.Mock()
+        engine.generate.side_effect = lambda t: gate.wait(1) and "model"
+        Orchestrator = safe_import("core.orchestrator").Orchestrator
+        orch = Orchestrator(engine=engine, memory=safe_import("core.memory").AssociativeMemory())
+        im = safe_import("core.interaction").InteractionManager(orchestrator=orch, hedge_delay=0, max_workers=8)
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [pool.submit(im.respond, text) for text in ("Как дела?", "как дела", "КАК ДЕЛА")]
+            _wait_until(lambda: orch._flight.stats()["shared"] >= 2)
+            gate.set()
+            self.assertEqual([f.result().get("answer") for f in futures], ["model"] * 3)
+        self.assertEqual(engine.generate.call_count, 1)
+        self.assertEqual(orch.memory_misses, 3, "memory is consulted once per request")
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.singleflight")
+        self.assertIsNotNone(self.mod, "core.singleflight import failed")
+
+    def test_concurrent_identical_calls_share_one_computation(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        gate = threading.Event()
+        calls = []
+
+        def slow(x):
+            calls.append(x)
+            gate.wait(1)
+            return x * 2
+
+        sf = self.mod.SingleFlight()
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            futures = [pool.submit(sf.do, "k", slow, 21) for _ in range(5)]
+            _wait_until(lambda: sf.stats()["shared"] >= 4)
+            gate.set()
+            self.assertEqual([f.result() for f in futures], [42] * 5)
+        self.assertEqual(calls, [21])
+        self.assertEqual(sf.stats(), {"calls": 1, "shared": 4, "in_flight": 0})
+
+    def test_orchestrator_dedupes_only_configured_routes(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        gate = threading.Event()
+        engine = mock.Mock()
+        engine.generate.side_effect = lambda t: gate.wait(1) and "ok"
+        orch = safe_import("core.orchestrator").Orchestrator(
+            engine=engine, memory=safe_import("core.memory").AssociativeMemory())
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [pool.submit(orch.run_inference, t) for t in ("Что нового?", "что нового", "ЧТО НОВОГО")]
+            _wait_until(lambda: orch._flight.stats()["shared"] >= 2)
+            gate.set()
+            self.assertEqual({f.result() for f in futures}, {"ok"})
+        self.assertEqual(engine.generate.call_count, 1)
+        orch.run_inference("что нового", route="unknown")
+        self.assertEqual(engine.generate.call_count, 2)
+
+    def test_run_inference_dispatches_on_route(self):
+        engine = mock.Mock()
+        engine.generate.return_value = "model"
+        commands = mock.Mock(return_value="done")
+        orch = safe_import("core.orchestrator").Orchestrator(
+            engine=engine, memory=safe_import("core.memory").AssociativeMemory(), commands=commands)
+        self.assertEqual(orch.run_inference("включи фонарик", route="command"), "done")
+        self.assertIsNone(orch.run_inference("вспомни про масло", route="memory"))
+        engine.generate.assert_not_called()
+        self.assertEqual(orch.submit("почему стучит", route="llm").result(timeout=5), "model")
+
+    def test_respond_passes_routed_route(self):
+        engine = mock.Mock()
+        engine.generate.return_value = "ok"
+        orch = safe_import("core.orchestrator").Orchestrator(
+            engine=engine, memory=safe_import("core.memory").AssociativeMemory())
+        im = safe_import("core.interaction").InteractionManager(orchestrator=orch, hedge_delay=0)
+        with mock.patch.object(orch, "run_inference", wraps=orch.run_inference) as run:
+            im.respond("открой настройки")
+            im.respond("почему стучит двигатель")
+        self.assertEqual([c.kwargs["route"] for c in run.call_args_list], ["llm"], "commands bypass generation")
+        self.assertEqual(orch._flight.stats()["calls"], 1, "only the llm route is coalesced")
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.scheduler")
+        self.assertIsNotNone(self.mod, "core.scheduler import failed")
+
+    def test_background_cannot_starve_interactive(self):
+        import threading
+        gate = threading.Event()
+        sched = self.mod.Scheduler(workers=2, reserved_interactive=1, queue_limits={"background": 2})
+        self.addCleanup(sched.shutdown, False)
+        self.addCleanup(gate.set)
+        bg = [sched.submit(gate.wait, 2, priority=self.mod.BACKGROUND)]
+        _wait_until(lambda: sched.stats()["running_background"] == 1)
+        bg += [sched.submit(gate.wait, 2, priority=self.mod.BACKGROUND) for _ in range(3)]
+        self.assertEqual(bg[-1].result(1), self.mod.busy("queue_full"))
+        self.assertEqual(sched.stats()["queue_depth"]["background"], 2)
+        self.assertEqual(sched.submit(lambda: "chat").result(1), "chat")
+        gate.set()
+        self.assertTrue(all(f.result(2) for f in bg[:3]))
+
+    def test_session_rate_limit(self):
+        sched = self.mod.Scheduler(workers=1, session_rate=0.001, session_burst=2)
+        self.addCleanup(sched.shutdown, False)
+        results = [sched.submit(lambda: "ok", session_id="s1").result(1) for _ in range(3)]
+        self.assertEqual(results[:2], ["ok", "ok"])
+        self.assertEqual(results[2], self.mod.busy("rate_limited"))
+        self.assertEqual(sched.submit(lambda: "ok", session_id="s2").result(1), "ok")
+        self.assertEqual(sched.stats()["shed_rate_limited"], 1)
+
+    def test_single_worker_keeps_reserve_and_shutdown_cancels_queue(self):
+        import threading
+        gate = threading.Event()
+        self.addCleanup(gate.set)
+        sched = self.mod.Scheduler(workers=1, reserved_interactive=1)
+        bg = sched.submit(gate.wait, 2, priority=self.mod.BACKGROUND)
+        queued = sched.submit(gate.wait, 2, priority=self.mod.BACKGROUND)
+        self.assertEqual(sched.submit(lambda: "chat").result(1), "chat")
+        with self.assertRaisesRegex(ValueError, "priority"):
+            sched.submit(lambda: None, priority="urgent")
+        sched.shutdown(wait=False)
+        self.assertTrue(queued.cancelled())
+        with self.assertRaises(RuntimeError):
+            sched.submit(lambda: None)
+        gate.set()
+        self.assertTrue(bg.result(2))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.errors")
+        self.assertIsNotNone(self.mod, "core.errors import failed")
+        self.now = 0.0
+
+    def test_opens_fails_fast_and_recovers(self):
+        eh = self.mod.ErrorHandler(min_calls=2, failure_rate=0.5, reset_timeout=10, clock=lambda: self.now)
+        calls = []
+
+        def flaky(ok):
+            calls.append(ok)
+            if not ok:
+                raise IOError("engine down")
+            return "audio"
+
+        wrapped = eh.wrap(flaky, name="tts", fallback="silence")
+        self.assertEqual(wrapped(False), "silence")
+        self.assertEqual(wrapped(False), "silence")
+        self.assertEqual(eh.breaker("tts").state, self.mod.OPEN)
+        self.assertEqual(wrapped(True), "silence")
+        self.assertEqual(len(calls), 2, "open circuit must not call the dependency")
+
+        self.now = 11
+        self.assertEqual(eh.breaker("tts").state, self.mod.HALF_OPEN)
+        self.assertEqual(wrapped(True), "audio")
+        self.assertEqual(eh.breaker("tts").state, self.mod.CLOSED)
+
+    def test_retries_and_async(self):
+        import asyncio
+        eh = self.mod.ErrorHandler(retries=2, backoff=0.001)
+        attempts = []
+
+        def eventually():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise ValueError("nope")
+            return "ok"
+
+        self.assertEqual(eh.wrap(eventually, "flaky")(), "ok")
+
+        async def broken():
+            raise ValueError("bad")
+
+        self.assertEqual(asyncio.run(eh.wrap(broken, "broken", retries=0)()), "ValueError: bad")
+        self.assertEqual(asyncio.run(eh.wrap(broken, retries=0)()), "ValueError: bad")
+        # без имени у каждой функции свой выключатель
+        eh2 = self.mod.ErrorHandler(min_calls=1, failure_rate=1.0)
+        f1, f2 = eh2.wrap(lambda: 1 / 0), eh2.wrap(lambda: "ok")
+        f1()
+        self.assertEqual(f2(), "ok")
+
+    def test_tripped_retry_raises_original_error_without_sleeping(self):
+        eh = self.mod.ErrorHandler(retries=3, min_calls=1, failure_rate=1.0)
+        calls = []
+
+        def broken():
+            calls.append(1)
+            raise ValueError("bad")
+
+        with mock.patch.object(self.mod.time, "sleep") as sleep:
+            with self.assertRaisesRegex(ValueError, "bad"):
+                eh.call("dep", broken)
+        self.assertEqual((len(calls), sleep.call_count), (1, 0))
+
+    def test_interrupted_probe_releases_slot(self):
+        eh = self.mod.ErrorHandler(min_calls=1, failure_rate=1.0, reset_timeout=10, clock=lambda: self.now)
+        with self.assertRaises(ValueError):
+            eh.call("dep", mock.Mock(side_effect=ValueError("bad")))
+        self.now = 11
+        with self.assertRaises(KeyboardInterrupt):
+            eh.call("dep", mock.Mock(side_effect=KeyboardInterrupt))
+        self.assertEqual(eh.call("dep", lambda: "ok"), "ok")
+        self.assertEqual(eh.breaker("dep").state, self.mod.CLOSED)
+
+
+class TestAudioCache(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.audio_cache")
+        self.assertIsNotNone(self.mod, "core.audio_cache import failed")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_tts_reuses_cached_audio(self):
+        tts_mod = safe_import("core.tts")
+        tts = tts_mod.TTS(cache=self.mod.AudioCache(self.tmp.name))
+        with mock.patch.object(tts, "_render", wraps=tts._render) as render:
+            first = tts.synthesize("Здравствуйте!")
+            self.assertEqual(tts.synthesize("Здравствуйте!"), first)
+            self.assertEqual(render.call_count, 1)
+        tts.cache.close()
+
+        reopened = tts_mod.TTS(cache=self.mod.AudioCache(self.tmp.name))
+        with mock.patch.object(reopened, "_render") as render:
+            self.assertEqual(reopened.synthesize("Здравствуйте!"), first)
+            render.assert_not_called()
+        reopened.cache.close()
+        self.assertNotEqual(self.mod.audio_key("x", rate=1.0), self.mod.audio_key("x", rate=1.5))
+
+    def test_byte_budgets(self):
+        cache = self.mod.AudioCache(self.tmp.name, memory_bytes=3000, disk_bytes=6000)
+        self.addCleanup(cache.close)
+        for i in range(20):
+            cache.put(self.mod.audio_key(str(i)), os.urandom(1000))
+        stats = cache.stats()
+        self.assertLessEqual(stats["memory_bytes"], 3000)
+        self.assertLessEqual(stats["disk_bytes"], 6000)
+        self.assertIsNotNone(cache.get(self.mod.audio_key("19")))
+        self.assertIsNone(cache.get(self.mod.audio_key("0")))
+
+
+class TestLongFormSTT(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.stt")
+        self.assertIsNotNone(self.mod, "core.stt import failed")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _wav(self, pattern, rate=8000):
+        import math
+        import struct
+        import wave
+        frames = bytearray()
+        for seconds, loud in pattern:
+            for i in range(int(seconds * rate)):
+                v = int(12000 * math.sin(2 * math.pi * 440 * i / rate)) if loud else 0
+                frames += struct.pack("<h", v)
+        path = Path(self.tmp.name) / "long.wav"
+        with wave.open(str(path), "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(rate)
+            w.writeframes(bytes(frames))
+        return str(path)
+
+    def test_segments_cut_on_silence_with_overlap(self):
+        import mmap
+        path = self._wav([(2.5, True), (0.5, False), (2.5, True), (0.5, False), (2.5, True)])
+        with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            layout = self.mod.read_wav_layout(mm)
+            segs = self.mod.plan_segments(mm, layout, segment_seconds=2.5, overlap_seconds=0.1, search_seconds=1.0)
+        bps = layout.rate * layout.frame_bytes
+        self.assertEqual(len(segs), 3)
+        for (_, end), silence_at in zip(segs, (2.5, 5.5)):
+            cut = (end - layout.data_offset) / bps - 0.1
+            self.assertTrue(silence_at <= cut <= silence_at + 0.5, f"cut at {cut:.2f}s is not in silence")
+        self.assertLess(segs[1][0], segs[0][1], "segments must overlap")
+
+    def test_from_file_long_form_and_stitch(self):
+        path = self._wav([(1.0, True)] * 6)
+        stt = self.mod.STT()
+        self.assertEqual(stt.from_file(path, segment_seconds=10), "<text:from_file>")
+        self.assertEqual(stt.from_file(path, long_form=True, segment_seconds=1.0, workers=2), "<text>")
+        self.assertEqual(self.mod.stitch(["раз два три", "два три четыре", "пять"]), "раз два три четыре пять")
+
+    def test_segments_reach_the_same_instance_as_wav_with_lang(self):
+        import threading
+        path = self._wav([(1.0, True)] * 4, rate=16000)
+        seen = []
+
+        class Recorder(self.mod.STT):
+            lock = threading.Lock()  # не сериализуется — отрезки идут в потоках
+
+            def transcribe(self, audio_bytes, lang=None):
+                layout = read_wav_layout(audio_bytes)
+                seen.append((layout.rate, layout.sampwidth, layout.data_size, lang))
+                return "слово"
+
+        read_wav_layout = self.mod.read_wav_layout
+        Recorder().from_file(path, lang="ru", long_form=True, segment_seconds=1.0, overlap_seconds=0.0, workers=2)
+        self.assertGreater(len(seen), 1)
+        self.assertEqual({s[:2] + s[3:] for s in seen}, {(16000, 2, "ru")})
+        self.assertEqual(sum(s[2] for s in seen), 4 * 16000 * 2)
+
+    def test_segment_shorter_than_search_window_terminates(self):
+        import mmap
+        path = self._wav([(1.0, True)] * 12)
+        with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            layout = self.mod.read_wav_layout(mm)
+            segs = self.mod.plan_segments(mm, layout, segment_seconds=4.0, overlap_seconds=0.0, search_seconds=5.0)
+            with self.assertRaises(ValueError):
+                self.mod.plan_segments(mm, layout, segment_seconds=0)
+        self.assertGreaterEqual(segs[0][0], layout.data_offset)
+        self.assertTrue(all(a < b for a, b in segs))
+        self.assertTrue(all(s1[1] <= s2[1] for s1, s2 in zip(segs, segs[1:])))
+        self.assertEqual(self.mod.STT().from_file(path, long_form=True, segment_seconds=4.0, workers=1), "<text>")
+
+
+class TestTiledVision(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.vision")
+        self.assertIsNotNone(self.mod, "core.vision import failed")
+
+    def test_tiles_cover_frame_with_overlap(self):
+        tiles = self.mod.iter_tiles(1000, 1500, tile=640, overlap=0.25)
+        self.assertIn(1500, {t[2] for t in tiles})
+        self.assertEqual(max(t[3] for t in tiles), 1000)
+        for x0, y0, x1, y1 in tiles:
+            self.assertLessEqual(x1 - x0, 640)
+            self.assertLessEqual(y1 - y0, 640)
+        self.assertEqual(self.mod.iter_tiles(100, 100, tile=640), [(0, 0, 100, 100)])
+
+    def test_tiled_detect_merges_duplicates(self):
+        if self.mod.np is None:
+            self.skipTest("numpy not installed — tiled detection requires it")
+        np = self.mod.np
+        image = np.zeros((1200, 1200, 3), dtype=np.uint8)
+        vision = self.mod.Vision()
+        # Один и тот же объект виден в двух соседних тайлах
+        seen = []
+
+        def fake(img):
+            seen.append(img.base is not None)
+            return [{"bbox": [0, 0, 50, 50], "label": "bolt", "score": 0.8}]
+
+        with mock.patch.object(vision, "_detect_single", side_effect=fake):
+            dets = vision.detect(image, tile=640, overlap=0.5, workers=2)
+        self.assertTrue(all(seen), "tiles must be views, not copies")
+        self.assertEqual(len(dets), len({tuple(d["bbox"]) for d in dets}))
+        keep = self.mod.nms([[0, 0, 10, 10], [1, 1, 10, 10], [20, 20, 30, 30]], [0.9, 0.8, 0.7])
+        self.assertEqual(keep, [0, 2])
+
+    def test_image_key_accepts_strided_views(self):
+        if self.mod.np is None:
+            self.skipTest("numpy not installed")
+        np = self.mod.np
+        frame = np.arange(48, dtype=np.uint8).reshape(4, 4, 3)
+        left, right = frame[:, ::2], frame[:, 1::2]
+        self.assertEqual(self.mod.image_key(left), self.mod.image_key(left.copy()))
+        self.assertNotEqual(self.mod.image_key(left), self.mod.image_key(right))
+        self.assertNotEqual(self.mod.image_key(frame), self.mod.image_key(frame.reshape(8, 6)))
+        self.assertEqual(self.mod.Vision().analyze(left)["labels"], ["object"])
+
+
+class TestPdfIngest(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.ingest")
+        self.memmod = safe_import("core.memory")
+        self.assertIsNotNone(self.mod, "core.ingest import failed")
+
+    def test_only_changed_pages_are_reindexed(self):
+        # Вместо PDF — текстовый файл, страницы разделены \f
+        calls = []
+
+        def pages(path):
+            return Path(path).read_text(encoding="utf-8").split("\f")
+
+        def extract(path, start, end):
+            calls.append((start, end))
+            return [(i + 1, t) for i, t in enumerate(pages(path)[start:end], start)]
+
+        with tempfile.TemporaryDirectory() as d:
+            doc = Path(d) / "manual.pdf"
+            doc.write_text("Замена ремня ГРМ каждые 60000 км\fМасло двигателя 5W-30\fТормозная жидкость DOT4", encoding="utf-8")
+            memory = self.memmod.AssociativeMemory()
+            ing = self.mod.Ingestor(memory, manifest_path=os.path.join(d, "manifest.json"), workers=1,
+                                    pages_per_task=2, extract_range=extract, count_pages=lambda p: len(pages(p)))
+            stats = ing.ingest_dir(d)
+            self.assertEqual((stats["pages"], stats["changed_pages"]), (3, 3))
+            self.assertEqual(calls, [(0, 2), (2, 3)])
+            self.assertTrue(memory.find("ремня ГРМ")[0][0].endswith("#p1:0"))
+
+            self.assertEqual(ing.ingest_dir(d)["skipped"], 1)
+            doc.write_text("Замена ремня ГРМ каждые 60000 км\fМасло двигателя 0W-20", encoding="utf-8")
+            stats = self.mod.Ingestor(memory, manifest_path=os.path.join(d, "manifest.json"), workers=1,
+                                      extract_range=extract, count_pages=lambda p: len(pages(p))).ingest_dir(d)
+            self.assertEqual((stats["pages"], stats["changed_pages"]), (2, 1))
+            self.assertEqual(memory.find("0W-20")[0][1], "Масло двигателя 0W-20")
+            self.assertEqual(memory.find("тормозная жидкость"), [])
+
+            # Манифест есть, а память новая (не сохранялась) — файл индексируется заново
+            fresh = self.memmod.AssociativeMemory()
+            stats = self.mod.Ingestor(fresh, manifest_path=os.path.join(d, "manifest.json"), workers=1,
+                                      extract_range=extract, count_pages=lambda p: len(pages(p))).ingest_dir(d)
+            self.assertEqual((stats["skipped"], stats["changed_pages"]), (0, 2))
+            self.assertEqual(fresh.find("0W-20")[0][1], "Масло двигателя 0W-20")
+
+    def test_chunks_overlap_and_cover_text(self):
+        text = " ".join(f"w{i}" for i in range(300))
+        chunks = self.mod.chunk_text(text, size=100, overlap=20)
+        self.assertTrue(all(len(c) <= 100 for c in chunks))
+        self.assertEqual(chunks[0].split()[0], "w0")
+        self.assertEqual(chunks[-1].split()[-1], "w299")
+        self.assertIn(chunks[0].split()[-1], chunks[1].split())
+
+
+class TestEncryptedStore(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.crypto_store")
+        self.assertIsNotNone(self.mod, "core.crypto_store import failed")
+        if self.mod.AESGCM is None:
+            self.skipTest("cryptography not installed")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "memory.enc")
+        self.cipher = self.mod.Cipher(os.urandom(32))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_random_access_and_crash_recovery(self):
+        store = self.mod.EncryptedStore(self.path, self.cipher)
+        for i in range(50):
+            store.put(f"k{i}", {"answer": f"v{i}"})
+        store.delete("k3")
+        store.flush()
+        store.put("late", "после индекса")
+        store.sync()
+        store._fh.close()  # «падение» без записи индекса
+
+        raw = Path(self.path).read_bytes()
+        self.assertNotIn(b"v10", raw)
+        store = self.mod.EncryptedStore(self.path, self.cipher)
+        self.assertEqual(store.get("k10"), {"answer": "v10"})
+        self.assertIsNone(store.get("k3"))
+        self.assertEqual(store.get("late"), "после индекса")
+        with mock.patch.object(self.cipher, "decrypt", wraps=self.cipher.decrypt) as dec:
+            store.get("k42")
+        self.assertEqual(dec.call_count, 1)
+        store.close()
+
+    def test_reencrypt_and_tamper_detection(self):
+        store = self.mod.EncryptedStore(self.path, self.cipher)
+        store.put("a", 1)
+        store.put("a", 2)
+        new = self.mod.Cipher(os.urandom(32))
+        store.reencrypt(new)
+        self.assertEqual(store.get("a"), 2)
+        store.close()
+        with self.assertRaises(Exception):
+            self.mod.EncryptedStore(self.path, self.cipher)
+
+    def test_global_memory_appends_instead_of_rewriting(self):
+        gm_mod = safe_import("core.global_memory")
+        gm = gm_mod.GlobalMemory(self.path, cipher=self.cipher)
+        gm.update("x", 1)
+        size = os.path.getsize(self.path)
+        gm.update("y", 2)
+        self.assertLess(os.path.getsize(self.path) - size, 100)
+        gm.close()
+        again = gm_mod.GlobalMemory(self.path, cipher=self.cipher)
+        self.assertEqual(again.get("y"), 2)
+        self.assertEqual(again.load(), {"x": 1, "y": 2})
+        again.close()
+
+    def test_global_memory_save_without_load_keeps_stored_keys(self):
+        gm_mod = safe_import("core.global_memory")
+        gm = gm_mod.GlobalMemory(self.path, cipher=self.cipher)
+        gm.bulk_load({"a": 1, "b": 2, "c": 3})
+        gm.close()
+        gm = gm_mod.GlobalMemory(self.path, cipher=self.cipher)
+        self.assertEqual(gm.get("b"), 2)  # без load()
+        gm.data["d"] = 4
+        gm.save()
+        gm.close()
+        gm = gm_mod.GlobalMemory(self.path, cipher=self.cipher)
+        data = gm.load()
+        self.assertEqual(data, {"a": 1, "b": 2, "c": 3, "d": 4})
+        del data["a"]
+        data["b"] = 20
+        with mock.patch.object(gm._store, "put", wraps=gm._store.put) as put:
+            gm.save()
+        self.assertEqual([c.args[0] for c in put.call_args_list], ["b"], "only changed keys are written")
+        gm.delete("c")
+        gm.close()
+        again = gm_mod.GlobalMemory(self.path, cipher=self.cipher)
+        self.assertEqual(again.load(), {"b": 20, "d": 4})
+        again.close()
+
+    def test_swapped_records_are_rejected(self):
+        store = self.mod.EncryptedStore(self.path, self.cipher)
+        store.put("aa", "secret-A")
+        store.put("bb", "secret-B")
+        store.flush()
+        (a_off, a_size), (b_off, b_size) = store._index["aa"], store._index["bb"]
+        store.close()
+        raw = bytearray(Path(self.path).read_bytes())
+        a, b = bytes(raw[a_off:a_off + a_size]), bytes(raw[b_off:b_off + b_size])
+        raw[a_off:a_off + a_size], raw[b_off:b_off + b_size] = b, a
+        Path(self.path).write_bytes(bytes(raw))
+        store = self.mod.EncryptedStore(self.path, self.cipher)
+        with self.assertRaises(Exception):
+            store.get("aa")
+        store._fh.close()
+
+    def test_recovery_skips_corrupted_record(self):
+        store = self.mod.EncryptedStore(self.path, self.cipher)
+        for i in range(5):
+            store.put(f"k{i}", i)
+        bad_off, bad_size = store._index["k2"]
+        store.sync()
+        store._fh.close()  # без индекса
+        raw = bytearray(Path(self.path).read_bytes())
+        raw[bad_off] = 0xEE  # битый заголовок посреди файла
+        Path(self.path).write_bytes(bytes(raw))
+        store = self.mod.EncryptedStore(self.path, self.cipher)
+        self.assertEqual([store.get(f"k{i}") for i in (0, 1, 3, 4)], [0, 1, 3, 4])
+        self.assertNotIn("k2", store)
+        store.close()
+
+    def test_index_is_flushed_periodically(self):
+        store = self.mod.EncryptedStore(self.path, self.cipher, index_every=10)
+        for i in range(12):
+            store.put(f"k{i}", i)
+        store.sync()
+        store._fh.close()
+        store = self.mod.EncryptedStore.__new__(self.mod.EncryptedStore)
+        with mock.patch.object(self.mod.EncryptedStore, "_read_chunk", autospec=True,
+                               side_effect=self.mod.EncryptedStore._read_chunk) as read:
+            store.__init__(self.path, self.cipher)
+        # проверка ключа + индекс + две записи после него, а не все 12
+        self.assertEqual(read.call_count, 4)
+        self.assertEqual(store.get("k11"), 11)
+        store.close()
+
+
+class TestMemorySnapshot(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.memory")
+        self.assertIsNotNone(self.mod, "core.memory import failed")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "memory.snap")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_roundtrip_with_lazy_values_and_prebuilt_index(self):
+        mem = self.mod.AssociativeMemory()
+        mem.set("Привет", "Привет! Чем помочь?")
+        mem.set("Как заменить ремень ГРМ?", {"steps": ["снять кожух", "выставить метки"]})
+        for i in range(200):
+            mem.set(f"вопрос {i}", f"ответ {i}")
+        mem.add_passage("manual#p1:0", "Момент затяжки болтов ГБЦ 90 Нм")
+        mem.save_snapshot(self.path)
+
+        loaded = self.mod.AssociativeMemory.load_snapshot(self.path)
+        with mock.patch.object(self.mod.json, "loads", wraps=self.mod.json.loads) as loads:
+            self.assertEqual(loaded.get("вопрос 150"), "ответ 150")
+        self.assertEqual(loads.call_count, 1, "only the requested value is decoded")
+        self.assertEqual(loaded.lookup("привет")[1], "Привет! Чем помочь?")
+        self.assertEqual(loaded.lookup("как заменить ремень грм")[0], "Как заменить ремень ГРМ?")
+        self.assertGreater(loaded.lookup("Как заменить ремнь ГРМ")[2], 0.85)
+        self.assertEqual(loaded.find("затяжки ГБЦ")[0][0], "manual#p1:0")
+        self.assertIn("вопрос 7", loaded.search("ответ 7"))
+
+        # Изменения поверх снимка и повторное сохранение
+        loaded.set("вопрос 1", "новый ответ")
+        loaded.delete("вопрос 2")
+        self.assertEqual(loaded.get("вопрос 1"), "новый ответ")
+        self.assertIsNone(loaded.get("вопрос 2"))
+        again = os.path.join(self.tmp.name, "again.snap")
+        loaded.save_snapshot(again)
+        loaded.clear()
+        third = self.mod.AssociativeMemory.load_snapshot(again)
+        self.assertEqual(third.get("вопрос 1"), "новый ответ")
+        self.assertIsNone(third.lookup("вопрос 2", min_score=0.99))
+        self.assertEqual(len(list(third.items())), 202)
+        self.assertEqual(third.find("ГБЦ")[0][1], "Момент затяжки болтов ГБЦ 90 Нм")
+        third.clear()
+
+    def test_search_without_decoding_and_close_with_live_views(self):
+        mem = self.mod.AssociativeMemory()
+        mem.set("Масло", {"марка": "5W-30", "объём": 4})
+        mem.set("Свечи", "Замена каждые 30000 км")
+        mem.set("Фильтр", "вместе с маслом")
+        mem.save_snapshot(self.path)
+        loaded = self.mod.AssociativeMemory.load_snapshot(self.path)
+        loaded.set("Антифриз", "G12, замена 30000")
+        with mock.patch.object(self.mod.json, "loads", wraps=self.mod.json.loads) as loads:
+            self.assertEqual(sorted(loaded.search("30000")), ["Антифриз", "Свечи"])
+            self.assertEqual(loaded.search("5w-30"), ["Масло"])
+            self.assertEqual(sorted(loaded.search("МАСЛ")), ["Масло", "Фильтр"])
+        self.assertEqual(loads.call_count, 0)
+        held = loaded._base.token_ids("масло")
+        loaded.clear()  # закрывает снимок, хотя срез ещё жив
+        del held
+
+
+class TestNearDuplicates(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.memory")
+        self.assertIsNotNone(self.mod, "core.memory import failed")
+
+    def test_incremental_dedup_on_set(self):
+        mem = self.mod.AssociativeMemory(dedup=self.mod.MinHashLSH())
+        mem.set("Как заменить ремень ГРМ?", "Снять кожух, выставить метки, заменить ремень.")
+        mem.set("как заменить  ремень грм", "Снять кожух, выставить метки, заменить ремень")
+        mem.set("Как заменить масло?", "Слить старое масло, заменить фильтр, залить новое.")
+        self.assertEqual(len(mem._store), 2)
+        self.assertEqual(mem.get("как заменить  ремень грм"), "Снять кожух, выставить метки, заменить ремень.")
+        self.assertEqual(mem.lookup("как заменить ремень грм")[0], "Как заменить ремень ГРМ?")
+        mem.delete("Как заменить ремень ГРМ?")
+        self.assertIsNone(mem.get("Как заменить ремень ГРМ?"))
+        self.assertEqual(mem.get("как заменить  ремень грм"), "Снять кожух, выставить метки, заменить ремень.")
+        self.assertEqual(mem.lookup("как заменить ремень грм")[0], "как заменить  ремень грм")
+
+    def test_aliases_survive_snapshot_and_promotion(self):
+        mem = self.mod.AssociativeMemory(dedup=self.mod.MinHashLSH())
+        answer = "Снять кожух, выставить метки, заменить ремень."
+        mem.set("Как заменить ремень ГРМ?", answer)
+        mem.set("как заменить  ремень грм", answer)
+        mem.set("КАК ЗАМЕНИТЬ РЕМЕНЬ ГРМ!", answer)
+        self.assertEqual(len(mem._aliases), 2)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "m.snap")
+            mem.save_snapshot(path)
+            loaded = self.mod.AssociativeMemory.load_snapshot(path)
+            self.assertEqual(len(list(loaded.items())), 1)
+            self.assertEqual(loaded.get("КАК ЗАМЕНИТЬ РЕМЕНЬ ГРМ!"), answer)
+            self.assertTrue(loaded.delete("Как заменить ремень ГРМ?"))
+            self.assertEqual(loaded.get("как заменить  ремень грм"), answer)
+            self.assertEqual(loaded.get("КАК ЗАМЕНИТЬ РЕМЕНЬ ГРМ!"), answer)
+            self.assertEqual(loaded._aliases, {"КАК ЗАМЕНИТЬ РЕМЕНЬ ГРМ!": "как заменить  ремень грм"})
+            self.assertEqual(loaded.lookup("как заменить ремень грм!")[1], answer)
+            loaded.clear()
+
+    def test_bulk_compaction_is_candidate_based(self):
+        import random
+        rng = random.Random(7)
+        word = lambda: "".join(rng.choice("абвгдежзиклмнопрстуф") for _ in range(6))
+        mem = self.mod.AssociativeMemory()
+        pairs = []
+        for i in range(100):
+            q, a = f"Как {word()} {word()}?", f"{word()} {word()} {word()}"
+            mem.set(q, a)
+            mem.set(q.upper() + "!", a.lower())
+            pairs.append((q, a))
+        lsh = self.mod.MinHashLSH()
+        with mock.patch.object(lsh, "similarity", wraps=lsh.similarity) as sim:
+            stats = mem.compact(lsh)
+        self.assertEqual(stats["merged"], 100)
+        self.assertEqual(stats["entries"], 100)
+        self.assertLess(sim.call_count, 200 * 199 // 2, "no all-pairs comparison")
+        q, a = pairs[7]
+        self.assertEqual(mem.get(q.upper() + "!"), a)
+        self.assertEqual(mem.search(a), [q])
+
+
+class TestBulkLoad(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.memory")
+        self.stream = safe_import("core.jsonstream")
+        self.assertIsNotNone(self.mod, "core.memory import failed")
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_streaming_parser_handles_chunk_boundaries(self):
+        p = Path(self.tmp.name) / "dump.json"
+        records = [{"key": f"вопрос {i}", "value": [i * 12345, {"t": "ответ"}]} for i in range(50)]
+        p.write_text(json.dumps(records, ensure_ascii=False, indent=1), encoding="utf-8")
+        self.assertEqual(list(self.stream.iter_json(p, chunk_size=7)), records)
+        obj = Path(self.tmp.name) / "memory.json"
+        obj.write_text('{"a": 1234567, "b": "x, y"}', encoding="utf-8")
+        self.assertEqual(list(self.stream.iter_json(obj, chunk_size=3)), [("a", 1234567), ("b", "x, y")])
+        nums = Path(self.tmp.name) / "nums.json"
+        nums.write_text("[1.25, 3e10, -0.5E-3, 7]", encoding="utf-8")
+        for size in (1, 2, 3, 5):
+            self.assertEqual(list(self.stream.iter_json(nums, chunk_size=size)), [1.25, 3e10, -0.5e-3, 7])
+        obj.write_text('{"pi": 3.14159265358979, "big": 6.02214076e23}', encoding="utf-8")
+        for size in (1, 3, 4):
+            self.assertEqual(dict(self.stream.iter_json(obj, chunk_size=size)),
+                             {"pi": 3.14159265358979, "big": 6.02214076e23})
+
+    def test_bulk_load_indexes_once_and_persists_once(self):
+        p = Path(self.tmp.name) / "dump.jsonl"
+        with open(p, "w", encoding="utf-8") as fh:
+            for i in range(500):
+                fh.write(json.dumps({f"Вопрос {i}": f"Ответ {i}"}, ensure_ascii=False) + "\n")
+        mem = self.mod.AssociativeMemory()
+        with mock.patch.object(mem, "_index", wraps=mem._index) as idx:
+            self.assertEqual(mem.bulk_load(p, batch_size=64), 500)
+        self.assertEqual(idx.call_count, 500)
+        self.assertEqual(mem.lookup("вопрос 321")[1], "Ответ 321")
+
+        gm_mod = safe_import("core.global_memory")
+        gm = gm_mod.GlobalMemory(os.path.join(self.tmp.name, "global.json"))
+        with mock.patch.object(gm, "save", wraps=gm.save) as save:
+            gm.bulk_load(p)
+        self.assertEqual(save.call_count, 1)
+        self.assertEqual(gm_mod.GlobalMemory(gm.path).load()["Вопрос 7"], "Ответ 7")
+
+
+class TestSharedMemoryReader(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.memory_share")
+        self.memmod = safe_import("core.memory")
+        self.assertIsNotNone(self.mod, "core.memory_share import failed")
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_readers_swap_to_new_versions(self):
+        mem = self.memmod.AssociativeMemory()
+        mem.set("Привет", "Здравствуйте")
+        pub = self.mod.SnapshotPublisher(self.tmp.name, keep=2)
+        self.assertEqual(pub.publish(mem), 1)
+
+        reader = self.mod.SharedMemoryReader(self.tmp.name, check_interval=0)
+        self.assertEqual(reader.lookup("привет")[1], "Здравствуйте")
+        with self.assertRaises(TypeError):
+            reader.set("x", 1)
+
+        mem.set("Как заменить ремень ГРМ?", "Снять кожух")
+        pub.publish(mem)
+        pub.publish(mem)
+        self.assertEqual(reader.get("Как заменить ремень ГРМ?"), "Снять кожух")
+        self.assertEqual(reader.version, 3)
+        self.assertEqual(sorted(p.name for p in Path(self.tmp.name).glob("*.snap")),
+                         ["memory-00000002.snap", "memory-00000003.snap"])
+        reader.close()
+        self.assertIsNone(reader.get("Привет"))
+
+    def test_request_keeps_its_version_across_swaps(self):
+        mem = self.memmod.AssociativeMemory()
+        mem.set("Привет", "v1")
+        pub = self.mod.SnapshotPublisher(self.tmp.name, keep=1)
+        pub.publish(mem)
+        reader = self.mod.SharedMemoryReader(self.tmp.name, check_interval=0)
+        state = reader._state  # так запрос держит свою версию
+        for value in ("v2", "v3"):
+            mem.set("Привет", value)
+            pub.publish(mem)
+            self.assertTrue(reader.refresh())
+        self.assertEqual(reader.lookup("привет")[1], "v3")
+        self.assertEqual(state.memory.lookup("привет")[1], "v1", "old snapshot is not closed under a reader")
+        reader.close()
+
+
+class TestConfigHotReload(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.config")
+        self.assertIsNotNone(self.mod, "core.config import failed")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "config.json"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, data):
+        self.path.write_text(json.dumps(data), encoding="utf-8")
+        st = self.path.stat()
+        # mtime может не смениться в пределах тика ФС — сдвигаем явно
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+    def test_typed_frozen_config_reloads_on_change(self):
+        from dataclasses import dataclass, field, FrozenInstanceError
+
+        @dataclass(frozen=True)
+        class Pool:
+            workers: int = 2
+
+        @dataclass(frozen=True)
+        class App:
+            cache_mb: float = 8.0
+            pool: Pool = field(default_factory=Pool)
+            langs: tuple = ()
+
+        self._write({"cache_mb": 16, "pool": {"workers": 4}})
+        loader = self.mod.ConfigLoader(str(self.path), schema=App, poll_interval=0.01)
+        seen = []
+        loader.subscribe(lambda new, old: seen.append((old, new)), field="pool.workers")
+        loader.load()
+        self.assertEqual(loader.config.pool.workers, 4)
+        self.assertEqual(loader.config.cache_mb, 16.0)
+        with self.assertRaises(FrozenInstanceError):
+            loader.config.cache_mb = 1
+        self.assertFalse(loader.check(), "unchanged file is not re-read")
+
+        loader.start()
+        try:
+            self._write({"cache_mb": 16, "pool": {"workers": 8}})
+            _wait_until(lambda: loader.config.pool.workers == 8)
+            self.assertEqual(loader.config.pool.workers, 8)
+            self._write({"cache_mb": "many"})
+            _wait_until(lambda: loader.error is not None)
+            self.assertIn("cache_mb", loader.error or "")
+            self.assertEqual(loader.config.pool.workers, 8, "invalid file keeps the last good config")
+        finally:
+            loader.stop()
+        self.assertEqual(seen, [(2, 4), (4, 8)])
+
+    def test_failing_subscriber_and_pep604_optional(self):
+        from dataclasses import dataclass
+
+        @dataclass(frozen=True)
+        class App:
+            limit: int | None = None
+
+        self._write({"limit": 1})
+        loader = self.mod.ConfigLoader(str(self.path), schema=App, poll_interval=0.01)
+        seen = []
+        loader.subscribe(mock.Mock(side_effect=RuntimeError("boom")))
+        loader.subscribe(lambda new, old: seen.append(new.limit))
+        with self.assertLogs("core.config", level="ERROR"):
+            loader.load()
+        self.assertEqual(seen, [1])
+        self._write({"limit": "x"})
+        loader.load()
+        self.assertIn("limit", loader.error or "")
+
+        with mock.patch.object(loader, "check", side_effect=[OSError("flaky fs"), True, True, True]) as check, \
+                self.assertLogs("core.config", level="ERROR"):
+            loader.start()
+            _wait_until(lambda: check.call_count >= 3)
+            loader.stop()
+        self.assertGreaterEqual(check.call_count, 3, "watcher thread survives a failed check")
+
+
+class TestIndexedAssets(unittest.TestCase):
+    def setUp(self):
+        self.mod = safe_import("core.assets")
+        self.assertIsNotNone(self.mod, "core.assets import failed")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = Path(self.tmp.name) / "assets"
+        (self.base / "icons").mkdir(parents=True)
+        (self.base / "icons" / "mic.png").write_bytes(b"\x89PNG" + b"m" * 100)
+        (self.base / "voice.wav").write_bytes(b"RIFF" + b"v" * 200)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_lookups_do_not_touch_filesystem(self):
+        am = self.mod.AssetManager(str(self.base))
+        self.assertEqual(len(am.index), 2)
+        with mock.patch("pathlib.Path.exists", side_effect=AssertionError("stat")), \
+                mock.patch("pathlib.Path.resolve", side_effect=AssertionError("resolve")), \
+                mock.patch("os.stat", side_effect=AssertionError("stat")):
+            self.assertTrue(am.exists("icons/mic.png"))
+            self.assertFalse(am.exists("icons/none.png"))
+            self.assertEqual(am.get("icons/mic.png").name, "mic.png")
+            self.assertIsNone(am.get("missing.png"))
+            self.assertTrue(am.resolve("missing.png").is_absolute())
+
+        manifest = Path(self.tmp.name) / "assets.json"
+        am.save_manifest(str(manifest))
+        with mock.patch("os.scandir", side_effect=AssertionError("scan")):
+            self.assertTrue(self.mod.AssetManager(str(self.base), manifest=str(manifest)).exists("voice.wav"))
+        (self.base / "voice.wav").unlink()
+        stale = self.mod.AssetManager(str(self.base), manifest=str(manifest))
+        self.assertIsNone(stale.read("voice.wav"), "a file deleted after the manifest reads as missing")
+        self.assertEqual(stale.read("icons/mic.png")[:4], b"\x89PNG")
+
+    def test_bundle_reads_through_mmap_and_lru(self):
+        bundle = Path(self.tmp.name) / "assets.pak"
+        self.assertEqual(self.mod.build_bundle(str(self.base), str(bundle)), 2)
+        am = self.mod.AssetManager(str(Path(self.tmp.name) / "nowhere"), bundle=str(bundle), cache_bytes=250)
+        self.assertEqual(am.read("icons/mic.png"), b"\x89PNG" + b"m" * 100)
+        self.assertEqual(am.read("icons/mic.png")[:4], b"\x89PNG")
+        self.assertEqual((am.hits, am.misses), (1, 1))
+        self.assertEqual(am.read("voice.wav")[:4], b"RIFF")
+        self.assertNotIn("icons/mic.png", am._cache)  # LRU вытеснил по лимиту байт
+        self.assertIsNone(am.get("voice.wav"), "bundle-only asset has no file path")
+        self.assertIsNone(am.read("missing"))
+        am.close()
+        self.assertIsNone(am.read("icons/mic.png"), "bundle-only asset is gone after close")
+        self.assertFalse(am.exists("icons/mic.png"))
+
+    def test_empty_bundle_and_symlink_loop(self):
+        empty = Path(self.tmp.name) / "empty.pak"
+        empty.write_bytes(b"")
+        try:
+            os.symlink(self.base, self.base / "icons" / "loop")
+        except (OSError, NotImplementedError):
+            self.skipTest("symlinks are not supported here")
+        am = self.mod.AssetManager(str(self.base), bundle=str(empty))
+        self.assertEqual(sorted(am.index), ["icons/mic.png", "voice.wav"])
+        self.assertEqual(am.read("voice.wav")[:4], b"RIFF")
+        am.close()
+
+
+class TestChatHistory(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault("KIVY_NO_ARGS", "1")
+        self.mod = safe_import("ui.components.ChatHistory")
+        if self.mod is None:
+            self.skipTest("kivy not installed")
+
+    def test_height_cache_keyed_by_message_and_width(self):
+        with mock.patch.object(self.mod.ChatHistory, "_measure", side_effect=lambda t: 10 * len(t)) as measure:
+            hist = self.mod.ChatHistory(cache_size=2)
+            first = hist.add_message("привет")
+            second = hist.add_message("как дела?", is_user=True)
+            self.assertEqual(hist._height_for(first, "привет"), hist.data[0]["size"][1])
+            self.assertEqual(measure.call_count, 2, "cached height is not measured again")
+            hist.add_message("ок")
+            self.assertEqual(len(hist._heights), 2)
+            self.assertEqual(list(hist._heights), [(first, 0), (2, 0)], "least recently used height is evicted")
+            self.assertNotIn((second, 0), hist._heights)
+            hist.width = 500
+            self.assertEqual({w for _, w in hist._heights}, {hist._text_width})
+            self.assertEqual([d["size"][1] for d in hist.data], [80, 110, 40])
+
+    def test_chat_screen_tells_busy_from_answers(self):
+        from concurrent.futures import Future
+        chat = safe_import("screens.chat")
+        pipeline = safe_import("core.pipeline")
+        self.assertIsNotNone(chat, "screens.chat import failed")
+        screen = chat.ChatScreen(interaction=mock.Mock())
+        for result in ({"ok": False, "busy": True, "reason": "queue full"},
+                       pipeline.PipelineResult(results={"answer": "готово"}),
+                       pipeline.PipelineResult(errors={"answer": pipeline.StageSkipped("answer")})):
+            fut = Future()
+            fut.set_result(result)
+            screen._on_answer(fut)
+        self.assertEqual([d["text"] for d in screen.history.data],
+                         ["Сервис занят, попробуйте ещё раз", "готово", "Не нашёл ответа"])
+
+
 # ------------------------------------------------------------------------------
 # УМНЫЙ РЕЗУЛЬТАТ И ОТЧЁТ
 # ------------------------------------------------------------------------------
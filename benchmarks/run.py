@@ -0,0 +1,304 @@
+# benchmarks/run.py
+"""
+Бенчмарки горячих путей ядра.
+
+    python benchmarks/run.py                  # все бенчмарки, сравнение с baseline.json
+    python benchmarks/run.py -k memory        # только с "memory" в имени
+    python benchmarks/run.py --save-baseline  # зафиксировать текущие цифры как эталон
+    python benchmarks/run.py --zip-mb 4096    # ZIP на несколько ГБ
+
+Отчёт: ops/s, p50/p95/p99 (мс) и пиковый RSS. Каждый бенчмарк идёт в
+отдельном процессе: ru_maxrss — максимум за всю жизнь процесса, и в общем
+процессе пик первого тяжёлого бенчмарка достался бы всем следующим.
+Регрессией считается рост p50 больше чем на --threshold относительно
+сохранённого эталона.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+BASELINE = Path(__file__).with_name("baseline.json")
+
+# name -> setup(args, tmp) -> (op(i), число операций)
+BENCHES: Dict[str, Callable[..., Tuple[Callable[[int], object], int]]] = {}
+
+
+def bench(name: str):
+    def deco(fn):
+        BENCHES[name] = fn
+        return fn
+    return deco
+
+
+# ---------------- генераторы данных ----------------
+def random_words(rng: random.Random, n: int, alphabet: str = string.ascii_lowercase) -> str:
+    return " ".join("".join(rng.choices(alphabet, k=rng.randint(3, 9))) for _ in range(n))
+
+
+def make_memory_entries(n: int, seed: int = 0) -> List[Tuple[str, str]]:
+    rng = random.Random(seed)
+    return [(f"q{i} {random_words(rng, 4)}", random_words(rng, 12)) for i in range(n)]
+
+
+def make_url_corpus(n: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    hosts = ["example.com", "127.0.0.1:8000", "10.0.0.5", "192.168.1.1", "localhost",
+             "[::1]", "cdn.example.org", "user@evil.example.net", "172.20.0.3"]
+    schemes = ["http", "https", "https", "ftp", "file"]
+    return [f"{rng.choice(schemes)}://{rng.choice(hosts)}/{random_words(rng, 2).replace(' ', '/')}"
+            for _ in range(n)]
+
+
+def make_zip(path: Path, size_mb: int, compression: int) -> str:
+    """ZIP с одним файлом весов заданного размера; пишется потоково, без буфера в памяти."""
+    chunk = os.urandom(1024 * 1024) if compression == zipfile.ZIP_STORED else b"\0" * (1024 * 1024)
+    with zipfile.ZipFile(path, "w", compression=compression, allowZip64=True) as zf:
+        with zf.open("weights/model.bin", "w", force_zip64=True) as dst:
+            for _ in range(size_mb):
+                dst.write(chunk)
+    return "weights/model.bin"
+
+
+def make_wav(tmp: Path, seconds: float) -> str:
+    from generate_dummy_wav import generate_dummy_wav  # нужен numpy
+    out = tmp / "bench.wav"
+    cwd = os.getcwd()
+    os.chdir(tmp)  # generate_dummy_wav всегда создаёт ./samples
+    try:
+        generate_dummy_wav(str(out), mode="noise", duration=seconds)
+    finally:
+        os.chdir(cwd)
+    return str(out)
+
+
+# ---------------- бенчмарки ----------------
+@bench("memory.search")
+def _memory_search(args, tmp):
+    from core.memory import AssociativeMemory
+    mem = AssociativeMemory()
+    entries = make_memory_entries(args.entries)
+    for k, v in entries:
+        mem.set(k, v)
+    queries = [k.split()[1] for k, _ in entries[:: max(1, len(entries) // 100)]]
+    return (lambda i: mem.search(queries[i % len(queries)])), args.ops // 10 or 1
+
+
+@bench("global_memory.update")
+def _global_memory_update(args, tmp):
+    from core.global_memory import GlobalMemory
+    gm = GlobalMemory(str(tmp / "global_memory.json"))
+    for k, v in make_memory_entries(args.entries // 10 or 1):
+        gm.data[k] = v
+    return (lambda i: gm.update(f"k{i}", i)), min(args.ops, 200)
+
+
+@bench("idiot_guard.is_blocked_url")
+def _is_blocked_url(args, tmp):
+    from core.idiot_guard import is_blocked_url
+    urls = make_url_corpus(10000)
+    return (lambda i: is_blocked_url(urls[i % len(urls)])), args.ops * 10
+
+
+@bench("idiot_guard.safe_extract")
+def _safe_extract(args, tmp):
+    from core.idiot_guard import safe_extract
+    src = tmp / "extract.zip"
+    rng = random.Random(1)
+    with zipfile.ZipFile(src, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for i in range(200):
+            zf.writestr(f"dir{i % 10}/file{i}.txt", random_words(rng, 200))
+        zf.writestr("../evil.txt", "zip-slip")
+    return (lambda i: safe_extract(src, tmp / f"out{i % 4}")), 20
+
+
+@bench("zip_utils.get_cached_file_from_zip")
+def _zip_cache(args, tmp):
+    from model.zip_utils import get_cached_file_from_zip
+    zpath = tmp / "deflated.zip"
+    entry = make_zip(zpath, args.zip_mb, zipfile.ZIP_DEFLATED)
+    return (lambda i: get_cached_file_from_zip(zpath, entry, tmp / "cache")), 3
+
+
+@bench("lazy_zip.ZipSegmentFile.read")
+def _zip_segment_read(args, tmp):
+    from memory.lazy_zip_file import ZipSegmentFile
+    zpath = tmp / "stored.zip"
+    entry = make_zip(zpath, args.zip_mb, zipfile.ZIP_STORED)
+    f = ZipSegmentFile(str(zpath), entry)
+    block = 1024 * 1024
+    blocks = max(1, f.seek(0, os.SEEK_END) // block)
+
+    def op(i):
+        f.seek((i % blocks) * block)
+        return f.read(block)
+    return op, blocks * 4
+
+
+@bench("ai.generate")
+def _ai_generate(args, tmp):
+    from core.ai import AIEngine, ModelHandle
+    engine = AIEngine(model=ModelHandle(type="gguf", path="model/model.gguf"))
+    prompts = make_memory_entries(1000)
+    return (lambda i: engine.generate(prompts[i % len(prompts)][1])), args.ops * 10
+
+
+@bench("stt.from_file")
+def _stt_from_file(args, tmp):
+    from core.stt import STT
+    path = make_wav(tmp, args.wav_seconds)
+    stt = STT()
+    return (lambda i: stt.from_file(path)), 20
+
+
+# ---------------- измерение ----------------
+def percentile(data: List[float], p: float) -> float:
+    return data[min(len(data) - 1, int(p * len(data)))]
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_one(name: str, args) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        op, n = BENCHES[name](args, Path(tmp))
+        for i in range(min(n, args.warmup)):
+            op(i)
+        lat: List[float] = []
+        t_start = time.perf_counter()
+        for i in range(n):
+            t0 = time.perf_counter()
+            op(i)
+            lat.append((time.perf_counter() - t0) * 1000.0)
+        total = time.perf_counter() - t_start
+    lat.sort()
+    return {
+        "ops": n,
+        "ops_per_s": n / total if total else 0.0,
+        "p50_ms": percentile(lat, 0.50),
+        "p95_ms": percentile(lat, 0.95),
+        "p99_ms": percentile(lat, 0.99),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+# Параметры, которые передаются дочернему процессу бенчмарка
+CHILD_OPTIONS = ("entries", "ops", "warmup", "zip_mb", "wav_seconds")
+
+
+def run_isolated(name: str, args) -> Dict[str, float]:
+    """run_one в свежем процессе — peak_rss_mb относится только к этому бенчмарку."""
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--child", name]
+    for opt in CHILD_OPTIONS:
+        cmd += [f"--{opt.replace('_', '-')}", str(getattr(args, opt))]
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=str(ROOT))
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}")
+    out = json.loads(proc.stdout.strip().splitlines()[-1])
+    if "skipped" in out:
+        raise ImportError(out["skipped"])
+    return out
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("p50_ms"):
+            continue
+        ratio = r["p50_ms"] / base["p50_ms"]
+        if ratio > 1 + threshold:
+            regressions.append(f"{name}: p50 {base['p50_ms']:.4f} -> {r['p50_ms']:.4f} ms (x{ratio:.2f})")
+    return regressions
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="LV-REX core benchmarks")
+    ap.add_argument("-k", dest="filter", default="", help="подстрока имени бенчмарка")
+    ap.add_argument("--entries", type=int, default=10000, help="размер синтетической памяти")
+    ap.add_argument("--ops", type=int, default=1000, help="базовое число операций")
+    ap.add_argument("--warmup", type=int, default=10)
+    ap.add_argument("--zip-mb", type=int, default=16, help="размер весов в ZIP, МБ")
+    ap.add_argument("--wav-seconds", type=float, default=10.0)
+    ap.add_argument("--threshold", type=float, default=0.2, help="допустимый рост p50 (0.2 = 20%%)")
+    ap.add_argument("--baseline", default=str(BASELINE))
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--json", help="записать результаты в файл")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.child:
+        try:
+            out = run_one(args.child, args)
+        except ImportError as e:
+            out = {"skipped": str(e)}
+        print(json.dumps(out))
+        return 0
+
+    results: Dict[str, Dict[str, float]] = {}
+    print(f"{'benchmark':40} {'ops/s':>12} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'rss MB':>8}")
+    for name in BENCHES:
+        if args.filter not in name:
+            continue
+        try:
+            r = run_isolated(name, args)
+        except ImportError as e:
+            print(f"{name:40} skipped: {e}")
+            continue
+        except RuntimeError as e:
+            print(f"{name:40} failed: {e}")
+            continue
+        results[name] = r
+        print(f"{name:40} {r['ops_per_s']:12.1f} {r['p50_ms']:10.4f} {r['p95_ms']:10.4f} "
+              f"{r['p99_ms']:10.4f} {r['peak_rss_mb']:8.1f}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        merged = json.loads(baseline_path.read_text(encoding="utf-8")) if baseline_path.exists() else {}
+        merged.update(results)
+        baseline_path.write_text(json.dumps(merged, indent=2), encoding="utf-8")
+        print(f"\nBaseline saved: {baseline_path}")
+        return 0
+
+    if not baseline_path.exists():
+        print("\nNo baseline yet — run with --save-baseline to create one.")
+        return 0
+
+    regressions = compare(results, json.loads(baseline_path.read_text(encoding="utf-8")), args.threshold)
+    if regressions:
+        print("\nREGRESSIONS:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
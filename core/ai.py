@@ -1,6 +1,8 @@
 from dataclasses import dataclass
 from typing import Any, Optional
 
+from core.metrics import metrics
+
 # Локальный "torch"-объект с .load, чтобы mock.patch("core.ai.torch.load", ...) работал даже без пакета torch
 class _TorchStub:
     def load(self, *args, **kwargs):
@@ -21,6 +23,7 @@ class ModelHandle:
     path: Optional[str] = None
 
 
+@metrics.timed("ai.init_model")
 def init_model() -> ModelHandle:
     """
     Возвращает дескриптор модели. Если нашли в ZIP torch-веса — тип 'torch', иначе 'gguf'.
@@ -62,6 +65,7 @@ class AIEngine:
     def __init__(self, model: Optional[ModelHandle] = None):
         self.model = model or init_model()
 
+    @metrics.timed("ai.generate")
     def generate(self, prompt: str) -> str:
         prompt = (prompt or "").strip()
         if not prompt:
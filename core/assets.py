@@ -1,17 +1,216 @@
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional
+from typing import Dict, NamedTuple, Optional
+
+# Бандл: MAGIC, длина JSON-индекса, индекс {имя: [смещение, размер]}, данные
+BUNDLE_MAGIC = b"LVXPAK1\x00"
+_BUNDLE_HEADER = struct.Struct("<8sQ")
+
+
+class AssetInfo(NamedTuple):
+    path: Optional[Path]  # файл на диске или None, если ассет только в бандле
+    size: int
+    offset: int = -1      # смещение в бандле
+
+
+def build_bundle(base_dir: str, out_path: str) -> int:
+    """Упаковывает все файлы base_dir в один бандл. Возвращает число ассетов."""
+    base = Path(base_dir)
+    names = sorted(_scan(base))
+    index, pos = {}, 0
+    for name in names:
+        size = (base / name).stat().st_size
+        index[name] = [pos, size]
+        pos += size
+    raw = json.dumps(index, ensure_ascii=False).encode("utf-8")
+    tmp = Path(out_path).with_suffix(".tmp")
+    with open(tmp, "wb") as out:
+        out.write(_BUNDLE_HEADER.pack(BUNDLE_MAGIC, len(raw)) + raw)
+        for name in names:
+            with open(base / name, "rb") as fh:
+                while True:
+                    buf = fh.read(1 << 20)
+                    if not buf:
+                        break
+                    out.write(buf)
+    os.replace(tmp, out_path)
+    return len(names)
+
+
+def _scan(base: Path) -> Dict[str, int]:
+    # Один обход каталога через scandir: имя (posix, относительно base) -> размер.
+    # Каталоги помечаются по (st_dev, st_ino): симлинк на предка не зациклит обход
+    found: Dict[str, int] = {}
+    try:
+        st = os.stat(base)
+    except OSError:
+        return found
+    seen = {(st.st_dev, st.st_ino)}
+    stack = [(str(base), "")]
+    while stack:
+        path, prefix = stack.pop()
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            continue
+        for e in entries:
+            if e.is_dir(follow_symlinks=True):
+                try:
+                    st = e.stat(follow_symlinks=True)
+                except OSError:
+                    continue
+                if (st.st_dev, st.st_ino) in seen:
+                    continue
+                seen.add((st.st_dev, st.st_ino))
+                stack.append((e.path, f"{prefix}{e.name}/"))
+            elif e.is_file(follow_symlinks=True):
+                found[prefix + e.name] = e.stat().st_size
+    return found
 
 
 class AssetManager:
-    def __init__(self, base_dir: str = "assets"):
+    """
+    Ассеты через индекс: каталог обходится один раз (или индекс берётся из
+    manifest), дальше resolve/exists/get — поиск в словаре без обращений к
+    ФС. bundle — упакованный build_bundle() файл, читаемый через mmap;
+    read() отдаёт байты ассета из бандла или файла (None — ассета нет,
+    в том числе если manifest ссылается на удалённый файл), последние
+    прочитанные держатся в LRU размером cache_bytes.
+    """
+    def __init__(
+        self,
+        base_dir: str = "assets",
+        manifest: Optional[str] = None,
+        bundle: Optional[str] = None,
+        cache_bytes: int = 4 * 1024 * 1024,
+    ):
         self.base = Path(base_dir)
+        self._root = Path(os.path.abspath(base_dir))
+        self.manifest = Path(manifest) if manifest else None
+        self.cache_bytes = cache_bytes
+        self._index: Optional[Dict[str, AssetInfo]] = None
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._cache_size = 0
+        self.hits = 0
+        self.misses = 0
+        self._bundle = None
+        # Пустой файл не бандл (и mmap его не отобразит) — как будто его нет
+        if bundle is not None and os.path.exists(bundle) and os.path.getsize(bundle) > 0:
+            with open(bundle, "rb") as fh:
+                self._bundle = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
 
     def resolve(self, name: str) -> Path:
-        return (self.base / name).resolve()
+        info = self.index.get(self._key(name))
+        if info is not None and info.path is not None:
+            return info.path
+        # Неизвестный ассет: абсолютный путь без resolve() и обращений к ФС
+        return Path(os.path.normpath(self._root / name))
 
     def exists(self, name: str) -> bool:
-        return self.resolve(name).exists()
+        return self._key(name) in self.index
 
     def get(self, name: str) -> Optional[Path]:
-        p = self.resolve(name)
-        return p if p.exists() else None
+        info = self.index.get(self._key(name))
+        return info.path if info is not None else None
+
+    def info(self, name: str) -> Optional[AssetInfo]:
+        return self.index.get(self._key(name))
+
+    def read(self, name: str) -> Optional[bytes]:
+        key = self._key(name)
+        with self._lock:
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+        info = self.index.get(key)
+        if info is None:
+            return None
+        data, bundle = None, self._bundle
+        if info.offset >= 0 and bundle is not None:
+            try:
+                data = bundle[info.offset:info.offset + info.size]
+            except ValueError:
+                pass  # бандл закрыли из другого потока
+        if data is None:
+            if info.path is None:
+                return None  # ассет был только в уже закрытом бандле
+            try:
+                data = info.path.read_bytes()
+            except FileNotFoundError:
+                return None  # manifest устарел: файл удалили после его записи
+        with self._lock:
+            self._remember(key, data)
+        return data
+
+    @property
+    def index(self) -> Dict[str, AssetInfo]:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self._build()
+        return self._index
+
+    def refresh(self) -> None:
+        """Пересобирает индекс обходом каталога (после установки новых ассетов)."""
+        with self._lock:
+            self._index = self._build(scan=True)
+            self._cache.clear()
+            self._cache_size = 0
+
+    def save_manifest(self, path: Optional[str] = None) -> None:
+        target = Path(path) if path else self.manifest
+        files = {n: i.size for n, i in self.index.items() if i.path is not None}
+        target.write_text(json.dumps(files, ensure_ascii=False, sort_keys=True), encoding="utf-8")
+
+    def close(self) -> None:
+        """Закрывает бандл; индекс пересоберётся без ассетов, которые были только в нём."""
+        with self._lock:
+            bundle, self._bundle = self._bundle, None
+            if bundle is not None:
+                self._index = None
+        if bundle is not None:
+            bundle.close()
+
+    # --- внутреннее ---
+    @staticmethod
+    def _key(name: str) -> str:
+        return os.path.normpath(str(name)).replace(os.sep, "/")
+
+    def _build(self, scan: bool = False) -> Dict[str, AssetInfo]:
+        if not scan and self.manifest is not None and self.manifest.exists():
+            files = json.loads(self.manifest.read_text(encoding="utf-8"))
+        else:
+            files = _scan(self.base)
+        index = {n: AssetInfo(self._root / n, size) for n, size in files.items()}
+        if self._bundle is not None:
+            magic, length = _BUNDLE_HEADER.unpack_from(self._bundle)
+            if magic != BUNDLE_MAGIC:
+                raise ValueError("Not an asset bundle")
+            start = _BUNDLE_HEADER.size + length
+            packed = json.loads(self._bundle[_BUNDLE_HEADER.size:start])
+            for n, (offset, size) in packed.items():
+                # Байты читаются из бандла; путь остаётся для get(), если файл есть и на диске
+                path = index[n].path if n in index else None
+                index[n] = AssetInfo(path, size, start + offset)
+        return index
+
+    def _remember(self, key: str, data: bytes) -> None:
+        if len(data) > self.cache_bytes:
+            return
+        old = self._cache.pop(key, None)
+        if old is not None:
+            self._cache_size -= len(old)
+        self._cache[key] = data
+        self._cache_size += len(data)
+        while self._cache_size > self.cache_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_size -= len(evicted)
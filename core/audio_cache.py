@@ -0,0 +1,152 @@
+import hashlib
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# Запись в pack-файле: ключ (16 байт), длина сжатых данных, длина PCM
+_RECORD = struct.Struct("<16sII")
+
+
+def audio_key(text: str, voice: str = "default", rate: float = 1.0) -> bytes:
+    """Адрес по содержимому: одинаковые текст/голос/скорость дают один ключ."""
+    raw = f"{voice}\x00{rate:.3f}\x00{text}".encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+
+class AudioCache:
+    """
+    Кэш синтезированного аудио.
+
+    Горячие клипы — в памяти (LRU с лимитом memory_bytes). С directory
+    клипы ещё и пишутся в pack-файл: записи сжаты zlib, индекс
+    ключ → (смещение, длины) строится сканированием заголовков при старте.
+    Когда файл перерастает disk_bytes, он переписывается с недавно
+    использованными клипами в пределах 3/4 бюджета.
+    """
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        memory_bytes: int = 8 * 1024 * 1024,
+        disk_bytes: int = 256 * 1024 * 1024,
+        level: int = 6,
+    ):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.level = level
+        self._lock = threading.Lock()
+        self._mem: "OrderedDict[bytes, bytes]" = OrderedDict()
+        self._mem_size = 0
+        # ключ -> (смещение данных, длина сжатых, длина PCM); порядок = давность использования
+        self._index: "OrderedDict[bytes, Tuple[int, int, int]]" = OrderedDict()
+        self._fh = None
+        self.hits = 0
+        self.misses = 0
+
+        self.path = Path(directory) / "audio.pack" if directory else None
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = open(self.path, "a+b")
+            self._scan()
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        with self._lock:
+            data = self._mem.get(key)
+            if data is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return data
+            loc = self._index.get(key)
+            if loc is None:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            data = zlib.decompress(self._read_at(loc[0], loc[1]))
+            self._remember(key, data)
+            self.hits += 1
+            return data
+
+    def put(self, key: bytes, data: bytes) -> None:
+        with self._lock:
+            self._remember(key, data)
+            if self._fh is None or key in self._index:
+                return
+            packed = zlib.compress(data, self.level)
+            self._fh.seek(0, os.SEEK_END)
+            offset = self._fh.tell() + _RECORD.size
+            self._fh.write(_RECORD.pack(key, len(packed), len(data)) + packed)
+            self._fh.flush()
+            self._index[key] = (offset, len(packed), len(data))
+            if offset + len(packed) > self.disk_bytes:
+                self._compact()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_items": len(self._mem),
+                "memory_bytes": self._mem_size,
+                "disk_items": len(self._index),
+                "disk_bytes": self.path.stat().st_size if self.path else 0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh:
+                self._fh.close()
+                self._fh = None
+
+    # --- внутреннее ---
+    def _remember(self, key: bytes, data: bytes) -> None:
+        if len(data) > self.memory_bytes:
+            return
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._mem_size -= len(old)
+        self._mem[key] = data
+        self._mem_size += len(data)
+        while self._mem_size > self.memory_bytes:
+            _, evicted = self._mem.popitem(last=False)
+            self._mem_size -= len(evicted)
+
+    def _scan(self) -> None:
+        size = os.fstat(self._fh.fileno()).st_size
+        pos = 0
+        while pos + _RECORD.size <= size:
+            key, clen, rlen = _RECORD.unpack(self._read_at(pos, _RECORD.size))
+            if pos + _RECORD.size + clen > size:
+                break  # оборванная запись после сбоя
+            self._index[key] = (pos + _RECORD.size, clen, rlen)
+            self._index.move_to_end(key)
+            pos += _RECORD.size + clen
+        if pos < size:
+            self._fh.truncate(pos)
+
+    def _read_at(self, offset: int, n: int) -> bytes:
+        # Вызывается под self._lock; запись в режиме "a" всё равно идёт в конец
+        self._fh.seek(offset)
+        return self._fh.read(n)
+
+    def _compact(self) -> None:
+        keep, total = [], 0
+        for key, loc in reversed(self._index.items()):
+            cost = _RECORD.size + loc[1]
+            if total + cost > self.disk_bytes * 3 // 4:
+                break
+            keep.append((key, loc))
+            total += cost
+        tmp = self.path.with_suffix(".tmp")
+        index: "OrderedDict[bytes, Tuple[int, int, int]]" = OrderedDict()
+        with open(tmp, "wb") as out:
+            for key, (offset, clen, rlen) in reversed(keep):
+                out.write(_RECORD.pack(key, clen, rlen))
+                index[key] = (out.tell(), clen, rlen)
+                out.write(self._read_at(offset, clen))
+        self._fh.close()
+        os.replace(tmp, self.path)
+        self._fh = open(self.path, "a+b")
+        self._index = index
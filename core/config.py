@@ -1,18 +1,122 @@
+import dataclasses
 import json
+import logging
+import os
+import threading
+import types
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union, get_args, get_origin, get_type_hints
+
+
+log = logging.getLogger(__name__)
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def _converter(tp: Any) -> Callable[[Any], Any]:
+    if dataclasses.is_dataclass(tp):
+        return compile_schema(tp)
+    origin, args = get_origin(tp), get_args(tp)
+    if origin is Union or origin is types.UnionType:  # Optional[int] и int | None
+        inner = [a for a in args if a is not type(None)]
+        conv = _converter(inner[0]) if len(inner) == 1 else (lambda v: v)
+        return lambda v: None if v is None else conv(v)
+    if origin in (list, tuple):
+        item = _converter(args[0]) if args else (lambda v: v)
+        return lambda v: tuple(item(x) for x in _expect(v, (list, tuple), "list"))
+    if origin is dict:
+        item = _converter(args[1]) if len(args) == 2 else (lambda v: v)
+        return lambda v: types.MappingProxyType({k: item(x) for k, x in _expect(v, dict, "object").items()})
+    if tp is bool:
+        return lambda v: _expect(v, bool, "bool")
+    if tp is int:
+        return lambda v: _expect(v, int, "int", strict=True)
+    if tp is float:
+        return lambda v: float(_expect(v, (int, float), "number", strict=True))
+    if tp is str:
+        return lambda v: _expect(v, str, "string")
+    return lambda v: v
+
+
+def _expect(value: Any, types_: Any, name: str, strict: bool = False) -> Any:
+    # strict: bool — подкласс int, но true/false вместо числа считаем ошибкой
+    if not isinstance(value, types_) or (strict and isinstance(value, bool)):
+        raise ConfigError(f"expected {name}, got {type(value).__name__}")
+    return value
+
+
+def compile_schema(schema: type) -> Callable[[Optional[Dict[str, Any]]], Any]:
+    """
+    Разбирает frozen-dataclass схемы один раз: для каждого поля готовится
+    проверяющий конвертер. Возвращает build(raw) → экземпляр схемы
+    (отсутствующие поля — значения по умолчанию, чужие ключи игнорируются).
+    """
+    hints = get_type_hints(schema)
+    fields = [(f.name, _converter(hints[f.name])) for f in dataclasses.fields(schema)]
+
+    def build(raw: Optional[Dict[str, Any]]) -> Any:
+        raw = {} if raw is None else raw
+        if not isinstance(raw, dict):
+            raise ConfigError(f"{schema.__name__}: expected object, got {type(raw).__name__}")
+        kwargs = {}
+        for name, conv in fields:
+            if name in raw:
+                try:
+                    kwargs[name] = conv(raw[name])
+                except ConfigError as e:
+                    raise ConfigError(f"{schema.__name__}.{name}: {e}") from None
+        try:
+            return schema(**kwargs)
+        except (TypeError, ValueError) as e:
+            raise ConfigError(f"{schema.__name__}: {e}") from None
+
+    return build
+
+
+def _resolve(obj: Any, path: str) -> Any:
+    for part in path.split("."):
+        obj = obj.get(part) if isinstance(obj, dict) else getattr(obj, part, None)
+    return obj
 
 
 class ConfigLoader:
-    def __init__(self, path: str = "config.json"):
+    """
+    config.json с горячей перезагрузкой.
+
+    С schema (frozen dataclass, вложенные секции — тоже dataclass) файл
+    проверяется при каждой загрузке, и self.config — неизменяемый
+    типизированный объект; при ошибке остаётся прежний, текст ошибки — в
+    self.error. start() запускает поток, который раз в poll_interval
+    сверяет mtime/размер файла и перечитывает его только при изменении.
+    subscribe() уведомляет о смене всего конфига или одного поля ("a.b").
+    """
+    def __init__(self, path: str = "config.json", schema: Optional[type] = None, poll_interval: float = 1.0):
         self.path = Path(path)
         self._cfg: Dict[str, Any] = {}
+        self._build = compile_schema(schema) if schema is not None else None
+        self.config: Any = self._build({}) if self._build is not None else None
+        self.error: Optional[str] = None
+        self.poll_interval = poll_interval
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+        self._subscribers: List[Tuple[Optional[str], Callable[[Any, Any], None]]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
 
     def load(self) -> Dict[str, Any]:
-        if self.path.exists():
-            self._cfg = json.loads(self.path.read_text(encoding="utf-8"))
-        else:
-            self._cfg = {}
+        with self._lock:
+            self._stamp = self._stat()
+            try:
+                raw = json.loads(self.path.read_text(encoding="utf-8")) if self.path.exists() else {}
+                config = self._build(raw) if self._build is not None else None
+            except (ValueError, OSError) as e:
+                self.error = str(e)
+                return self._cfg
+            old = (self._cfg, self.config)
+            self._cfg, self.config, self.error = raw, config, None
+        self._notify(old, (raw, config))
         return self._cfg
 
     def get(self, key: str, default: Optional[Any] = None) -> Any:
@@ -20,4 +124,58 @@ class ConfigLoader:
 
     def validate(self) -> bool:
         # Минимальная валидация
-        return isinstance(self._cfg, dict)
+        return isinstance(self._cfg, dict) and self.error is None
+
+    def check(self) -> bool:
+        """Перечитывает файл, если изменились mtime или размер."""
+        if self._stat() == self._stamp:
+            return False
+        self.load()
+        return True
+
+    def subscribe(self, fn: Callable[[Any, Any], None], field: Optional[str] = None) -> Callable[[Any, Any], None]:
+        """fn(новое, старое) — при смене поля field или, без него, всего конфига."""
+        self._subscribers.append((field, fn))
+        return fn
+
+    def start(self) -> "ConfigLoader":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="config-watch", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # --- внутреннее ---
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _notify(self, old: Tuple[Dict[str, Any], Any], new: Tuple[Dict[str, Any], Any]) -> None:
+        # Со схемой сравниваются типизированные объекты, без неё — словари
+        pick = 1 if self._build is not None else 0
+        for field, fn in list(self._subscribers):
+            before, after = old[pick], new[pick]
+            if field is not None:
+                before, after = _resolve(before, field), _resolve(after, field)
+            if before != after:
+                # Упавший подписчик не должен лишать уведомления остальных
+                try:
+                    fn(after, before)
+                except Exception:
+                    log.exception("config subscriber %r failed", fn)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception:
+                log.exception("config reload failed")  # поток наблюдения продолжает работу
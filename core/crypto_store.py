@@ -0,0 +1,327 @@
+import base64
+import json
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except Exception:
+    AESGCM = None
+
+MAGIC = b"LVXENC2\x00"
+# Заголовок файла: MAGIC + соль файла (входит в AAD — чанки нельзя переносить между файлами)
+_FILE_HEADER = struct.Struct("<8s16s")
+# Заголовок чанка: тип, длина шифротекста, nonce. В AAD — соль, тип,
+# длина и смещение чанка: подмена или перестановка записей не расшифруется
+_CHUNK = struct.Struct("<BI12s")
+# Хвост после индекса: метка и смещение чанка-индекса
+_FOOTER = struct.Struct("<8sQ")
+FOOTER_MAGIC = b"LVXEIDX\x00"
+
+DATA, INDEX, TOMBSTONE = 1, 2, 3
+
+_keys: Dict[str, "Cipher"] = {}
+_keys_lock = threading.Lock()
+
+
+class Cipher:
+    """AES-256-GCM с привязкой к контексту через AAD."""
+    def __init__(self, key: bytes):
+        if AESGCM is None:
+            raise RuntimeError("cryptography is not installed")
+        if len(key) != 32:
+            raise ValueError("AES-256 key must be 32 bytes")
+        self._aead = AESGCM(key)
+
+    def encrypt(self, data: bytes, aad: bytes = b"") -> bytes:
+        nonce = os.urandom(12)
+        return nonce + self._aead.encrypt(nonce, data, aad)
+
+    def decrypt(self, blob: bytes, aad: bytes = b"") -> bytes:
+        return self._aead.decrypt(blob[:12], blob[12:], aad)
+
+
+def get_cipher(name: str = "memory", key_file: Optional[str] = None) -> Cipher:
+    """
+    Ключ загружается один раз на процесс: из LVREX_<NAME>_KEY (base64)
+    или из key_file (создаётся со случайным ключом, права 0600).
+    """
+    with _keys_lock:
+        cipher = _keys.get(name)
+        if cipher is not None:
+            return cipher
+        raw = os.environ.get(f"LVREX_{name.upper()}_KEY")
+        if raw:
+            key = base64.b64decode(raw)
+        elif key_file:
+            p = Path(key_file)
+            if not p.exists():
+                p.parent.mkdir(parents=True, exist_ok=True)
+                fd = os.open(p, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                with os.fdopen(fd, "wb") as fh:
+                    fh.write(os.urandom(32))
+            key = p.read_bytes()
+        else:
+            raise RuntimeError(f"No key for {name!r}: set LVREX_{name.upper()}_KEY or pass key_file")
+        cipher = _keys[name] = Cipher(key)
+        return cipher
+
+
+class EncryptedStore:
+    """
+    Зашифрованное хранилище записей key → JSON.
+
+    Файл — последовательность независимых чанков AES-GCM (одна запись —
+    один чанк), дописываемых в конец. flush() дописывает зашифрованный
+    индекс key → (смещение, длина) и хвост со ссылкой на него, так что
+    open читает только индекс, а get() расшифровывает одну запись.
+    Если хвоста нет (сбой после записи), чанки после последнего индекса
+    дочитываются сканированием заголовков; повреждённый участок
+    пропускается поиском следующего подлинного чанка.
+
+    Индекс дописывается и сам — после index_every изменений (не реже, чем
+    раз на размер индекса), чтобы восстановление после сбоя не проходило
+    весь файл.
+    """
+    def __init__(self, path: str, cipher: Optional[Cipher] = None, index_every: int = 1000):
+        self.path = Path(path)
+        self.cipher = cipher or get_cipher()
+        self._lock = threading.Lock()
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._dirty = False
+        self.index_every = index_every
+        self._changes = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            self.salt = os.urandom(16)
+            with open(self.path, "wb") as fh:
+                fh.write(_FILE_HEADER.pack(MAGIC, self.salt))
+        self._fh = open(self.path, "r+b")
+        self._open()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def keys(self):
+        return list(self._index)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            loc = self._index.get(key)
+            if loc is None:
+                return default
+            _, payload = self._read_chunk(*loc)
+        klen = int.from_bytes(payload[:2], "little")
+        if payload[2:2 + klen] != key.encode("utf-8"):
+            raise ValueError(f"{self.path}: record at {loc[0]} does not belong to {key!r}")
+        return json.loads(payload[2 + klen:])
+
+    def put(self, key: str, value: Any) -> None:
+        k = key.encode("utf-8")
+        body = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self._index[key] = self._append(DATA, len(k).to_bytes(2, "little") + k + body)
+            self._changed()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if self._index.pop(key, None) is not None:
+                self._append(TOMBSTONE, key.encode("utf-8"))
+                self._changed()
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """Записи по одной — для потоковой обработки без расшифровки всего файла."""
+        for key in self.keys():
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                yield key, value
+
+    def sync(self) -> None:
+        """Сбрасывает дописанные записи на диск без перезаписи индекса."""
+        with self._lock:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+
+    def flush(self) -> None:
+        """Дописывает индекс: следующее открытие не будет сканировать файл."""
+        with self._lock:
+            self._write_index()
+
+    def reencrypt(self, cipher: Cipher) -> None:
+        """Перешифровка новым ключом потоком, запись за записью; заодно сжимает файл."""
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        if tmp.exists():
+            tmp.unlink()
+        out = EncryptedStore(str(tmp), cipher)
+        for key, value in self.items():
+            out.put(key, value)
+        out.flush()
+        out.close()
+        with self._lock:
+            self._fh.close()
+            os.replace(tmp, self.path)
+            self.cipher = cipher
+            self._fh = open(self.path, "r+b")
+            self._index = {}
+            self._open()
+
+    def compact(self) -> None:
+        self.reencrypt(self.cipher)
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            if not self._fh.closed:
+                self._fh.close()
+
+    # --- внутреннее ---
+    def _changed(self) -> None:
+        self._dirty = True
+        self._changes += 1
+        if self._changes >= max(self.index_every, len(self._index)):
+            self._write_index()
+
+    def _write_index(self) -> None:
+        # Вызывается под self._lock
+        if not self._dirty:
+            return
+        index = json.dumps({k: list(v) for k, v in self._index.items()}).encode("utf-8")
+        offset, _ = self._append(INDEX, index)
+        self._fh.write(_FOOTER.pack(FOOTER_MAGIC, offset))
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._dirty = False
+        self._changes = 0
+
+    def _aad(self, kind: int, length: int, offset: int) -> bytes:
+        return self.salt + bytes([kind]) + length.to_bytes(4, "little") + offset.to_bytes(8, "little")
+
+    def _append(self, kind: int, payload: bytes) -> Tuple[int, int]:
+        self._fh.seek(0, os.SEEK_END)
+        offset = self._fh.tell()
+        blob = self.cipher.encrypt(payload, self._aad(kind, len(payload) + 16, offset))
+        nonce, ct = blob[:12], blob[12:]
+        self._fh.write(_CHUNK.pack(kind, len(ct), nonce) + ct)
+        return offset, _CHUNK.size + len(ct)
+
+    def _read_chunk(self, offset: int, size: int) -> Tuple[int, bytes]:
+        self._fh.seek(offset)
+        raw = self._fh.read(size)
+        kind, length, nonce = _CHUNK.unpack_from(raw)
+        ct = raw[_CHUNK.size:_CHUNK.size + length]
+        return kind, self.cipher.decrypt(nonce + ct, self._aad(kind, length, offset))
+
+    def _authentic(self, offset: int, size: int) -> bool:
+        try:
+            self._read_chunk(offset, size)
+            return True
+        except Exception:
+            return False
+
+    def _open(self) -> None:
+        self._fh.seek(0)
+        magic, self.salt = _FILE_HEADER.unpack(self._fh.read(_FILE_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{self.path}: not an encrypted store")
+        end = os.fstat(self._fh.fileno()).st_size
+        pos = _FILE_HEADER.size
+        if end - pos >= _FOOTER.size:
+            self._fh.seek(end - _FOOTER.size)
+            tag, offset = _FOOTER.unpack(self._fh.read(_FOOTER.size))
+            if tag == FOOTER_MAGIC and pos <= offset <= end - _FOOTER.size - _CHUNK.size:
+                self._fh.seek(offset)
+                kind, length, _ = _CHUNK.unpack(self._fh.read(_CHUNK.size))
+                if kind == INDEX and offset + _CHUNK.size + length + _FOOTER.size == end:
+                    try:
+                        _, payload = self._read_chunk(offset, _CHUNK.size + length)
+                    except Exception:
+                        payload = None  # повреждённый индекс — восстановление сканированием
+                    if payload is not None:
+                        self._index = {k: tuple(v) for k, v in json.loads(payload).items()}
+                        return
+                    if not self._authentic(*self._first_chunk(pos)):
+                        raise ValueError(f"{self.path}: wrong key or corrupted store")
+        self._recover(pos, end)
+
+    def _first_chunk(self, pos: int) -> Tuple[int, int]:
+        self._fh.seek(pos)
+        _, length, _ = _CHUNK.unpack(self._fh.read(_CHUNK.size))
+        return pos, _CHUNK.size + length
+
+    def _scan(self, pos: int, end: int, resync: bool = False) -> Tuple[list, int]:
+        """
+        Чанки [(смещение, тип, размер)] от pos и конец последнего из них.
+        Заголовки проверяются без расшифровки; после битого заголовка идёт
+        побайтовый поиск следующего чанка, который проходит аутентификацию.
+        """
+        chunks, tail = [], pos
+        while pos + _FOOTER.size <= end:
+            self._fh.seek(pos)
+            head = self._fh.read(_CHUNK.size)
+            if head[:8] == FOOTER_MAGIC:
+                pos += _FOOTER.size
+                tail = pos
+                continue
+            ok = len(head) == _CHUNK.size
+            if ok:
+                kind, length, _ = _CHUNK.unpack(head)
+                size = _CHUNK.size + length
+                ok = kind in (DATA, INDEX, TOMBSTONE) and pos + size <= end
+                if ok and resync:
+                    ok = self._authentic(pos, size)
+            if not ok:
+                resync = True
+                pos += 1
+                continue
+            chunks.append((pos, kind, size))
+            pos += size
+            tail = pos
+            resync = False
+        return chunks, tail
+
+    def _recover(self, pos: int, end: int) -> None:
+        # Хвоста нет (сбой после записи): расшифровываем последний читаемый
+        # индекс и только записи, дописанные после него
+        chunks, tail = self._scan(pos, end)
+        if tail < end:
+            self._fh.truncate(tail)  # после последнего целого чанка — только обрывок
+            end = tail
+
+        if chunks and not any(self._authentic(off, size) for off, _, size in chunks[:3]):
+            raise ValueError(f"{self.path}: wrong key or corrupted store")
+        start = 0
+        for i in range(len(chunks) - 1, -1, -1):
+            if chunks[i][1] == INDEX:
+                try:
+                    _, payload = self._read_chunk(chunks[i][0], chunks[i][2])
+                except Exception:
+                    continue
+                self._index = {k: tuple(v) for k, v in json.loads(payload).items()}
+                start = i + 1
+                break
+        replayed, i, rest = 0, start, chunks
+        while i < len(rest):
+            offset, kind, size = rest[i]
+            try:
+                _, payload = self._read_chunk(offset, size)
+            except Exception:
+                # Заголовок цел, данные нет: ищем следующий подлинный чанк
+                rest, i = self._scan(offset + 1, end, resync=True)[0], 0
+                continue
+            if kind == DATA:
+                klen = int.from_bytes(payload[:2], "little")
+                self._index[payload[2:2 + klen].decode("utf-8")] = (offset, size)
+            elif kind == TOMBSTONE:
+                self._index.pop(payload.decode("utf-8"), None)
+            replayed += 1
+            i += 1
+        self._dirty = replayed > 0
+
+
+_MISSING = object()
@@ -1,16 +1,222 @@
-from typing import Callable, Any
+import asyncio
+import functools
+import inspect
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Выключатель для одной зависимости. Считает долю ошибок в окне последних
+    window вызовов; при превышении failure_rate (и не менее min_calls
+    вызовов) размыкается и reset_timeout секунд отказывает сразу. Потом
+    пропускает пробный вызов (half-open): успех замыкает цепь, ошибка —
+    снова размыкает.
+    """
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        failure_rate: float = 0.5,
+        min_calls: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._results: Deque[bool] = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = HALF_OPEN
+                self._probe = False
+            # half-open: ровно один пробный вызов
+            if self._probe:
+                return False
+            self._probe = True
+            return True
+
+    def release(self) -> None:
+        """Вызов прерван (отмена, KeyboardInterrupt) без результата — освобождает пробный слот."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probe = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._results.clear()
+            self._results.append(True)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trip()
+                return
+            self._results.append(False)
+            n = len(self._results)
+            failures = n - sum(self._results)
+            if n >= self.min_calls and failures / n >= self.failure_rate:
+                self._trip()
+
+    def _trip(self) -> None:
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._probe = False
 
 
 class ErrorHandler:
+    """
+    wrap() по-прежнему превращает исключение в строку handle(), но теперь
+    вызов идёт через CircuitBreaker зависимости (name) и повторяется до
+    retries раз с экспоненциальной задержкой и джиттером. Пока цепь
+    разомкнута, вызов не делается вовсе — сразу fallback.
+    """
+    def __init__(
+        self,
+        retries: int = 0,
+        backoff: float = 0.1,
+        max_backoff: float = 2.0,
+        **breaker_opts: Any,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._breaker_opts = breaker_opts
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
     def handle(self, exc: Exception) -> str:
         return f"{exc.__class__.__name__}: {exc}"
 
-    def wrap(self, func: Callable[..., Any]) -> Callable[..., Any]:
-        def inner(*args, **kwargs):
+    def breaker(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            b = self._breakers.get(name)
+            if b is None:
+                b = self._breakers[name] = CircuitBreaker(name, **self._breaker_opts)
+            return b
+
+    def delay(self, attempt: int) -> float:
+        # "full jitter": равномерно в [0, backoff * 2^attempt]
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def call(self, name: str, func: Callable[..., Any], *args: Any, retries: Optional[int] = None, **kwargs: Any) -> Any:
+        """
+        Вызов через выключатель. Пробрасывается последнее исключение самого
+        вызова; CircuitOpen — только если цепь была разомкнута до первой попытки.
+        """
+        b = self.breaker(name)
+        attempts = (self.retries if retries is None else retries) + 1
+        last: Optional[Exception] = None
+        for attempt in range(attempts):
+            if not b.allow():
+                if last is not None:
+                    raise last
+                raise CircuitOpen(f"circuit '{name}' is open")
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                b.record_failure()
+                # Цепь разомкнулась — повтор заведомо не пройдёт, не ждём его
+                if attempt == attempts - 1 or b.state == OPEN:
+                    raise
+                last = e
+                time.sleep(self.delay(attempt))
+            except BaseException:
+                b.release()
+                raise
+            else:
+                b.record_success()
+                return result
+
+    async def acall(self, name: str, func: Callable[..., Any], *args: Any, retries: Optional[int] = None, **kwargs: Any) -> Any:
+        b = self.breaker(name)
+        attempts = (self.retries if retries is None else retries) + 1
+        last: Optional[Exception] = None
+        for attempt in range(attempts):
+            if not b.allow():
+                if last is not None:
+                    raise last
+                raise CircuitOpen(f"circuit '{name}' is open")
             try:
-                return func(*args, **kwargs)
+                result = await func(*args, **kwargs)
             except Exception as e:
+                b.record_failure()
+                # Цепь разомкнулась — повтор заведомо не пройдёт, не ждём его
+                if attempt == attempts - 1 or b.state == OPEN:
+                    raise
+                last = e
+                await asyncio.sleep(self.delay(attempt))
+            except BaseException:
+                b.release()
+                raise
+            else:
+                b.record_success()
+                return result
+
+    def wrap(
+        self,
+        func: Callable[..., Any],
+        name: Optional[str] = None,
+        fallback: Any = None,
+        retries: Optional[int] = None,
+    ) -> Callable[..., Any]:
+        # Без явного имени — своё на каждую функцию: по одному __qualname__
+        # все лямбды и замыкания одной функции делили бы один выключатель
+        if not name:
+            name = f"{func.__module__}.{func.__qualname__}:{id(func)}"
+
+        def on_error(e: Exception, args, kwargs):
+            if fallback is None:
                 return self.handle(e)
+            return fallback(*args, **kwargs) if callable(fallback) else fallback
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def ainner(*args, **kwargs):
+                try:
+                    return await self.acall(name, func, *args, retries=retries, **kwargs)
+                except Exception as e:
+                    return on_error(e, args, kwargs)
+            return ainner
+
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            try:
+                return self.call(name, func, *args, retries=retries, **kwargs)
+            except Exception as e:
+                return on_error(e, args, kwargs)
         return inner
 
     def report(self, message: str) -> bool:
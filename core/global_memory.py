@@ -1,21 +1,108 @@
 import json
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
+
+from core.crypto_store import Cipher, EncryptedStore
+from core.jsonstream import iter_pairs
 
 
 class GlobalMemory:
-    def __init__(self, path: str = "global_memory.json"):
+    def __init__(self, path: str = "global_memory.json", cipher: Optional[Cipher] = None):
         self.path = Path(path)
         self.data: Dict[str, Any] = {}
+        # С cipher файл — зашифрованное EncryptedStore: update дописывает
+        # одну запись, get читает одну запись без load() всего файла
+        self._store = EncryptedStore(path, cipher) if cipher is not None else None
+        # Зашифрованный режим: ключ из data -> JSON значения, каким оно
+        # лежит в хранилище (после load/update/save). save() пишет только
+        # изменённые ключи и удаляет только те, что были в data и пропали
+        # из неё; записи, не загруженные в data, он не трогает
+        self._synced: Dict[str, str] = {}
 
     def load(self) -> Dict[str, Any]:
-        if self.path.exists():
+        if self._store is not None:
+            self.data = dict(self._store.items())
+            self._synced = {k: _dump(v) for k, v in self.data.items()}
+        elif self.path.exists():
             self.data = json.loads(self.path.read_text(encoding="utf-8"))
         return self.data
 
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self.data:
+            return self.data[key]
+        if self._store is not None:
+            return self._store.get(key, default)
+        return default
+
     def save(self) -> None:
+        if self._store is not None:
+            for key in [k for k in self._synced if k not in self.data]:
+                self._store.delete(key)
+                self._synced.pop(key, None)
+            for key, value in self.data.items():
+                raw = _dump(value)
+                if self._synced.get(key) != raw:
+                    self._store.put(key, value)
+                    self._synced[key] = raw
+            self._store.compact()
+            return
         self.path.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding="utf-8")
 
     def update(self, key: str, value: Any) -> None:
         self.data[key] = value
+        if self._store is not None:
+            self._store.put(key, value)
+            self._store.sync()
+            self._synced[key] = _dump(value)
+            return
         self.save()
+
+    def delete(self, key: str) -> None:
+        self.data.pop(key, None)
+        if self._store is not None:
+            self._store.delete(key)
+            self._store.sync()
+            self._synced.pop(key, None)
+            return
+        self.save()
+
+    def bulk_load(self, source, batch_size: int = 10000) -> int:
+        """
+        Массовый импорт (путь к JSON/JSONL, словарь или записи) с одной
+        записью на диск в конце вместо save() на каждый ключ.
+        """
+        if self._store is None and not self.data:
+            self.load()
+        loaded, batch = 0, {}
+        for key, value in iter_pairs(source):
+            batch[key] = value
+            if len(batch) >= batch_size:
+                loaded += self._apply_batch(batch)
+                batch = {}
+        loaded += self._apply_batch(batch)
+        if self._store is not None:
+            self._store.flush()
+        else:
+            self.save()
+        return loaded
+
+    def _apply_batch(self, batch: Dict[str, Any]) -> int:
+        if self._store is None:
+            self.data.update(batch)
+            return len(batch)
+        # Зашифрованный режим: записи дописываются в файл, в self.data
+        # обновляются только уже загруженные ключи
+        for key, value in batch.items():
+            self._store.put(key, value)
+            if key in self.data:
+                self.data[key] = value
+                self._synced[key] = _dump(value)
+        return len(batch)
+
+    def close(self) -> None:
+        if self._store is not None:
+            self._store.close()
+
+
+def _dump(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
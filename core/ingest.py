@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from core.memory import AssociativeMemory
+from core.metrics import metrics
+
+try:
+    import pdfplumber
+except Exception:
+    pdfplumber = None
+
+
+def file_hash(path: str, block: int = 1 << 20) -> str:
+    """blake2b содержимого файла, читается блоками."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fh:
+        for buf in iter(lambda: fh.read(block), b""):
+            h.update(buf)
+    return h.hexdigest()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def chunk_text(text: str, size: int = 800, overlap: int = 100) -> List[str]:
+    """Режет текст на фрагменты ~size символов по границам слов с перекрытием."""
+    words = text.split()
+    chunks: List[str] = []
+    start = 0
+    while start < len(words):
+        end, length = start, 0
+        while end < len(words) and (length == 0 or length + len(words[end]) + 1 <= size):
+            length += len(words[end]) + 1
+            end += 1
+        chunks.append(" ".join(words[start:end]))
+        if end >= len(words):
+            break
+        # Откат на overlap символов, но всегда вперёд хотя бы на слово
+        back, tail = end, 0
+        while back - 1 > start and tail + len(words[back - 1]) + 1 <= overlap:
+            back -= 1
+            tail += len(words[back]) + 1
+        start = back
+    return chunks
+
+
+def count_pdf_pages(path: str) -> int:
+    if pdfplumber is None:
+        raise RuntimeError("pdfplumber is not installed")
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_pdf_range(path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    # Выполняется в процессе пула: каждый воркер открывает PDF сам
+    if pdfplumber is None:
+        raise RuntimeError("pdfplumber is not installed")
+    out = []
+    with pdfplumber.open(path) as pdf:
+        for i in range(start, min(end, len(pdf.pages))):
+            page = pdf.pages[i]
+            out.append((i + 1, page.extract_text() or ""))
+            page.flush_cache()  # разобранные объекты страницы больше не нужны
+    return out
+
+
+class Ingestor:
+    """
+    Инкрементальная загрузка PDF-руководств в AssociativeMemory.
+
+    Страницы извлекаются пачками по pages_per_task в пуле процессов; в
+    работе не больше 2 * workers пачек, результаты идут потоком по порядку,
+    так что целиком документ в памяти не лежит. Текст страницы режется на
+    фрагменты и индексируется через memory.add_passage.
+
+    Манифест (manifest_path, JSON) хранит хэш файла и хэши страниц:
+    неизменённый файл пропускается без разбора, в изменённом
+    переиндексируются только страницы с другим текстом. Запись манифеста
+    учитывается, только если фрагменты файла действительно есть в памяти:
+    с новой (пустой) памятью всё индексируется заново.
+    """
+    def __init__(
+        self,
+        memory: AssociativeMemory,
+        manifest_path: Optional[str] = None,
+        chunk_size: int = 800,
+        overlap: int = 100,
+        workers: Optional[int] = None,
+        pages_per_task: int = 8,
+        extract_range: Callable[[str, int, int], List[Tuple[int, str]]] = extract_pdf_range,
+        count_pages: Callable[[str], int] = count_pdf_pages,
+    ):
+        self.memory = memory
+        self.manifest_path = Path(manifest_path) if manifest_path else None
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.workers = workers or os.cpu_count() or 1
+        self.pages_per_task = pages_per_task
+        self.extract_range = extract_range
+        self.count_pages = count_pages
+        # путь -> {"hash": ..., "pages": {"1": {"hash": ..., "chunks": n}}}
+        self.manifest: Dict[str, Dict[str, Any]] = {}
+        if self.manifest_path is not None and self.manifest_path.exists():
+            self.manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+
+    def ingest_dir(self, folder: str, pattern: str = "*.pdf") -> Dict[str, int]:
+        """Загружает все PDF папки; пропавшие файлы удаляются из памяти."""
+        stats = {"files": 0, "skipped": 0, "pages": 0, "changed_pages": 0, "removed_files": 0}
+        seen = set()
+        for path in sorted(Path(folder).rglob(pattern)):
+            seen.add(str(path))
+            for k, v in self.ingest_file(str(path), save=False).items():
+                stats[k] += v
+        root = str(Path(folder))
+        for path in [p for p in self.manifest if p not in seen and Path(p).is_relative_to(root)]:
+            self._forget(path)
+            stats["removed_files"] += 1
+        self.save()
+        return stats
+
+    @metrics.timed("ingest.file")
+    def ingest_file(self, path: str, save: bool = True) -> Dict[str, int]:
+        stats = {"files": 1, "skipped": 0, "pages": 0, "changed_pages": 0}
+        digest = file_hash(path)
+        entry = self.manifest.get(path)
+        if entry is not None and not self._indexed(path, entry):
+            entry = None  # манифест от другой памяти (не сохранённой) — фрагментов нет
+        if entry is not None and entry["hash"] == digest:
+            stats["skipped"] = 1
+            return stats
+
+        old_pages: Dict[str, Dict[str, Any]] = entry["pages"] if entry else {}
+        pages: Dict[str, Dict[str, Any]] = {}
+        for page_no, text in self.iter_pages(path):
+            stats["pages"] += 1
+            h = text_hash(text)
+            old = old_pages.get(str(page_no))
+            if old is not None and old["hash"] == h:
+                pages[str(page_no)] = old
+                continue
+            stats["changed_pages"] += 1
+            if old is not None:
+                self._drop_chunks(path, page_no, old["chunks"])
+            chunks = chunk_text(text, self.chunk_size, self.overlap)
+            for n, chunk in enumerate(chunks):
+                self.memory.add_passage(self.chunk_key(path, page_no, n), chunk)
+            pages[str(page_no)] = {"hash": h, "chunks": len(chunks)}
+        # Страницы, которых больше нет (документ стал короче)
+        for page_no, old in old_pages.items():
+            if page_no not in pages:
+                self._drop_chunks(path, int(page_no), old["chunks"])
+
+        self.manifest[path] = {"hash": digest, "pages": pages}
+        metrics.incr("ingest.pages", stats["pages"])
+        if save:
+            self.save()
+        return stats
+
+    def iter_pages(self, path: str) -> Iterator[Tuple[int, str]]:
+        """(номер страницы, текст) по порядку; извлечение идёт параллельно."""
+        total = self.count_pages(path)
+        ranges = [(s, min(s + self.pages_per_task, total)) for s in range(0, total, self.pages_per_task)]
+        if self.workers <= 1 or len(ranges) <= 1:
+            for start, end in ranges:
+                yield from self.extract_range(path, start, end)
+            return
+        try:
+            pool = ProcessPoolExecutor(max_workers=self.workers)
+        except (OSError, NotImplementedError, PermissionError):
+            pool = ThreadPoolExecutor(max_workers=self.workers)
+        with pool:
+            todo, window = iter(ranges), deque()
+            for start, end in todo:
+                window.append(pool.submit(self.extract_range, path, start, end))
+                if len(window) >= 2 * self.workers:
+                    break
+            while window:
+                yield from window.popleft().result()
+                nxt = next(todo, None)
+                if nxt is not None:
+                    window.append(pool.submit(self.extract_range, path, *nxt))
+
+    def save(self) -> None:
+        if self.manifest_path is None:
+            return
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.manifest, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.manifest_path)
+
+    @staticmethod
+    def chunk_key(path: str, page_no: int, n: int) -> str:
+        return f"{path}#p{page_no}:{n}"
+
+    # --- внутреннее ---
+    def _indexed(self, path: str, entry: Dict[str, Any]) -> bool:
+        for page_no, page in entry["pages"].items():
+            if page["chunks"]:
+                return self.memory.get(self.chunk_key(path, int(page_no), 0)) is not None
+        return True
+
+    def _drop_chunks(self, path: str, page_no: int, count: int) -> None:
+        for n in range(count):
+            self.memory.delete(self.chunk_key(path, page_no, n))
+
+    def _forget(self, path: str) -> None:
+        for page_no, old in self.manifest.pop(path)["pages"].items():
+            self._drop_chunks(path, int(page_no), old["chunks"])
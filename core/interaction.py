@@ -1,12 +1,95 @@
-from typing import Any, Dict
+from typing import Any, Dict, Optional
+
+from core.pipeline import Pipeline, PipelineResult
+from core.router import ROUTE_COMMAND, ROUTE_LLM, ROUTE_MEMORY, TextRouter
 
 
 class InteractionManager:
+    """
+    respond() прогоняет запрос через граф стадий (core.pipeline):
+    normalize → route, дальше ветка по маршруту:
+      command — только обработчик команд оркестратора (run_command);
+      memory — только ответ из памяти, генерации нет;
+      остальные (и memory/command с уверенностью ниже route_confidence) — гонка memory против generate: генерация стартует с
+      задержкой hedge_delay (или сразу, как только память промахнулась) и
+      не запускается вовсе, если память уже ответила.
+    Затем, при наличии tts, озвучка.
+
+    Стадии идут в собственном пуле pipeline, а не через планировщик
+    (core.scheduler): допуск проходит сам запрос — respond() ставят в
+    планировщик целиком (см. screens/chat.py). Повторный допуск стадий
+    дважды считал бы лимит сессии, а задача respond(), ждущая свои стадии
+    в том же пуле планировщика, могла бы занять все его потоки и зависнуть.
+    """
+    def __init__(
+        self,
+        router: Optional[TextRouter] = None,
+        orchestrator: Any = None,
+        tts: Any = None,
+        hedge_delay: float = 0.05,
+        generate_timeout: Optional[float] = 30.0,
+        tts_timeout: Optional[float] = 10.0,
+        max_workers: int = 4,
+        route_confidence: float = 2.0,
+    ):
+        self.router = router or TextRouter()
+        self.tts = tts
+        self.hedge_delay = hedge_delay
+        self.generate_timeout = generate_timeout
+        self.tts_timeout = tts_timeout
+        self.max_workers = max_workers
+        self.route_confidence = route_confidence
+        self._orchestrator = orchestrator
+        self._pipeline: Optional[Pipeline] = None
+
     def handle(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         return {"ok": True, "payload": payload}
 
     def route(self, text: str) -> str:
-        return "text" if text and isinstance(text, str) else "unknown"
+        if not text or not isinstance(text, str):
+            return "unknown"
+        route = self.router.route(text)
+        if route in (ROUTE_MEMORY, ROUTE_COMMAND) and self.router.confidence(text, route) < self.route_confidence:
+            return ROUTE_LLM  # слабая догадка — обычная гонка памяти и генерации
+        return route
 
     def process(self, text: str) -> str:
         return text.strip() if isinstance(text, str) else ""
+
+    def respond(self, text: str) -> PipelineResult:
+        return self.pipeline.run({"text": text})
+
+    @property
+    def orchestrator(self):
+        if self._orchestrator is None:
+            from core.orchestrator import Orchestrator
+            self._orchestrator = Orchestrator()
+        return self._orchestrator
+
+    @property
+    def pipeline(self) -> Pipeline:
+        if self._pipeline is None:
+            self._pipeline = self._build_pipeline()
+        return self._pipeline
+
+    def _build_pipeline(self) -> Pipeline:
+        orch = self.orchestrator
+
+        def generate(r):
+            # Через run_inference: одинаковые одновременные запросы делят один
+            # вызов модели (single-flight по маршруту), время идёт в метрики
+            return orch.run_inference(r["normalize"], route=r["route"], check_memory=False)
+
+        p = Pipeline(max_workers=self.max_workers)
+        p.add("normalize", lambda r: self.process(r["text"]))
+        p.add("route", lambda r: self.route(r["normalize"]), deps=("normalize",))
+        p.add("command", lambda r: orch.run_command(r["normalize"]), deps=("normalize", "route"),
+              when=lambda r: r["route"] == ROUTE_COMMAND)
+        p.add("memory", lambda r: orch.answer_from_memory(r["normalize"]), deps=("normalize", "route"),
+              when=lambda r: r["route"] != ROUTE_COMMAND)
+        p.add("generate", generate, deps=("normalize", "route"), timeout=self.generate_timeout, delay=self.hedge_delay,
+              when=lambda r: r["route"] not in (ROUTE_COMMAND, ROUTE_MEMORY))
+        p.hedge("answer", ("command", "memory", "generate"))
+        if self.tts is not None:
+            p.add("tts", lambda r: self.tts.synthesize(str(r["answer"])), deps=("answer",), timeout=self.tts_timeout)
+        return p
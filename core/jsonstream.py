@@ -0,0 +1,115 @@
+import json
+import re
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Tuple, Union
+
+_WS = re.compile(r"\s*")
+_DELIMS = frozenset(",]}: \t\r\n")
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """Буфер поверх файла: дочитывает блоки, пока значение не разберётся целиком."""
+    def __init__(self, fh, chunk_size: int):
+        self.fh = fh
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        chunk = self.fh.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, ch: str) -> None:
+        if self.peek() != ch:
+            raise ValueError(f"Expected {ch!r} at offset {self.pos}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # Число на границе блока могло оборваться: "12" + "3", "1." + "25",
+            # "3e" + "10" — raw_decode вернёт короткое число; дочитываем, пока
+            # за ним не окажется разделитель
+            if (
+                isinstance(obj, (int, float)) and not isinstance(obj, bool)
+                and (end == len(self.buf) or self.buf[end] not in _DELIMS)
+                and not self.eof and self.fill()
+            ):
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_json(path: Union[str, Path], chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    Потоковый разбор без загрузки файла целиком: .jsonl/.ndjson — значение
+    за значением, JSON-массив — по элементу, JSON-объект — по паре (ключ, значение).
+    """
+    p = Path(path)
+    with open(p, encoding="utf-8") as fh:
+        r = _Reader(fh, chunk_size)
+        if p.suffix in (".jsonl", ".ndjson"):
+            while r.peek():
+                yield r.value()
+            return
+        first = r.peek()
+        if first not in ("[", "{"):
+            if first:
+                yield r.value()
+            return
+        close = "]" if first == "[" else "}"
+        r.pos += 1
+        while r.peek() != close:
+            if first == "[":
+                yield r.value()
+            else:
+                key = r.value()
+                r.expect(":")
+                yield key, r.value()
+            if r.peek() == ",":
+                r.pos += 1
+            elif r.peek() != close:
+                raise ValueError(f"Expected ',' or {close!r} at offset {r.pos}")
+
+
+def to_pair(record: Any) -> Tuple[Any, Any]:
+    """Запись → (ключ, значение): [k, v], {"key": k, "value": v} или {k: v}."""
+    if isinstance(record, (list, tuple)) and len(record) == 2:
+        return record[0], record[1]
+    if isinstance(record, dict):
+        if "key" in record and "value" in record:
+            return record["key"], record["value"]
+        if len(record) == 1:
+            return next(iter(record.items()))
+    raise ValueError(f"Unsupported record: {record!r:.80}")
+
+
+def iter_pairs(source: Union[str, Path, dict, Iterable[Any]]) -> Iterator[Tuple[Any, Any]]:
+    """Пары из пути к JSON/JSONL, словаря или итерируемого записей."""
+    if isinstance(source, (str, Path)):
+        source = iter_json(source)
+    elif isinstance(source, dict):
+        source = source.items()
+    for record in source:
+        yield to_pair(record)
@@ -1,21 +1,207 @@
-from typing import Any
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+LEVELS: Dict[str, int] = {"debug": 10, "info": 20, "warn": 30, "error": 40}
+
+
+class JsonlWriter:
+    """
+    Фоновый писатель JSONL: вызывающий только кладёт запись в очередь,
+    сериализация, запись, ротация и fsync — в отдельном потоке. Ошибка
+    записи (например, диск заполнен) уходит в stderr, пачка теряется
+    (считается в dropped), а поток продолжает работу. rotate_interval
+    отсчитывается от создания файла, а не от запуска процесса.
+    """
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 5 * 1024 * 1024,
+        backup_count: int = 3,
+        rotate_interval: Optional[float] = None,
+        fsync_every: int = 64,
+        flush_interval: float = 1.0,
+        queue_size: int = 10000,
+    ):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.rotate_interval = rotate_interval
+        self.fsync_every = fsync_every
+        self.flush_interval = flush_interval
+        self.dropped = 0
+
+        self._q: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=queue_size)
+        self._fh = None
+        self._started_at = 0.0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="jsonl-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, record: Dict[str, Any]) -> None:
+        try:
+            self._q.put_nowait(record)
+        except queue.Full:
+            # Лучше потерять строку лога, чем задержать запрос
+            self.dropped += 1
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._q.put(None)
+            self._thread.join()
+
+    # --- фоновый поток ---
+    def _run(self) -> None:
+        while True:
+            try:
+                item = self._q.get(timeout=self.flush_interval)
+            except queue.Empty:
+                try:
+                    self._sync(force=True)
+                except Exception as e:
+                    self._fail(e, self._unsynced)
+                continue
+            batch = [item]
+            while len(batch) < self.fsync_every:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            records = [r for r in batch if r is not None]
+            try:
+                self._write(records)
+                self._sync(force=stop)
+            except Exception as e:
+                self._fail(e, len(records))
+            if stop:
+                if self._fh:
+                    try:
+                        self._fh.close()
+                    except OSError:
+                        pass
+                    self._fh = None
+                return
+
+    def _fail(self, error: Exception, lost: int) -> None:
+        # Логгеру некуда писать о себе, кроме stderr. Файл переоткроется на
+        # следующей пачке — после ротации или если место освободится
+        self.dropped += lost
+        sys.stderr.write(f"JsonlWriter: {self.path}: {error!r}, {lost} records dropped\n")
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            except OSError:
+                pass
+            self._fh = None
+        self._unsynced = 0
+
+    def _write(self, records) -> None:
+        if not records:
+            return
+        self._maybe_rotate()
+        fh = self._open()
+        for r in records:
+            fh.write(json.dumps(r, ensure_ascii=False, default=str) + "\n")
+        self._unsynced += len(records)
+
+    def _sync(self, force: bool = False) -> None:
+        if not self._fh or not self._unsynced:
+            return
+        due = time.monotonic() - self._last_sync >= self.flush_interval
+        if force or due or self._unsynced >= self.fsync_every:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def _open(self):
+        if self._fh is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = open(self.path, "a", encoding="utf-8")
+            self._started_at = self._file_started()
+        return self._fh
+
+    def _file_started(self) -> float:
+        # Время создания файла: st_birthtime там, где оно есть, иначе ts
+        # первой записи — перезапуск процесса не сдвигает срок ротации
+        st = os.stat(self.path)
+        born = getattr(st, "st_birthtime", None)
+        if born:
+            return born
+        try:
+            with open(self.path, "rb") as fh:
+                return float(json.loads(fh.readline(4096))["ts"])
+        except (ValueError, KeyError, TypeError):
+            return time.time()
+
+    def _maybe_rotate(self) -> None:
+        if self._fh is None:
+            if not self.path.exists():
+                return
+            self._open()
+        by_size = self.max_bytes and self._fh.tell() >= self.max_bytes
+        by_time = self.rotate_interval and time.time() - self._started_at >= self.rotate_interval
+        if not (by_size or by_time):
+            return
+        self._sync(force=True)
+        self._fh.close()
+        self._fh = None
+        for i in range(self.backup_count - 1, 0, -1):
+            src = self.path.with_name(f"{self.path.name}.{i}")
+            if src.exists():
+                os.replace(src, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backup_count > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
 
 
 class Logger:
-    def __init__(self):
+    """
+    Без path ведёт себя как раньше (только .last). С path — структурные
+    JSONL-записи уходят в фоновый JsonlWriter, без I/O на пути запроса.
+    """
+    def __init__(self, path: Optional[str] = None, level: str = "debug", **writer_opts: Any):
         self.last = ""
+        self.level = LEVELS.get(level.lower(), LEVELS["debug"])
+        self._writer = JsonlWriter(path, **writer_opts) if path else None
 
-    def log(self, level: str, msg: str, *args: Any) -> None:
+    def log(self, level: str, msg: str, *args: Any, **fields: Any) -> None:
+        # Фильтр по уровню — до любого форматирования
+        if LEVELS.get(level.lower(), LEVELS["info"]) < self.level:
+            return
         self.last = f"[{level.upper()}] {msg}"
+        if self._writer:
+            record = {"ts": time.time(), "level": level.lower(), "msg": msg}
+            if args:
+                record["args"] = args
+            record.update(fields)
+            self._writer.put(record)
+
+    def info(self, msg: str, **fields: Any) -> None:
+        self.log("info", msg, **fields)
+
+    def warn(self, msg: str, **fields: Any) -> None:
+        self.log("warn", msg, **fields)
 
-    def info(self, msg: str) -> None:
-        self.log("info", msg)
+    def error(self, msg: str, **fields: Any) -> None:
+        self.log("error", msg, **fields)
 
-    def warn(self, msg: str) -> None:
-        self.log("warn", msg)
+    def debug(self, msg: str, **fields: Any) -> None:
+        self.log("debug", msg, **fields)
 
-    def error(self, msg: str) -> None:
-        self.log("error", msg)
+    def interaction(self, prompt: str, response: str, **fields: Any) -> None:
+        self.log("info", "interaction", prompt=prompt, response=response, **fields)
 
-    def debug(self, msg: str) -> None:
-        self.log("debug", msg)
+    def close(self) -> None:
+        if self._writer:
+            self._writer.close()
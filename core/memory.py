@@ -1,19 +1,365 @@
+import json
+import math
+import random
+import re
+import zlib
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from core.jsonstream import iter_pairs
+from core.memory_snapshot import Snapshot, write_snapshot
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+_PUNCT_RE = re.compile(r"[^\w\s]+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize(text: Any) -> str:
+    """Нормализует запрос: регистр, ё→е, без пунктуации, одиночные пробелы."""
+    t = str(text or "").lower().replace("ё", "е")
+    t = _PUNCT_RE.sub(" ", t)
+    return _SPACE_RE.sub(" ", t).strip()
+
+
+_PRIME = (1 << 31) - 1
+
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    """Символьные n-граммы нормализованного текста."""
+    t = normalize(text)
+    if len(t) <= size:
+        return {t}
+    return {t[i:i + size] for i in range(len(t) - size + 1)}
+
+
+class MinHashLSH:
+    """
+    Поиск почти-дублей: MinHash-сигнатуры ключа и значения, LSH по полосам
+    сигнатуры ключа. Кандидаты — только записи с общей полосой, так что
+    попарного сравнения всех записей нет. Дубль — когда оценка Жаккара
+    и ключей, и значений не ниже threshold.
+    """
+    def __init__(self, num_perm: int = 64, bands: int = 16, threshold: float = 0.8, shingle: int = 3, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle = shingle
+        rng = random.Random(seed)
+        self._a = [rng.randrange(1, _PRIME) for _ in range(num_perm)]
+        self._b = [rng.randrange(0, _PRIME) for _ in range(num_perm)]
+        if np is not None:
+            self._va = np.array(self._a, dtype=np.uint64)[:, None]
+            self._vb = np.array(self._b, dtype=np.uint64)[:, None]
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[Any]] = {}
+        self._sigs: Dict[Any, Tuple[Tuple[int, ...], Tuple[int, ...]]] = {}
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        hs = [zlib.crc32(s.encode("utf-8")) & _PRIME for s in shingles(text, self.shingle)]
+        if np is not None:
+            h = np.array(hs, dtype=np.uint64)[None, :]
+            return tuple(((self._va * h + self._vb) % _PRIME).min(axis=1).tolist())
+        return tuple(min((a * x + b) % _PRIME for x in hs) for a, b in zip(self._a, self._b))
+
+    def signatures(self, key, value) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+        text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+        return self.signature(str(key)), self.signature(text)
+
+    @staticmethod
+    def similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+        return sum(x == y for x, y in zip(a, b)) / len(a)
+
+    def match(self, key, value) -> Tuple[Optional[Any], Tuple[Tuple[int, ...], Tuple[int, ...]]]:
+        """(ключ лучшего почти-дубля или None, сигнатуры записи для add())."""
+        sigs = self.signatures(key, value)
+        best, best_score = None, self.threshold
+        for cand in self._candidates(sigs[0]):
+            if cand == key:
+                continue
+            ks, vs = self._sigs[cand]
+            score = min(self.similarity(sigs[0], ks), self.similarity(sigs[1], vs))
+            if score >= best_score:
+                best, best_score = cand, score
+        return best, sigs
+
+    def add(self, key, sigs) -> None:
+        self.remove(key)
+        self._sigs[key] = sigs
+        for band in self._bands(sigs[0]):
+            self._buckets.setdefault(band, set()).add(key)
+
+    def remove(self, key) -> None:
+        sigs = self._sigs.pop(key, None)
+        if sigs is None:
+            return
+        for band in self._bands(sigs[0]):
+            keys = self._buckets.get(band)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._buckets[band]
+
+    def clear(self) -> None:
+        self._buckets.clear()
+        self._sigs.clear()
+
+    def _bands(self, sig: Tuple[int, ...]):
+        r = self.rows
+        return [(i, sig[i * r:(i + 1) * r]) for i in range(self.bands)]
+
+    def _candidates(self, sig: Tuple[int, ...]) -> Set[Any]:
+        out: Set[Any] = set()
+        for band in self._bands(sig):
+            out |= self._buckets.get(band, set())
+        return out
+
+
 class AssociativeMemory:
-    def __init__(self):
+    # Слово, встречающееся в ключах чаще этого ("как", "что"), не сужает
+    # нечёткий поиск — кандидаты по нему не собираются
+    fuzzy_limit = 1000
+
+    def __init__(self, dedup: Optional[MinHashLSH] = None):
         # простое key-value хранилище
         self._store = {}
+        # индексы для быстрых ответов:
+        # нормализованный ключ -> ключи с ним в порядке добавления
+        # (у "Привет" и "привет!" он общий), слово -> нормализованные ключи
+        self._norm: Dict[str, Dict[Any, None]] = {}
+        self._tokens: Dict[str, Set[str]] = {}
+        # полнотекстовый индекс фрагментов (документы): слово -> ключи
+        self._passages: Dict[str, Set[Any]] = {}
+        self._passage_words: Dict[Any, Set[str]] = {}
+        # неизменяемый снимок (load_snapshot) под изменениями в словарях выше;
+        # _shadowed — записи снимка, удалённые или перезаписанные после загрузки
+        self._base: Optional[Snapshot] = None
+        self._shadowed: Set[int] = set()
+        # почти-дубли: с dedup новые записи, похожие на уже сохранённые,
+        # становятся псевдонимами — ключ индексируется, значение не хранится
+        self._dedup = dedup
+        # _alias_of: канонический ключ -> его псевдонимы в порядке появления
+        self._aliases: Dict[Any, Any] = {}
+        self._alias_of: Dict[Any, Dict[Any, None]] = {}
+
+    @classmethod
+    def from_json(cls, path: str) -> "AssociativeMemory":
+        """Загружает пары вопрос→ответ из JSON-объекта."""
+        mem = cls()
+        if Path(path).exists():
+            mem.bulk_load(path)
+        return mem
+
+    def bulk_load(self, source, batch_size: int = 10000) -> int:
+        """
+        Массовая загрузка из пути (JSONL, JSON-массив или объект — разбор
+        потоковый), словаря или итерируемого записей. Записи вносятся
+        пачками без индексации, индексы строятся один раз в конце, при
+        включённом dedup — одним проходом compact(). Возвращает число записей.
+        """
+        loaded, fresh, batch = 0, [], {}
+        for key, value in iter_pairs(source):
+            batch[key] = value
+            if len(batch) >= batch_size:
+                loaded += self._apply_batch(batch, fresh)
+                batch = {}
+        loaded += self._apply_batch(batch, fresh)
+        for key in fresh:
+            self._index(key)
+        if self._dedup is not None:
+            self.compact()
+        return loaded
+
+    @classmethod
+    def from_store(cls, store) -> "AssociativeMemory":
+        """Загружает пары из хранилища с items() (например, EncryptedStore)."""
+        mem = cls()
+        for k, v in store.items():
+            mem.set(k, v)
+        return mem
+
+    @classmethod
+    def load_snapshot(cls, path: str) -> "AssociativeMemory":
+        """
+        Открывает снимок через mmap: индексы уже готовы, значения разбираются
+        при обращении. Изменения после загрузки живут в памяти поверх снимка.
+        """
+        mem = cls()
+        mem._base = Snapshot.open(path)
+        mem._load_aliases(mem._base)
+        return mem
+
+    def save_snapshot(self, path: str) -> None:
+        """
+        Сохраняет всё содержимое (снимок + изменения) в бинарный снимок.
+        Псевдонимы почти-дублей пишутся отдельно от записей, без значений.
+        """
+        write_snapshot(self._entries(), path, self._aliases)
 
     def set(self, key, value):
         """Сохраняет значение по ключу."""
+        if key in self._aliases:
+            self._unalias(key)
+        elif key not in self._store:
+            self._shadow(key)
+            self._index(key)
+        if self._dedup is None:
+            self._store[key] = value
+            return
+        canonical, sigs = self._dedup.match(key, value)
+        if canonical is not None and key not in self._alias_of:
+            self._store.pop(key, None)
+            self._dedup.remove(key)
+            self._make_alias(key, canonical)
+            return
         self._store[key] = value
+        self._dedup.add(key, sigs)
 
     def get(self, key, default=None):
         """Возвращает значение по ключу, если оно есть."""
-        return self._store.get(key, default)
+        key = self._aliases.get(key, key)
+        if key in self._store:
+            return self._store[key]
+        # снимок читается один раз: его могут подменить из другого потока
+        base = self._base
+        if base is None or not isinstance(key, str):
+            return default
+        i = base.find_key(key)
+        return base.value(i) if i >= 0 and i not in self._shadowed else default
+
+    def items(self) -> Iterator[Tuple[Any, Any]]:
+        """Все пары; значения из снимка разбираются по мере обхода."""
+        yield from self._store.items()
+        base = self._base
+        for i in self._base_live(base):
+            yield base.key(i), base.value(i)
+
+    def delete(self, key) -> bool:
+        """
+        Удаляет ключ вместе с записями в индексах. Значение удалённого
+        канонического ключа переходит к его первому псевдониму, остальные
+        псевдонимы указывают теперь на него.
+        """
+        if key in self._aliases:
+            self._unalias(key)
+            self._unindex(key)
+            return True
+        if key not in self._store and self._base_id(key) < 0:
+            return False
+        aliases = list(self._alias_of.pop(key, ()))
+        value = self.get(key) if aliases else None
+        if key in self._store:
+            del self._store[key]
+        else:
+            self._shadow(key)
+        if self._dedup is not None:
+            self._dedup.remove(key)
+        self._unindex(key)
+        if aliases:
+            self._promote(aliases, value)
+        return True
+
+    def compact(self, lsh: Optional[MinHashLSH] = None) -> Dict[str, int]:
+        """
+        Массовое слияние почти-дублей (в том числе записей снимка): каждая
+        запись сверяется только с кандидатами LSH. Первая из группы остаётся
+        канонической, остальные становятся её псевдонимами.
+        """
+        lsh = lsh or self._dedup or MinHashLSH()
+        lsh.clear()
+        merged = 0
+        for key, value in list(self.items()):
+            canonical, sigs = lsh.match(key, value)
+            if canonical is None:
+                lsh.add(key, sigs)
+                continue
+            if key in self._store:
+                del self._store[key]
+            else:
+                self._shadow(key)
+                self._index(key)
+            self._make_alias(key, canonical)
+            merged += 1
+        return {"entries": len(self._store) + sum(1 for _ in self._base_live()), "merged": merged, "aliases": len(self._aliases)}
+
+    def _unindex(self, key) -> None:
+        n = normalize(key)
+        keys = self._norm.get(n)
+        if keys is not None and keys.pop(key, 0) is None and not keys:
+            # последний ключ с этой нормальной формой — убираем её из индексов
+            del self._norm[n]
+            for tok in n.split():
+                keys = self._tokens.get(tok)
+                if keys is not None:
+                    keys.discard(n)
+                    if not keys:
+                        del self._tokens[tok]
+        for word in self._passage_words.pop(key, ()):
+            keys = self._passages.get(word)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._passages[word]
 
     def clear(self):
         """Очищает всё хранилище."""
         self._store.clear()
+        self._norm.clear()
+        self._tokens.clear()
+        self._passages.clear()
+        self._passage_words.clear()
+        if self._base is not None:
+            self._base.close()
+            self._base = None
+        self._shadowed.clear()
+        self._aliases.clear()
+        self._alias_of.clear()
+        if self._dedup is not None:
+            self._dedup.clear()
+
+    def add_passage(self, key, text: str, value: Any = None) -> None:
+        """
+        Сохраняет фрагмент документа (value или сам текст) и индексирует
+        его слова для find(). Повторное добавление ключа переиндексирует его.
+        """
+        self.delete(key)
+        self.set(key, text if value is None else value)
+        words = set(normalize(text).split())
+        self._passage_words[key] = words
+        for word in words:
+            self._passages.setdefault(word, set()).add(key)
+
+    def find(self, query: str, limit: int = 5) -> List[Tuple[Any, Any, float]]:
+        """
+        Поиск по фрагментам: ключи ранжируются по сумме idf совпавших слов,
+        нормированной на idf всего запроса. Возвращает [(ключ, значение, score)].
+        """
+        words = set(normalize(query).split())
+        base = self._base
+        total = len(self._passage_words) + (base.passages if base is not None else 0)
+        if not words or not total:
+            return []
+        postings: Dict[str, List[Tuple[int, Any]]] = {}
+        for w in words:
+            # ссылки (0, ключ) — изменения в памяти, (1, номер) — записи снимка
+            hits = [(0, k) for k in self._passages.get(w, ())]
+            if base is not None:
+                hits.extend((1, i) for i in base.word_ids(w) if i not in self._shadowed)
+            if hits:
+                postings[w] = hits
+        idf = {w: math.log(1 + total / len(hits)) for w, hits in postings.items()}
+        norm = sum(idf.values()) + math.log(1 + total) * (len(words) - len(idf))
+        scores: Dict[Tuple[int, Any], float] = {}
+        for word, weight in idf.items():
+            for ref in postings[word]:
+                scores[ref] = scores.get(ref, 0.0) + weight
+        best = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+        return [self._resolve(ref, base) + (sc / norm,) for ref, sc in best]
 
     def search(self, query: str):
         """
@@ -21,7 +367,147 @@ class AssociativeMemory:
         Возвращает список подходящих ключей.
         """
         q = (query or "").lower()
-        return [
-            k for k, v in self._store.items()
-            if q in str(k).lower() or q in str(v).lower()
-        ]
+        found = [k for k, v in self._store.items() if q in str(k).lower() or q in str(v).lower()]
+        base = self._base
+        if base is not None:
+            # Снимок ищет по готовому тексту, не разбирая значения
+            found.extend(base.key(i) for i in base.search(q) if i not in self._shadowed)
+        return found
+
+    def lookup(self, query: str, min_score: float = 0.85) -> Optional[Tuple[Any, Any, float]]:
+        """
+        Ответ из памяти: сначала точное совпадение нормализованного ключа,
+        затем нечёткое среди ключей с общими словами. Возвращает
+        (ключ, значение, уверенность) или None, если уверенность ниже порога.
+        """
+        q = normalize(query)
+        if not q:
+            return None
+        keys = self._norm.get(q)
+        if keys:
+            key = next(iter(keys))
+            key = self._aliases.get(key, key)
+            return key, self.get(key), 1.0
+        base = self._base
+        if base is not None:
+            for i in base.norm_ids(q):
+                if i not in self._shadowed:
+                    return base.key(i), base.value(i), 1.0
+
+        candidates: Set[str] = set()
+        from_base: Dict[str, int] = {}
+        for tok in q.split():
+            local = self._tokens.get(tok, ())
+            ids = base.token_ids(tok) if base is not None else ()
+            if len(local) + len(ids) > self.fuzzy_limit:
+                continue
+            candidates.update(local)
+            if base is not None:
+                for i in ids:
+                    if i not in self._shadowed:
+                        from_base.setdefault(base.norm(i), i)
+        candidates |= from_base.keys()
+
+        best, best_score = None, min_score
+        matcher = SequenceMatcher(None, autojunk=False)
+        matcher.set_seq2(q)
+        for cand in candidates:
+            matcher.set_seq1(cand)
+            if matcher.real_quick_ratio() < best_score or matcher.quick_ratio() < best_score:
+                continue
+            score = matcher.ratio()
+            if score >= best_score:
+                best, best_score = cand, score
+        if best is None:
+            return None
+        keys = self._norm.get(best)
+        if not keys:
+            i = from_base[best]
+            return base.key(i), base.value(i), best_score
+        key = next(iter(keys))
+        key = self._aliases.get(key, key)
+        return key, self.get(key), best_score
+
+    def _index(self, key) -> None:
+        n = normalize(key)
+        self._norm.setdefault(n, {})[key] = None
+        for tok in n.split():
+            self._tokens.setdefault(tok, set()).add(n)
+
+    def _base_id(self, key) -> int:
+        if self._base is None or not isinstance(key, str):
+            return -1
+        i = self._base.find_key(key)
+        return -1 if i < 0 or i in self._shadowed else i
+
+    def _base_live(self, base: Optional[Snapshot] = None) -> Iterator[int]:
+        base = self._base if base is None else base
+        if base is not None:
+            for i in range(len(base)):
+                if i not in self._shadowed:
+                    yield i
+
+    def _shadow(self, key) -> bool:
+        # Скрывает запись снимка при перезаписи/удалении ключа
+        i = self._base_id(key)
+        if i < 0:
+            return False
+        self._shadowed.add(i)
+        return True
+
+    def _apply_batch(self, batch: Dict[Any, Any], fresh: List[Any]) -> int:
+        for key in batch:
+            if key in self._aliases:
+                self._unalias(key)
+            elif key not in self._store:
+                self._shadow(key)
+                fresh.append(key)
+        self._store.update(batch)
+        return len(batch)
+
+    def _make_alias(self, key, canonical) -> None:
+        canonical = self._aliases.get(canonical, canonical)
+        self._aliases[key] = canonical
+        self._alias_of.setdefault(canonical, {})[key] = None
+        # псевдонимы самого key переходят к новому каноническому ключу
+        for alias in self._alias_of.pop(key, ()):
+            self._aliases[alias] = canonical
+            self._alias_of[canonical][alias] = None
+
+    def _unalias(self, key) -> None:
+        canonical = self._aliases.pop(key)
+        aliases = self._alias_of.get(canonical)
+        if aliases is not None:
+            aliases.pop(key, None)
+            if not aliases:
+                del self._alias_of[canonical]
+
+    def _promote(self, aliases: List[Any], value: Any) -> None:
+        # Первый псевдоним становится каноническим ключом со значением
+        new = aliases[0]
+        del self._aliases[new]
+        self._store[new] = value
+        self._index(new)  # нормализованный ключ мог принадлежать удалённому
+        for alias in aliases[1:]:
+            self._aliases[alias] = new
+            self._alias_of.setdefault(new, {})[alias] = None
+        if self._dedup is not None:
+            self._dedup.add(new, self._dedup.signatures(new, value))
+
+    def _load_aliases(self, base: Snapshot) -> None:
+        # Псевдонимы из снимка индексируются в памяти: в индексах снимка их нет
+        for alias, canonical in base.aliases.items():
+            self._make_alias(alias, canonical)
+            self._index(alias)
+
+    def _resolve(self, ref: Tuple[int, Any], base: Optional[Snapshot]) -> Tuple[Any, Any]:
+        if ref[0]:
+            return base.key(ref[1]), base.value(ref[1])
+        return ref[1], self.get(ref[1])
+
+    def _entries(self):
+        for key, value in self._store.items():
+            words = self._passage_words.get(key)
+            yield key, value, normalize(key), sorted(words) if words is not None else None
+        for i in self._base_live():
+            yield self._base.key(i), self._base.value(i), self._base.norm(i), self._base.passage_words(i)
@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+
+from core.memory import AssociativeMemory
+from core.memory_snapshot import Snapshot
+
+CURRENT = "CURRENT"
+
+
+def current_version(directory: str) -> Optional[int]:
+    try:
+        return int((Path(directory) / CURRENT).read_text(encoding="ascii").strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def snapshot_path(directory: str, version: int) -> Path:
+    return Path(directory) / f"memory-{version:08d}.snap"
+
+
+class SnapshotPublisher:
+    """
+    Единственный писатель: сохраняет память новой версией снимка и
+    атомарно переключает CURRENT (tmp + os.replace). Старые версии сверх
+    keep удаляются — уже открытые читателями mmap остаются валидны.
+    """
+    def __init__(self, directory: str, keep: int = 2):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.keep = max(1, keep)
+
+    def publish(self, memory: AssociativeMemory) -> int:
+        version = (current_version(self.directory) or 0) + 1
+        memory.save_snapshot(str(snapshot_path(self.directory, version)))
+        tmp = self.directory / (CURRENT + ".tmp")
+        tmp.write_text(str(version), encoding="ascii")
+        os.replace(tmp, self.directory / CURRENT)
+        self._prune(version)
+        return version
+
+    def _prune(self, version: int) -> None:
+        for p in self.directory.glob("memory-*.snap"):
+            try:
+                v = int(p.stem.split("-", 1)[1])
+            except ValueError:
+                continue
+            if v <= version - self.keep:
+                try:
+                    p.unlink()
+                except OSError:
+                    pass  # Windows: файл ещё отображён читателем
+
+
+class _State(NamedTuple):
+    version: int
+    # Память поверх снимка версии с готовыми псевдонимами и индексами;
+    # после публикации в SharedMemoryReader не меняется
+    memory: AssociativeMemory
+
+
+class SharedMemoryReader(AssociativeMemory):
+    """
+    AssociativeMemory только для чтения поверх опубликованного снимка.
+
+    Каждый процесс отображает один и тот же файл через mmap, так что
+    страницы лежат в памяти один раз на всю машину. Не чаще раза в
+    check_interval секунд проверяется CURRENT; новая версия собирается
+    целиком (снимок, псевдонимы, индексы) в неизменяемое состояние и
+    подменяет старое одним присваиванием. Каждый запрос берёт ссылку на
+    состояние один раз, так что версии внутри запроса не смешиваются.
+    Старые снимки явно не закрываются: mmap освободит сборщик мусора,
+    когда завершится последний запрос, начатый на нём.
+    Для RAM-хранения каталог можно положить в /dev/shm.
+    """
+    def __init__(self, directory: str, check_interval: float = 1.0):
+        super().__init__()
+        self.directory = Path(directory)
+        self.check_interval = check_interval
+        self._checked = 0.0
+        self._state: Optional[_State] = None
+        self._empty = AssociativeMemory()
+        self._swap_lock = threading.Lock()
+        self._closed = False
+        self.refresh(force=True)
+
+    @property
+    def version(self) -> Optional[int]:
+        state = self._state
+        return state.version if state is not None else None
+
+    def refresh(self, force: bool = False) -> bool:
+        """Переключается на новую версию, если она вышла. True — если переключился."""
+        now = time.monotonic()
+        if self._closed or (not force and now - self._checked < self.check_interval):
+            return False
+        self._checked = now
+        version = current_version(self.directory)
+        if version is None or version == self.version:
+            return False
+        with self._swap_lock:
+            if self._closed or version == self.version:
+                return False
+            try:
+                snap = Snapshot.open(str(snapshot_path(self.directory, version)))
+            except FileNotFoundError:
+                return False  # писатель уже выпустил следующую — подхватим её позже
+            staged = AssociativeMemory()
+            staged._base = snap
+            staged._load_aliases(snap)
+            self._state = _State(version, staged)
+        return True
+
+    def get(self, key, default=None):
+        return self._current().get(key, default)
+
+    def items(self):
+        return self._current().items()
+
+    def lookup(self, query: str, min_score: float = 0.85):
+        return self._current().lookup(query, min_score)
+
+    def find(self, query: str, limit: int = 5):
+        return self._current().find(query, limit)
+
+    def search(self, query: str):
+        return self._current().search(query)
+
+    def save_snapshot(self, path: str) -> None:
+        self._current().save_snapshot(path)
+
+    def _current(self) -> AssociativeMemory:
+        self.refresh()
+        state = self._state
+        return state.memory if state is not None else self._empty
+
+    def _read_only(self, *args: Any, **kwargs: Any) -> None:
+        raise TypeError("SharedMemoryReader is read-only; publish changes with SnapshotPublisher")
+
+    set = delete = add_passage = bulk_load = compact = clear = _read_only
+
+    def close(self) -> None:
+        # Ссылка на снимок просто отпускается: запросы, ещё читающие его,
+        # доработают, а mmap закроется вместе с последней ссылкой
+        with self._swap_lock:
+            self._closed = True
+            self._state = None
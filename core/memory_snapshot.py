@@ -0,0 +1,321 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+MAGIC = b"LVXMEM1\x00"
+VERSION = 3
+# Секции снимка в порядке заголовка: (смещение, длина) каждой
+SECTIONS = (
+    "meta",
+    "key_offs", "key_blob", "val_offs", "val_blob", "norm_offs", "norm_blob",
+    "pw_offs", "pw_blob",
+    "key_table",
+    "nrm_offs", "nrm_blob", "nrm_table", "nrm_post_offs", "nrm_post",
+    "tok_offs", "tok_blob", "tok_table", "tok_post_offs", "tok_post",
+    "word_offs", "word_blob", "word_table", "word_post_offs", "word_post",
+    "search_offs", "search_blob",
+)
+_HEADER = struct.Struct("<8sII")
+_SECTION = struct.Struct("<QQ")
+HEADER_SIZE = _HEADER.size + _SECTION.size * len(SECTIONS)
+
+
+def _strings(items: List[bytes]) -> Tuple[bytes, bytes]:
+    offs, pos = array("Q", [0]), 0
+    for b in items:
+        pos += len(b)
+        offs.append(pos)
+    return offs.tobytes(), b"".join(items)
+
+
+def _table(items: List[bytes], ids: Iterable[int]) -> bytes:
+    """Открытая адресация: слот = crc32 & mask, значение = id + 1 (0 — пусто)."""
+    size = 8
+    while size < 2 * max(1, len(items)):
+        size *= 2
+    mask, slots = size - 1, array("I", bytes(4 * size))
+    for i in ids:
+        h = zlib.crc32(items[i]) & mask
+        while slots[h]:
+            h = (h + 1) & mask
+        slots[h] = i + 1
+    return slots.tobytes()
+
+
+def _postings(groups: List[List[int]]) -> Tuple[bytes, bytes]:
+    offs, ids = array("Q", [0]), array("I")
+    for g in groups:
+        ids.extend(g)
+        offs.append(len(ids))
+    return offs.tobytes(), ids.tobytes()
+
+
+def _inverted(entry_words: List[List[str]]) -> Tuple[List[bytes], List[List[int]]]:
+    index = {}
+    for i, words in enumerate(entry_words):
+        for w in words:
+            index.setdefault(w, []).append(i)
+    terms = list(index)
+    return [t.encode("utf-8") for t in terms], [index[t] for t in terms]
+
+
+def build_snapshot(
+    entries: Iterable[Tuple[str, Any, str, Optional[List[str]]]],
+    aliases: Optional[Dict[str, str]] = None,
+) -> bytes:
+    """
+    Собирает снимок из (ключ, значение, нормализованный ключ, слова фрагмента
+    или None). Значения хранятся JSON-строками и разбираются только при чтении.
+    aliases (псевдоним -> канонический ключ) сохраняются в meta.
+    """
+    keys, vals, norms, pws, texts = [], [], [], [], []
+    tok_words, passage_words, entry_norms = [], [], []
+    for key, value, norm, words in entries:
+        if not isinstance(key, str):
+            raise TypeError(f"Snapshot keys must be str, got {type(key).__name__}")
+        keys.append(key.encode("utf-8"))
+        vals.append(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        norms.append(norm.encode("utf-8"))
+        # Текст для search(): ключ и значение уже в нижнем регистре
+        texts.append(f"{key.lower()}\x00{str(value).lower()}".encode("utf-8"))
+        # Нормальная форма бывает общей у нескольких ключей: индексируются все
+        # записи с ней, чтобы после удаления одной находились остальные
+        entry_norms.append([norm])
+        tok_words.append(norm.split())
+        passage_words.append(sorted(words) if words is not None else [])
+        pws.append(" ".join(words).encode("utf-8") if words is not None else b"\x00")
+
+    aliases = dict(aliases or {})
+    for alias, canonical in aliases.items():
+        if not isinstance(alias, str) or not isinstance(canonical, str):
+            raise TypeError("Snapshot aliases must map str to str")
+
+    nrms, nrm_groups = _inverted(entry_norms)
+    toks, tok_groups = _inverted(tok_words)
+    words_, word_groups = _inverted(passage_words)
+    sec = {"meta": json.dumps({
+        "entries": len(keys),
+        "passages": sum(1 for p in pws if p != b"\x00"),
+        "aliases": aliases,
+    }, ensure_ascii=False).encode("utf-8")}
+    sec["key_offs"], sec["key_blob"] = _strings(keys)
+    sec["val_offs"], sec["val_blob"] = _strings(vals)
+    sec["norm_offs"], sec["norm_blob"] = _strings(norms)
+    sec["pw_offs"], sec["pw_blob"] = _strings(pws)
+    sec["key_table"] = _table(keys, range(len(keys)))
+    sec["nrm_offs"], sec["nrm_blob"] = _strings(nrms)
+    sec["nrm_table"] = _table(nrms, range(len(nrms)))
+    sec["nrm_post_offs"], sec["nrm_post"] = _postings(nrm_groups)
+    sec["tok_offs"], sec["tok_blob"] = _strings(toks)
+    sec["tok_table"] = _table(toks, range(len(toks)))
+    sec["tok_post_offs"], sec["tok_post"] = _postings(tok_groups)
+    sec["word_offs"], sec["word_blob"] = _strings(words_)
+    sec["word_table"] = _table(words_, range(len(words_)))
+    sec["word_post_offs"], sec["word_post"] = _postings(word_groups)
+    sec["search_offs"], sec["search_blob"] = _strings(texts)
+
+    out, table, pos = [], [], HEADER_SIZE
+    for name in SECTIONS:
+        data = sec[name]
+        pad = -pos % 8  # выравнивание под memoryview.cast("Q")
+        out.append(b"\x00" * pad + data)
+        pos += pad
+        table.append(_SECTION.pack(pos, len(data)))
+        pos += len(data)
+    return _HEADER.pack(MAGIC, VERSION, len(SECTIONS)) + b"".join(table) + b"".join(out)
+
+
+def write_snapshot(entries, path: str, aliases: Optional[Dict[str, str]] = None) -> None:
+    """Пишет снимок атомарно: tmp + os.replace."""
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_suffix(p.suffix + ".tmp")
+    with open(tmp, "wb") as fh:
+        fh.write(build_snapshot(entries, aliases))
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, p)
+
+
+class _Strings:
+    def __init__(self, offs: memoryview, blob: memoryview):
+        self.offs = offs
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offs) - 1
+
+    def raw(self, i: int) -> memoryview:
+        return self.blob[self.offs[i]:self.offs[i + 1]]
+
+    def str(self, i: int) -> str:
+        return str(self.raw(i), "utf-8")
+
+
+class Snapshot:
+    """
+    Неизменяемый снимок AssociativeMemory поверх любого буфера (mmap,
+    shared_memory, bytes). Ничего не разбирается заранее: поиск ключа —
+    хэш-таблица в буфере, значения декодируются из JSON при обращении,
+    страницы mmap общие для всех процессов, открывших один файл.
+    """
+    def __init__(self, buffer, owner: Any = None):
+        if sys.byteorder != "little":
+            raise ValueError("Snapshots are little-endian only")
+        self._buf = memoryview(buffer)
+        self._owner = owner
+        # bytes/mmap умеют find() без копирования — им ищет search()
+        self._haystack = buffer if hasattr(buffer, "find") else None
+        magic, version, count = _HEADER.unpack_from(self._buf)
+        if magic != MAGIC or version != VERSION or count != len(SECTIONS):
+            raise ValueError("Not an AssociativeMemory snapshot")
+        views, starts = {}, {}
+        for n, name in enumerate(SECTIONS):
+            off, size = _SECTION.unpack_from(self._buf, _HEADER.size + n * _SECTION.size)
+            views[name] = self._buf[off:off + size]
+            starts[name] = off
+        cast = lambda name, fmt: views[name].cast(fmt)
+        self.meta = json.loads(bytes(views["meta"]))
+        self._keys = _Strings(cast("key_offs", "Q"), views["key_blob"])
+        self._vals = _Strings(cast("val_offs", "Q"), views["val_blob"])
+        self._norms = _Strings(cast("norm_offs", "Q"), views["norm_blob"])
+        self._pws = _Strings(cast("pw_offs", "Q"), views["pw_blob"])
+        self._key_table = cast("key_table", "I")
+        self._nrms = _Strings(cast("nrm_offs", "Q"), views["nrm_blob"])
+        self._nrm_table = cast("nrm_table", "I")
+        self._nrm_post = (cast("nrm_post_offs", "Q"), cast("nrm_post", "I"))
+        self._toks = _Strings(cast("tok_offs", "Q"), views["tok_blob"])
+        self._tok_table = cast("tok_table", "I")
+        self._tok_post = (cast("tok_post_offs", "Q"), cast("tok_post", "I"))
+        self._words = _Strings(cast("word_offs", "Q"), views["word_blob"])
+        self._word_table = cast("word_table", "I")
+        self._word_post = (cast("word_post_offs", "Q"), cast("word_post", "I"))
+        self._search = _Strings(cast("search_offs", "Q"), views["search_blob"])
+        self._search_start = starts["search_blob"]
+
+    @classmethod
+    def open(cls, path: str) -> "Snapshot":
+        with open(path, "rb") as fh:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mm, owner=mm)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def passages(self) -> int:
+        return self.meta["passages"]
+
+    @property
+    def aliases(self) -> Dict[str, str]:
+        """Псевдонимы почти-дублей: псевдоним -> канонический ключ."""
+        return self.meta.get("aliases", {})
+
+    def key(self, i: int) -> str:
+        return self._keys.str(i)
+
+    def value(self, i: int) -> Any:
+        return json.loads(self._vals.raw(i).tobytes())
+
+    def norm(self, i: int) -> str:
+        return self._norms.str(i)
+
+    def passage_words(self, i: int) -> Optional[List[str]]:
+        raw = self._pws.raw(i)
+        if raw == b"\x00":
+            return None
+        return str(raw, "utf-8").split()
+
+    def find_key(self, key: str) -> int:
+        return self._find(self._key_table, self._keys, key.encode("utf-8"))
+
+    def find_norm(self, norm: str) -> int:
+        ids = self.norm_ids(norm)
+        return ids[0] if len(ids) else -1
+
+    def norm_ids(self, norm: str) -> memoryview:
+        """Все записи с этим нормализованным ключом, в порядке записи."""
+        return self._posting(self._nrm_table, self._nrms, self._nrm_post, norm)
+
+    def token_ids(self, token: str) -> memoryview:
+        """Записи, в нормализованном ключе которых есть слово."""
+        return self._posting(self._tok_table, self._toks, self._tok_post, token)
+
+    def word_ids(self, word: str) -> memoryview:
+        """Фрагменты документов, содержащие слово."""
+        return self._posting(self._word_table, self._words, self._word_post, word)
+
+    def search(self, query: str) -> List[int]:
+        """
+        Записи, в ключе или значении которых (без регистра) есть подстрока
+        query. Значения не разбираются: поиск идёт одним find() по заранее
+        собранному тексту в нижнем регистре.
+        """
+        q = query.lower()
+        if not q:
+            return list(range(len(self)))
+        needle = q.encode("utf-8")
+        if self._haystack is None:
+            self._haystack = self._buf.tobytes()  # буфер без find() — одна копия
+        offs, base = self._search.offs, self._search_start
+        end = base + offs[len(offs) - 1]
+        found, pos = [], self._haystack.find(needle, base, end)
+        while pos >= 0:
+            i = bisect_right(offs, pos - base) - 1
+            stop = base + offs[i + 1]
+            if pos + len(needle) <= stop:
+                found.append(i)
+                pos = stop  # запись уже найдена — дальше со следующей
+            else:
+                pos += 1  # совпадение на стыке двух записей
+            pos = self._haystack.find(needle, pos, end)
+        return found
+
+    def close(self) -> None:
+        # memoryview на mmap нужно освободить до закрытия mmap. Если снаружи
+        # ещё держат срезы (token_ids, word_ids), mmap закроет сборщик мусора
+        views = []
+        for value in list(vars(self).values()):
+            if isinstance(value, _Strings):
+                views += [value.offs, value.blob]
+            elif isinstance(value, memoryview):
+                views.append(value)
+            elif isinstance(value, tuple):
+                views.extend(value)
+        for view in views + [self._buf]:
+            try:
+                view.release()
+            except BufferError:
+                pass
+        owner, self._owner, self._haystack = self._owner, None, None
+        if owner is not None and hasattr(owner, "close"):
+            try:
+                owner.close()
+            except BufferError:
+                pass
+
+    # --- внутреннее ---
+    @staticmethod
+    def _find(table: memoryview, strings: _Strings, raw: bytes) -> int:
+        mask = len(table) - 1
+        h = zlib.crc32(raw) & mask
+        while True:
+            slot = table[h]
+            if not slot:
+                return -1
+            if strings.raw(slot - 1) == raw:
+                return slot - 1
+            h = (h + 1) & mask
+
+    def _posting(self, table, strings, post, term: str) -> memoryview:
+        t = self._find(table, strings, term.encode("utf-8"))
+        if t < 0:
+            return post[1][0:0]
+        return post[1][post[0][t]:post[0][t + 1]]
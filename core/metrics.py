@@ -0,0 +1,129 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Optional
+
+DEFAULT_RESERVOIR = 2048
+
+
+class Histogram:
+    """Скользящее окно последних значений + перцентили по запросу."""
+    def __init__(self, size: int = DEFAULT_RESERVOIR):
+        self.samples: Deque[float] = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float) -> None:
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def summary(self) -> Dict[str, float]:
+        data = sorted(self.samples)
+        if not data:
+            return {"count": 0}
+
+        def pct(p: float) -> float:
+            return data[min(len(data) - 1, int(p * len(data)))]
+
+        return {
+            "count": self.count,
+            "mean": self.total / self.count,
+            "p50": pct(0.50),
+            "p95": pct(0.95),
+            "p99": pct(0.99),
+            "max": data[-1],
+        }
+
+
+class _NoopSpan:
+    def __enter__(self): return self
+    def __exit__(self, exc_type, exc, tb): return False
+
+
+_NOOP = _NoopSpan()
+
+
+class Metrics:
+    """
+    Лёгкая телеметрия: span()/timed() меряют стадии по monotonic-часам
+    (миллисекунды), incr() — счётчики, observe() — произвольные гистограммы.
+    При enabled=False всё сводится к одной проверке флага.
+    """
+    def __init__(self, enabled: bool = True, reservoir: int = DEFAULT_RESERVOIR):
+        self.enabled = enabled
+        self._reservoir = reservoir
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._hists: Dict[str, Histogram] = {}
+
+    def incr(self, name: str, n: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def observe(self, name: str, value: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            h = self._hists.get(name)
+            if h is None:
+                h = self._hists[name] = Histogram(self._reservoir)
+            h.add(value)
+
+    def span(self, name: str):
+        if not self.enabled:
+            return _NOOP
+        return self._span(name)
+
+    @contextmanager
+    def _span(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.incr(f"{name}.errors")
+            raise
+        finally:
+            self.observe(name, (time.perf_counter() - t0) * 1000.0)
+
+    def timed(self, name: Optional[str] = None) -> Callable:
+        def deco(fn: Callable) -> Callable:
+            stage = name or fn.__qualname__
+
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self._span(stage):
+                    return fn(*args, **kwargs)
+            return inner
+        return deco
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "stages": {k: h.summary() for k, h in self._hists.items()},
+            }
+
+    def dump_json(self, path: str) -> str:
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(json.dumps(self.snapshot(), ensure_ascii=False, indent=2), encoding="utf-8")
+        return str(p)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._hists.clear()
+
+
+# Общий экземпляр процесса; LVREX_METRICS=0 отключает сбор
+metrics = Metrics(enabled=os.environ.get("LVREX_METRICS", "1") != "0")
@@ -1,4 +1,20 @@
-from typing import Any, Optional
+import logging
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+from core.metrics import metrics
+from core.memory import AssociativeMemory, normalize
+from core.router import ROUTE_COMMAND, ROUTE_LLM, ROUTE_MEMORY
+from core.scheduler import INTERACTIVE, Scheduler, default_scheduler
+from core.singleflight import SingleFlight
+
+log = logging.getLogger(__name__)
+
+# Готовые ответы лежат в дереве как memory/memory.json.py; путь — от корня
+# проекта, а не от текущего каталога
+_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_MEMORY_PATHS = (_ROOT / "memory" / "memory.json", _ROOT / "memory" / "memory.json.py")
 
 try:
     from core.ai import AIEngine
@@ -9,14 +25,89 @@ except Exception:
 class Orchestrator:
     """
     Тонкая обёртка над AIEngine — демонстрация связки.
+    Сначала ищет готовый ответ в AssociativeMemory и только при промахе
+    зовёт модель. Одинаковые одновременные запросы (нормализованный текст +
+    модель) для маршрутов из dedupe_routes делят один вызов генерации.
+    Маршрут запроса выбирает путь: command — commands(text), memory —
+    только память; модель видят лишь остальные маршруты.
     """
-    def __init__(self, engine: Optional[AIEngine] = None):
+    def __init__(
+        self,
+        engine: Optional[AIEngine] = None,
+        memory: Optional[AssociativeMemory] = None,
+        min_confidence: float = 0.85,
+        dedupe_routes: Iterable[str] = (ROUTE_LLM,),
+        scheduler: Optional[Scheduler] = None,
+        commands: Optional[Callable[[str], Any]] = None,
+    ):
         self.engine = engine or (AIEngine() if AIEngine else None)
+        self.memory = memory if memory is not None else default_memory()
+        self.min_confidence = min_confidence
+        self.memory_hits = 0
+        self.memory_misses = 0
+        self.dedupe_routes = set(dedupe_routes)
+        self._flight = SingleFlight()
+        self._scheduler = scheduler
+        self.commands = commands
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.memory_hits + self.memory_misses
+        return self.memory_hits / total if total else 0.0
+
+    def answer_from_memory(self, text: str) -> Optional[Any]:
+        hit = self.memory.lookup(text, self.min_confidence)
+        if hit is None:
+            self.memory_misses += 1
+            metrics.incr("orchestrator.memory_miss")
+            return None
+        self.memory_hits += 1
+        metrics.incr("orchestrator.memory_hit")
+        return hit[1]
 
-    def run_inference(self, text: str) -> Any:
+    def run_command(self, text: str) -> Any:
+        metrics.incr("orchestrator.command")
+        if self.commands is None:
+            return {"ok": False, "command": text, "reason": "no command handler"}
+        return self.commands(text)
+
+    @metrics.timed("orchestrator.run_inference")
+    def run_inference(self, text: str, route: str = ROUTE_LLM, check_memory: bool = True) -> Any:
+        if route == ROUTE_COMMAND:
+            return self.run_command(text)
+        # check_memory=False — память уже спросили отдельно (стадия memory в pipeline);
+        # на маршруте memory промах памяти — это ответ None, без модели
+        if check_memory or route == ROUTE_MEMORY:
+            answer = self.answer_from_memory(text)
+            if answer is not None or route == ROUTE_MEMORY:
+                return answer
         if self.engine is None:
             return {"ok": True, "echo": text}
-        return self.engine.generate(text)
+        if route not in self.dedupe_routes:
+            return self.engine.generate(text)
+        return self._flight.do((self._model_key(), normalize(text)), self.engine.generate, text)
+
+    def submit(self, text: str, session_id: Optional[str] = None, priority: str = INTERACTIVE, route: str = ROUTE_LLM) -> Future:
+        """
+        Асинхронный вход через планировщик: приоритеты, ограниченные очереди
+        и лимит на сессию. При перегрузке Future сразу содержит busy(...).
+        """
+        scheduler = self._scheduler or default_scheduler()
+        return scheduler.submit(self.run_inference, text, route=route, priority=priority, session_id=session_id)
+
+    def _model_key(self) -> Any:
+        model = getattr(self.engine, "model", None)
+        return getattr(model, "path", None) or getattr(model, "type", None) or id(self.engine)
+
+
+def default_memory() -> AssociativeMemory:
+    """Память из первого существующего файла DEFAULT_MEMORY_PATHS."""
+    for path in DEFAULT_MEMORY_PATHS:
+        if path.exists():
+            return AssociativeMemory.from_json(str(path))
+    log.warning("No memory file found (%s); every query goes to the model",
+                ", ".join(str(p) for p in DEFAULT_MEMORY_PATHS))
+    return AssociativeMemory()
 
 
 # Совместимость с импортами из старого теста
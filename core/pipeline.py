@@ -0,0 +1,194 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.metrics import metrics
+
+
+class StageTimeout(TimeoutError):
+    pass
+
+
+class StageSkipped(RuntimeError):
+    pass
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Optional[Callable[[Dict[str, Any]], Any]]
+    deps: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    # Спекулятивный старт: через delay секунд после готовности зависимостей
+    delay: float = 0.0
+    # Hedge: результат первой из deps, прошедшей accept
+    accept: Optional[Callable[[Any], bool]] = None
+    # Ветвление: стадия идёт, только если when(результаты) истинно, иначе StageSkipped
+    when: Optional[Callable[[Dict[str, Any]], bool]] = None
+
+
+@dataclass
+class PipelineResult:
+    results: Dict[str, Any] = field(default_factory=dict)
+    errors: Dict[str, BaseException] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return self.results.get(name, default)
+
+
+class Pipeline:
+    """
+    Граф стадий с явными зависимостями. Независимые стадии идут параллельно
+    на общем executor; у каждой может быть свой timeout. hedge() гоняет
+    несколько стадий наперегонки и берёт первый подходящий результат —
+    проигравшие, если ещё не стартовали, не запускаются вовсе.
+
+    Стадия получает словарь уже готовых результатов (включая входы run()).
+    Упавшая или просроченная стадия попадает в errors, её потомки — StageSkipped.
+    Стадия с when, которое для готовых зависимостей ложно, не запускается
+    (StageSkipped) — так граф ветвится, например, по маршруту запроса.
+    """
+    def __init__(self, executor: Optional[Executor] = None, max_workers: int = 4):
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline")
+        self._stages: Dict[str, Stage] = {}
+
+    def add(
+        self,
+        name: str,
+        fn: Callable[[Dict[str, Any]], Any],
+        deps: Tuple[str, ...] = (),
+        timeout: Optional[float] = None,
+        delay: float = 0.0,
+        when: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> "Pipeline":
+        self._stages[name] = Stage(name, fn, tuple(deps), timeout, delay, when=when)
+        return self
+
+    def hedge(self, name: str, candidates: Tuple[str, ...], accept: Callable[[Any], bool] = lambda r: r is not None) -> "Pipeline":
+        self._stages[name] = Stage(name, None, tuple(candidates), accept=accept)
+        return self
+
+    def run(self, inputs: Optional[Dict[str, Any]] = None) -> PipelineResult:
+        out = PipelineResult(results=dict(inputs or {}))
+        self._validate(out.results)
+        results, errors = out.results, out.errors
+
+        pending = set(self._stages)
+        running: Dict[Future, str] = {}
+        started: Dict[str, float] = {}
+        ready_at: Dict[str, float] = {}
+        finished: List[str] = []  # порядок завершения — для hedge
+
+        def finish(name: str, value: Any = None, error: Optional[BaseException] = None) -> None:
+            pending.discard(name)
+            if error is None:
+                results[name] = value
+            else:
+                errors[name] = error
+            if name in started:
+                out.timings[name] = (time.monotonic() - started[name]) * 1000.0
+                metrics.observe(f"pipeline.{name}", out.timings[name])
+            finished.append(name)
+
+        while True:
+            self._resolve(pending, running, results, errors, finished, finish)
+
+            now = time.monotonic()
+            next_start = None
+            for name in sorted(pending):
+                st = self._stages[name]
+                if st.accept is not None or name in started:
+                    continue
+                if not all(d in results for d in st.deps):
+                    continue
+                ready = ready_at.setdefault(name, now)
+                if now - ready < st.delay and not self._expedite(name, results, errors):
+                    due = ready + st.delay
+                    next_start = due if next_start is None else min(next_start, due)
+                    continue
+                started[name] = now
+                snapshot = dict(results)
+                running[self._executor.submit(st.fn, snapshot)] = name
+
+            if not running and next_start is None:
+                break
+
+            deadlines = [started[n] + self._stages[n].timeout for n in running.values() if self._stages[n].timeout]
+            wake = min(deadlines + ([next_start] if next_start is not None else []), default=None)
+            done, _ = wait(list(running), timeout=None if wake is None else max(0.0, wake - time.monotonic()),
+                           return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                if name not in pending:
+                    continue  # проигравший hedge, результат не нужен
+                try:
+                    finish(name, fut.result())
+                except BaseException as e:
+                    finish(name, error=e)
+
+            now = time.monotonic()
+            for fut, name in list(running.items()):
+                timeout = self._stages[name].timeout
+                if timeout and now - started[name] >= timeout:
+                    running.pop(fut)
+                    fut.cancel()
+                    finish(name, error=StageTimeout(f"{name}: > {timeout:.3f}s"))
+
+        for name in list(pending):
+            finish(name, error=StageSkipped(name))
+        return out
+
+    # --- внутреннее ---
+    def _validate(self, inputs: Dict[str, Any]) -> None:
+        known = set(inputs)
+        remaining = dict(self._stages)
+        # Топологический проход: заодно ловит неизвестные зависимости и циклы
+        while remaining:
+            ready = [n for n, st in remaining.items() if all(d in known for d in st.deps)]
+            if not ready:
+                raise ValueError(f"Unresolvable stage dependencies: {sorted(remaining)}")
+            for n in ready:
+                known.add(n)
+                del remaining[n]
+
+    def _expedite(self, name: str, results: Dict[str, Any], errors: Dict[str, BaseException]) -> bool:
+        # Отложенный кандидат hedge стартует сразу, если все кандидаты перед
+        # ним уже закончились без подходящего результата — ждать больше нечего
+        for st in self._stages.values():
+            if st.accept is None or name not in st.deps:
+                continue
+            earlier = st.deps[:st.deps.index(name)]
+            if earlier and all(d in errors or (d in results and not st.accept(results[d])) for d in earlier):
+                return True
+        return False
+
+    def _resolve(self, pending, running, results, errors, finished, finish) -> None:
+        changed = True
+        while changed:
+            changed = False
+            for name in sorted(pending):
+                st = self._stages[name]
+                if st.accept is not None:
+                    winner = next((d for d in finished if d in st.deps and d in results and st.accept(results[d])), None)
+                    if winner is not None:
+                        finish(name, results[winner])
+                        # Остальные кандидаты больше не нужны
+                        for cand in st.deps:
+                            if cand in pending:
+                                for fut, n in list(running.items()):
+                                    if n == cand:
+                                        running.pop(fut)
+                                        fut.cancel()
+                                finish(cand, error=StageSkipped(f"{cand}: lost to {winner}"))
+                        changed = True
+                    elif all(d in results or d in errors for d in st.deps):
+                        finish(name, error=StageSkipped(f"{name}: no acceptable candidate"))
+                        changed = True
+                elif any(d in errors for d in st.deps):
+                    finish(name, error=StageSkipped(f"{name}: dependency failed"))
+                    changed = True
+                elif st.when is not None and all(d in results for d in st.deps) and not st.when(results):
+                    finish(name, error=StageSkipped(f"{name}: branch not taken"))
+                    changed = True
@@ -1,7 +1,137 @@
-from typing import Dict
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+ROLE_PREFIXES: Dict[str, str] = {"user": "User:", "assistant": "Assistant:", "summary": "Summary:"}
 
 
 def build_prompt(user_text: str, ctx: Dict[str, str] | None = None) -> str:
     ctx = ctx or {}
     prefix = ctx.get("prefix", "User:")
     return f"{prefix} {user_text.strip()}"
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка: слова и знаки препинания. Подменяется токенайзером модели."""
+    return len(_TOKEN_RE.findall(text))
+
+
+@dataclass
+class Turn:
+    role: str
+    line: str    # уже отрендеренная строка промпта
+    tokens: int  # посчитано один раз при добавлении
+
+
+class ContextBuilder:
+    """
+    Инкрементальная сборка промпта для одной сессии.
+
+    Каждое сообщение токенизируется один раз; бюджет ведётся счётчиком.
+    При переполнении старые реплики вытесняются (или сворачиваются через
+    summarize в одну строку Summary). Уже отрендеренная история кэшируется,
+    поэтому новый ход стоит O(новое сообщение), а не O(история).
+    """
+    def __init__(
+        self,
+        max_tokens: int = 2048,
+        reserve: int = 256,
+        system: str = "",
+        count_tokens: Callable[[str], int] = estimate_tokens,
+        summarize: Optional[Callable[[List[str]], str]] = None,
+        prefixes: Optional[Dict[str, str]] = None,
+    ):
+        self.budget = max_tokens - reserve
+        self.count_tokens = count_tokens
+        self.summarize = summarize
+        self.prefixes = {**ROLE_PREFIXES, **(prefixes or {})}
+        self.system = system.strip()
+        self._system_tokens = count_tokens(self.system) if self.system else 0
+        self._summary: Optional[Turn] = None
+        self._turns: Deque[Turn] = deque()
+        self._tokens = 0
+        self._rendered: Optional[str] = None
+
+    @property
+    def tokens(self) -> int:
+        """Сколько токенов займёт текущий промпт (без нового сообщения)."""
+        summary = self._summary.tokens if self._summary else 0
+        return self._system_tokens + summary + self._tokens
+
+    def add(self, role: str, text: str) -> Turn:
+        turn = self._make_turn(role, text)
+        self._turns.append(turn)
+        self._tokens += turn.tokens
+        if self._rendered is not None:
+            self._rendered = f"{self._rendered}\n{turn.line}" if self._rendered else turn.line
+        self._fit()
+        return turn
+
+    def build(self, user_text: Optional[str] = None) -> str:
+        """Промпт из истории; user_text добавляется как новая реплика пользователя."""
+        if user_text is not None:
+            self.add("user", user_text)
+        if self._rendered is None:
+            head = [self.system] if self.system else []
+            if self._summary:
+                head.append(self._summary.line)
+            self._rendered = "\n".join(head + [t.line for t in self._turns])
+        return self._rendered
+
+    def clear(self) -> None:
+        self._turns.clear()
+        self._summary = None
+        self._tokens = 0
+        self._rendered = None
+
+    # --- сохранение в сессию (без повторной токенизации после загрузки) ---
+    def to_dict(self) -> Dict[str, Any]:
+        turns = list(self._turns)
+        if self._summary:
+            turns.insert(0, self._summary)
+        return {"turns": [[t.role, t.line, t.tokens] for t in turns]}
+
+    def load_dict(self, state: Dict[str, Any]) -> "ContextBuilder":
+        self.clear()
+        for role, line, tokens in state.get("turns", []):
+            turn = Turn(role, line, tokens)
+            if role == "summary":
+                self._summary = turn
+            else:
+                self._turns.append(turn)
+                self._tokens += tokens
+        self._fit()
+        return self
+
+    # --- внутреннее ---
+    def _make_turn(self, role: str, text: str) -> Turn:
+        text = text.strip()
+        line = f"{self.prefixes.get(role, role + ':')} {text}"
+        return Turn(role, line, self.count_tokens(line))
+
+    def _fit(self) -> None:
+        if self.tokens <= self.budget:
+            return
+        evicted: List[str] = [self._summary.line] if self._summary else []
+        self._summary = None
+        # Последнюю реплику не трогаем, даже если она одна больше бюджета
+        while self.tokens > self.budget and len(self._turns) > 1:
+            evicted.append(self._pop_oldest())
+        if self.summarize and evicted:
+            while True:
+                summary = self._make_turn("summary", self.summarize(evicted))
+                if self.tokens + summary.tokens <= self.budget:
+                    self._summary = summary
+                    break
+                if len(self._turns) <= 1:
+                    break
+                evicted.append(self._pop_oldest())
+        self._rendered = None
+
+    def _pop_oldest(self) -> str:
+        turn = self._turns.popleft()
+        self._tokens -= turn.tokens
+        return turn.line
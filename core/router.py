@@ -1,16 +1,224 @@
-from typing import Any
+import math
+import zlib
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from core.memory import normalize
+
+ROUTE_MEMORY = "memory"
+ROUTE_COMMAND = "command"
+ROUTE_LLM = "llm"
+ROUTES: Tuple[str, ...] = (ROUTE_MEMORY, ROUTE_COMMAND, ROUTE_LLM)
+
+# Ключевые слова (по началу слова, после normalize) -> (маршрут, вес)
+DEFAULT_RULES: Sequence[Tuple[str, str, float]] = (
+    ("запомни", ROUTE_MEMORY, 2.0),
+    ("вспомни", ROUTE_MEMORY, 2.0),
+    ("что я говорил", ROUTE_MEMORY, 2.0),
+    ("забудь", ROUTE_MEMORY, 2.0),
+    ("открой", ROUTE_COMMAND, 2.0),
+    ("запусти", ROUTE_COMMAND, 2.0),
+    ("включи", ROUTE_COMMAND, 2.0),
+    ("выключи", ROUTE_COMMAND, 2.0),
+    ("поставь таймер", ROUTE_COMMAND, 2.0),
+    ("останови", ROUTE_COMMAND, 2.0),
+)
+
+# Затравка для линейного классификатора; дообучается через IntentRouter.train
+SEED_SAMPLES: Sequence[Tuple[str, str]] = (
+    ("запомни что я оставил машину на парковке", ROUTE_MEMORY),
+    ("что я говорил про масло", ROUTE_MEMORY),
+    ("напомни что я записал вчера", ROUTE_MEMORY),
+    ("открой настройки", ROUTE_COMMAND),
+    ("включи фонарик", ROUTE_COMMAND),
+    ("поставь таймер на пять минут", ROUTE_COMMAND),
+    ("почему стучит двигатель на холодную", ROUTE_LLM),
+    ("как заменить ремень грм", ROUTE_LLM),
+    ("объясни разницу между бензином и дизелем", ROUTE_LLM),
+    ("расскажи о себе", ROUTE_LLM),
+)
+
+
+class KeywordAutomaton:
+    """Aho–Corasick: все ключевые фразы находятся за один проход по тексту."""
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # _own — фразы, кончающиеся в узле; _out — они же плюс выходы по
+        # fail-ссылкам, пересобирается в build() с нуля
+        self._own: List[List[Tuple[int, str, float]]] = [[]]  # (длина, маршрут, вес)
+        self._out: List[List[Tuple[int, str, float]]] = [[]]
+        self._built = True
+
+    def add(self, phrase: str, route: str, weight: float = 1.0) -> None:
+        phrase = normalize(phrase)
+        if not phrase:
+            return
+        node = 0
+        for ch in phrase:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append([])
+                self._out.append([])
+            node = nxt
+        self._own[node].append((len(phrase), route, weight))
+        self._built = False
+
+    def build(self) -> None:
+        queue = deque(self._goto[0].values())
+        for child in queue:
+            self._fail[child] = 0
+            self._out[child] = list(self._own[child])
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._own[child] + self._out[self._fail[child]]
+                queue.append(child)
+        self._built = True
+
+    def scan(self, text: str) -> List[Tuple[str, float]]:
+        """text уже нормализован. Совпадения засчитываются только с начала слова."""
+        if not self._built:
+            self.build()
+        hits = []
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for length, route, weight in self._out[node]:
+                start = i - length + 1
+                if start == 0 or text[start - 1] == " ":
+                    hits.append((route, weight))
+        return hits
+
+
+class HashedLinearClassifier:
+    """Линейная модель над хэшированными словами и биграммами (перцептрон)."""
+    def __init__(self, routes: Sequence[str] = ROUTES, n_features: int = 1 << 12):
+        self.routes = tuple(routes)
+        self.n_features = n_features
+        self.weights: Dict[str, List[float]] = {r: [0.0] * n_features for r in self.routes}
+
+    def features(self, text: str) -> List[int]:
+        words = text.split()
+        grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        return [zlib.crc32(g.encode("utf-8")) % self.n_features for g in grams]
+
+    def scores(self, feats: Iterable[int]) -> Dict[str, float]:
+        feats = list(feats)
+        return {r: sum(self.weights[r][f] for f in feats) for r in self.routes}
+
+    def partial_fit(self, text: str, route: str, lr: float = 1.0) -> bool:
+        feats = self.features(text)
+        s = self.scores(feats)
+        predicted = max(s, key=s.get)
+        if predicted == route and s[route] > 0:
+            return False
+        for f in feats:
+            self.weights[route][f] += lr
+            self.weights[predicted][f] -= lr
+        return True
+
+
+class IntentRouter:
+    """
+    Дешёвая маршрутизация запроса: память, команда или полная генерация.
+    Ключевые фразы дают веса через автомат, линейная модель добавляет свои
+    оценки; побеждает максимум. Всё скомпилировано заранее — на запрос
+    уходят микросекунды. Счётчики маршрутов — в counters.
+    """
+    def __init__(
+        self,
+        rules: Optional[Iterable[Tuple[str, str, float]]] = None,
+        samples: Optional[Iterable[Tuple[str, str]]] = None,
+        default: str = ROUTE_LLM,
+        epochs: int = 5,
+    ):
+        self.default = default
+        self.automaton = KeywordAutomaton()
+        self.classifier = HashedLinearClassifier()
+        self.counters: Dict[str, int] = {r: 0 for r in ROUTES}
+        for phrase, route, weight in (DEFAULT_RULES if rules is None else rules):
+            self.add_rule(phrase, route, weight)
+        self.automaton.build()
+        self.train(SEED_SAMPLES if samples is None else samples, epochs=epochs)
+
+    def add_rule(self, phrase: str, route: str, weight: float = 1.0) -> None:
+        self._ensure_route(route)
+        self.automaton.add(phrase, route, weight)
+
+    def train(self, samples: Iterable[Tuple[str, str]], epochs: int = 1) -> None:
+        samples = [(normalize(t), r) for t, r in samples]
+        for _, route in samples:
+            self._ensure_route(route)
+        for _ in range(epochs):
+            if not any([self.classifier.partial_fit(t, r) for t, r in samples]):
+                break
+
+    def scores(self, text: str) -> Dict[str, float]:
+        t = normalize(text)
+        s = self.classifier.scores(self.classifier.features(t))
+        for route, weight in self.automaton.scan(t):
+            s[route] = s.get(route, 0.0) + weight
+        return s
+
+    def route(self, text: str) -> str:
+        s = self.scores(text) if text else {}
+        best = max(s, key=s.get) if s else self.default
+        if s.get(best, 0.0) <= 0.0:
+            best = self.default
+        self.counters[best] = self.counters.get(best, 0) + 1
+        return best
+
+    def _ensure_route(self, route: str) -> None:
+        c = self.classifier
+        if route not in c.weights:
+            c.routes += (route,)
+            c.weights[route] = [0.0] * c.n_features
+            self.counters.setdefault(route, 0)
+
+
+_default_router: Optional[IntentRouter] = None
+
+
+def default_router() -> IntentRouter:
+    global _default_router
+    if _default_router is None:
+        _default_router = IntentRouter()
+    return _default_router
 
 
 class _BaseRouter:
+    def __init__(self, router: Optional[IntentRouter] = None):
+        self.router = router or default_router()
+
     def route(self, x: Any) -> str:
-        return "ok"
+        return self.router.route(x) if isinstance(x, str) else "unknown"
+
+    def confidence(self, x: Any, route: str) -> float:
+        """Оценка маршрута route для x: сумма весов правил и модели."""
+        return self.router.scores(x).get(route, 0.0) if isinstance(x, str) else 0.0
 
     def handle(self, x: Any) -> Any:
-        return {"ok": True, "data": x}
+        return {"ok": True, "route": self.route(x), "data": x}
 
 
 class SpeechRouter(_BaseRouter):
-    pass
+    def route(self, x: Any) -> str:
+        # Сырое аудио сначала уходит в STT, текст — по общим правилам
+        if isinstance(x, (bytes, bytearray, memoryview)):
+            return "stt"
+        return super().route(x)
 
 
 class TextRouter(_BaseRouter):
@@ -18,4 +226,19 @@ class TextRouter(_BaseRouter):
 
 
 class MemoryRouter(_BaseRouter):
-    pass
+    def __init__(self, router: Optional[IntentRouter] = None, memory: Any = None, min_score: float = 0.85):
+        super().__init__(router)
+        self.memory = memory
+        self.min_score = min_score
+
+    def route(self, x: Any) -> str:
+        if self.memory is not None and isinstance(x, str) and self.memory.lookup(x, self.min_score):
+            self.router.counters[ROUTE_MEMORY] = self.router.counters.get(ROUTE_MEMORY, 0) + 1
+            return ROUTE_MEMORY
+        return super().route(x)
+
+    def confidence(self, x: Any, route: str) -> float:
+        # Найденный в памяти ответ — маршрут memory без сомнений
+        if route == ROUTE_MEMORY and self.memory is not None and isinstance(x, str) and self.memory.lookup(x, self.min_score):
+            return math.inf
+        return super().confidence(x, route)
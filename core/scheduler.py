@@ -0,0 +1,192 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.metrics import metrics
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES: Dict[str, int] = {INTERACTIVE: 0, BACKGROUND: 1}
+
+
+def busy(reason: str) -> Dict[str, Any]:
+    """Результат отклонённой задачи — вместо ожидания в бесконечной очереди."""
+    return {"ok": False, "busy": True, "reason": reason}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class Scheduler:
+    """
+    Пул потоков с допуском по приоритетам.
+
+    interactive всегда берётся из очереди раньше background, а background
+    не может занять больше workers - reserved_interactive потоков — чат не
+    ждёт прогрева моделей. Очереди ограничены: при переполнении задача сразу
+    завершается с busy("queue_full"). Для session_id действует
+    token bucket: session_rate запросов/с с запасом session_burst.
+    Потоков не меньше reserved_interactive + 1, иначе резерв при workers=1
+    отдал бы единственный поток background-задаче.
+    """
+    def __init__(
+        self,
+        workers: int = 2,
+        queue_limits: Optional[Dict[str, int]] = None,
+        reserved_interactive: int = 1,
+        session_rate: Optional[float] = None,
+        session_burst: float = 5.0,
+        max_sessions: int = 10000,
+    ):
+        reserved_interactive = max(0, reserved_interactive)
+        self.workers = max(workers, reserved_interactive + 1)
+        self.queue_limits = {INTERACTIVE: 64, BACKGROUND: 16, **(queue_limits or {})}
+        self.background_slots = self.workers - reserved_interactive
+        self.session_rate = session_rate
+        self.session_burst = session_burst
+        self.max_sessions = max_sessions
+
+        self._cv = threading.Condition()
+        self._heap: List[Tuple[int, int, float, str, Future, Callable, tuple, dict]] = []
+        self._seq = itertools.count()
+        self._depth = {p: 0 for p in PRIORITIES}
+        self._running_background = 0
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._counters = {"submitted": 0, "shed_queue_full": 0, "shed_rate_limited": 0}
+        self._shutdown = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"scheduler-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        priority: str = INTERACTIVE,
+        session_id: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Future:
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}, expected one of {sorted(PRIORITIES)}")
+        fut: Future = Future()
+        now = time.monotonic()
+        with self._cv:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new tasks after shutdown")
+            if session_id is not None and self.session_rate is not None and not self._allow(session_id, now):
+                self._counters["shed_rate_limited"] += 1
+                metrics.incr("scheduler.shed_rate_limited")
+                fut.set_result(busy("rate_limited"))
+                return fut
+            if self._depth[priority] >= self.queue_limits[priority]:
+                self._counters["shed_queue_full"] += 1
+                metrics.incr(f"scheduler.shed.{priority}")
+                fut.set_result(busy("queue_full"))
+                return fut
+            self._depth[priority] += 1
+            self._counters["submitted"] += 1
+            heapq.heappush(self._heap, (PRIORITIES[priority], next(self._seq), now, priority, fut, fn, args, kwargs))
+            self._cv.notify()
+        return fut
+
+    def run(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        return self.submit(fn, *args, **kwargs).result(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cv:
+            return {
+                "queue_depth": dict(self._depth),
+                "running_background": self._running_background,
+                **self._counters,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Останавливает потоки; задачи, не успевшие стартовать, отменяются."""
+        with self._cv:
+            self._shutdown = True
+            queued, self._heap = self._heap, []
+            self._depth = {p: 0 for p in PRIORITIES}
+            self._cv.notify_all()
+        for item in queued:
+            item[4].cancel()
+        if wait:
+            for t in self._threads:
+                t.join()
+
+    # --- внутреннее ---
+    def _allow(self, session_id: str, now: float) -> bool:
+        bucket = self._buckets.get(session_id)
+        if bucket is None:
+            if len(self._buckets) >= self.max_sessions:
+                self._buckets.pop(next(iter(self._buckets)))
+            bucket = self._buckets[session_id] = TokenBucket(self.session_rate, self.session_burst)
+        return bucket.take(now)
+
+    def _next(self):
+        # interactive приоритетнее, так что background в голове значит, что
+        # interactive-задач нет; запускаем её, только если есть свой слот
+        head = self._heap[0]
+        if head[3] == BACKGROUND and self._running_background >= self.background_slots:
+            return None
+        return heapq.heappop(self._heap)
+
+    def _worker(self) -> None:
+        while True:
+            with self._cv:
+                item = None
+                while not self._shutdown:
+                    item = self._next() if self._heap else None
+                    if item is not None:
+                        break
+                    self._cv.wait()
+                if item is None:
+                    return
+                _, _, enqueued, priority, fut, fn, args, kwargs = item
+                self._depth[priority] -= 1
+                if priority == BACKGROUND:
+                    self._running_background += 1
+
+            metrics.observe(f"scheduler.wait.{priority}", (time.monotonic() - enqueued) * 1000.0)
+            try:
+                if fut.set_running_or_notify_cancel():
+                    try:
+                        fut.set_result(fn(*args, **kwargs))
+                    except BaseException as e:
+                        fut.set_exception(e)
+            finally:
+                if priority == BACKGROUND:
+                    with self._cv:
+                        self._running_background -= 1
+                        self._cv.notify_all()
+
+
+_default_scheduler: Optional[Scheduler] = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler() -> Scheduler:
+    """Общий планировщик процесса: Services и Orchestrator делят одни потоки."""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = Scheduler()
+        return _default_scheduler
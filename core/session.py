@@ -1,18 +1,166 @@
-from typing import Any, Dict
+import json
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
 from uuid import uuid4
 
 
 class SessionManager:
-    def __init__(self):
-        self._sessions: Dict[str, Dict[str, Any]] = {}
+    """
+    Сессии с ограничением по времени жизни (ttl), простою (idle_timeout)
+    и количеству (max_sessions, вытеснение LRU).
+
+    Просроченные сессии выметаются лениво при обращении. Обе очереди
+    упорядочены сами собой: _sessions — по последнему доступу (LRU),
+    _created — по времени создания, поэтому просрочка всегда в голове
+    и снимается за амортизированное O(1).
+
+    С store (см. core.session_store) локальный словарь становится кэшем перед
+    общим хранилищем: сессия видна всем процессам, изменения сохраняются
+    через save(). Локальная копия перечитывается, только если копия в
+    хранилище изменилась с последней синхронизации (другой процесс сделал
+    save), — несохранённые правки не затираются. LRU и простой вытесняют
+    только локальную копию: сессией может пользоваться другой процесс.
+    Каждое обращение отмечается в хранилище (store.touch), и простой общей
+    сессии считает само хранилище по сохранённому времени последнего
+    доступа (max_idle). ttl и end() удаляют сессию и из хранилища.
+    """
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        idle_timeout: Optional[float] = None,
+        max_sessions: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+        store: Optional[Any] = None,
+    ):
+        self.ttl = ttl
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._clock = clock
+        self._store = store
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # sid -> (created, last_access)
+        self._meta: Dict[str, Tuple[float, float]] = {}
+        self._created: Deque[Tuple[float, str]] = deque()
+        # sid -> копия сессии в хранилище на момент последней загрузки/save()
+        self._synced: Dict[str, Dict[str, Any]] = {}
+        self._counters = {"created": 0, "ended": 0, "expired_ttl": 0, "expired_idle": 0, "evicted_lru": 0}
 
     def start(self) -> str:
         sid = str(uuid4())
-        self._sessions[sid] = {}
+        self._create(sid)
         return sid
 
     def end(self, session_id: str) -> bool:
-        return self._sessions.pop(session_id, None) is not None
+        known = self._drop(session_id)
+        if self._store is not None:
+            known = known or self._store.get(session_id) is not None
+            self._store.delete(session_id)
+        if known:
+            self._counters["ended"] += 1
+        return known
+
+    def save(self, session_id: str) -> bool:
+        """Публикует изменения сессии в хранилище (отложенная запись)."""
+        data = self._sessions.get(session_id)
+        if data is None:
+            return False
+        if self._store is not None:
+            self._store.put(session_id, data)
+            self._synced[session_id] = _copy(data)
+        return True
+
+    def get_session(self, session_id: str, create: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает сессию и продлевает её. Неизвестный или просроченный id
+        даёт None; create=True явно заводит сессию под этим id.
+        """
+        now = self._clock()
+        self._sweep(now)
+        data = self._sessions.get(session_id)
+        if self._store is not None:
+            shared = self._store.get(session_id)
+            if shared is not None:
+                self._store.touch(session_id)  # время доступа для max_idle хранилища
+            if shared is None:
+                # Завершена или просрочена в другом процессе
+                self._drop(session_id)
+                data = None
+            elif data is None:
+                data = self._insert(session_id, shared, now)
+                self._synced[session_id] = _copy(shared)
+            elif shared != self._synced.get(session_id):
+                # Сохранена другим процессом — его версия новее
+                data.clear()
+                data.update(shared)
+                self._synced[session_id] = _copy(shared)
+        if data is None:
+            return self._create(session_id) if create else None
+        self._sessions.move_to_end(session_id)
+        self._meta[session_id] = (self._meta[session_id][0], now)
+        return data
+
+    def stats(self) -> Dict[str, int]:
+        self._sweep(self._clock())
+        return {"size": len(self._sessions), **self._counters}
+
+    def __len__(self) -> int:
+        self._sweep(self._clock())
+        return len(self._sessions)
+
+    # --- внутреннее ---
+    def _create(self, sid: str) -> Dict[str, Any]:
+        now = self._clock()
+        self._sweep(now)
+        self._drop(sid)
+        data = self._insert(sid, {}, now)
+        if self._store is not None:
+            self._store.put(sid, data)
+            self._synced[sid] = {}
+        self._counters["created"] += 1
+        return data
+
+    def _insert(self, sid: str, data: Dict[str, Any], now: float) -> Dict[str, Any]:
+        if self.max_sessions is not None:
+            while len(self._sessions) >= self.max_sessions:
+                oldest = next(iter(self._sessions))
+                self._drop(oldest)
+                self._counters["evicted_lru"] += 1
+        self._sessions[sid] = data
+        self._meta[sid] = (now, now)
+        if self.ttl is not None:
+            self._created.append((now, sid))
+        return data
+
+    def _drop(self, sid: str) -> bool:
+        # Запись в _created остаётся и отбрасывается при выметании
+        self._meta.pop(sid, None)
+        self._synced.pop(sid, None)
+        return self._sessions.pop(sid, None) is not None
+
+    def _sweep(self, now: float) -> None:
+        if self.idle_timeout is not None:
+            while self._sessions:
+                sid = next(iter(self._sessions))
+                if now - self._meta[sid][1] < self.idle_timeout:
+                    break
+                # Только локально: по своему таймеру процесс не знает, читает
+                # ли сессию кто-то ещё; строку в хранилище просрочит его max_idle
+                self._drop(sid)
+                self._counters["expired_idle"] += 1
+        while self._created:
+            created, sid = self._created[0]
+            meta = self._meta.get(sid)
+            if meta is not None and meta[0] == created:
+                if self.ttl is None or now - created < self.ttl:
+                    break
+                self._drop(sid)
+                if self._store is not None:
+                    self._store.delete(sid)
+                self._counters["expired_ttl"] += 1
+            self._created.popleft()
+
 
-    def get_session(self, session_id: str) -> Dict[str, Any]:
-        return self._sessions.setdefault(session_id, {})
+def _copy(data: Dict[str, Any]) -> Dict[str, Any]:
+    # Та же сериализация, что у хранилищ: сравнивается с тем, что вернёт store.get
+    return json.loads(json.dumps(data, ensure_ascii=False, default=str))
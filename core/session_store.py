@@ -0,0 +1,296 @@
+import atexit
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.crypto_store import Cipher
+
+log = logging.getLogger(__name__)
+
+
+class MemorySessionStore:
+    """
+    Хранилище по умолчанию: в пределах процесса, без персистентности.
+    max_idle — как у ShardedSQLiteSessionStore: сессия без put/touch
+    дольше max_idle секунд считается удалённой.
+    """
+    def __init__(self, max_idle: Optional[float] = None, clock=time.time):
+        self.max_idle = max_idle
+        self._clock = clock
+        # sid -> (последний доступ, json)
+        self._data: Dict[str, Tuple[float, str]] = {}
+
+    def get(self, sid: str) -> Optional[Dict[str, Any]]:
+        item = self._data.get(sid)
+        if item is None:
+            return None
+        if self.max_idle is not None and self._clock() - item[0] > self.max_idle:
+            del self._data[sid]
+            return None
+        return json.loads(item[1])
+
+    def put(self, sid: str, data: Dict[str, Any]) -> None:
+        self._data[sid] = (self._clock(), json.dumps(data, ensure_ascii=False, default=str))
+
+    def touch(self, sid: str) -> None:
+        item = self._data.get(sid)
+        if item is not None:
+            self._data[sid] = (self._clock(), item[1])
+
+    def delete(self, sid: str) -> None:
+        self._data.pop(sid, None)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class ShardedSQLiteSessionStore:
+    """
+    Сессии в N файлах SQLite (WAL) — shard = crc32(sid) % shards.
+    Несколько процессов на одной машине читают и пишут одни и те же файлы,
+    так что один диалог можно обслуживать любым воркером.
+
+    Запись отложенная: put/delete/touch кладут изменения в очередь, фоновый
+    поток сбрасывает их пачкой — одна транзакция на шард. Неудачная пачка
+    возвращается в очередь и пишется снова; очередь ограничена max_pending:
+    при переполнении put/delete сбрасывают её сами и ошибку записи получает
+    вызывающий. Чтение идёт через локальный LRU-кэш; cache_ttl ограничивает,
+    насколько устаревшими могут быть данные, записанные другим процессом.
+    Колонка updated — время последнего put или touch; строки старше
+    max_idle не читаются и удаляются purge_idle().
+
+    С cipher колонка data хранит AES-GCM-шифротекст (AAD — sid, так что
+    строку нельзя подставить другой сессии); кэш держит открытый JSON.
+    """
+    def __init__(
+        self,
+        directory: str = "sessions",
+        shards: int = 8,
+        cache_size: int = 1024,
+        cache_ttl: float = 0.5,
+        flush_interval: float = 0.05,
+        batch_size: int = 256,
+        max_idle: Optional[float] = None,
+        cipher: Optional[Cipher] = None,
+        max_pending: int = 10000,
+    ):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.shards = shards
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_idle = max_idle
+        self.cipher = cipher
+        self.max_pending = max_pending
+
+        self._local = threading.local()
+        # все открытые соединения (по одному на поток и шард) — для close()
+        self._conns: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        # sid -> json | None (удаление); обычный dict сохраняет порядок вставки
+        self._pending: Dict[str, Optional[str]] = {}
+        # пачка, которую сейчас пишет flush(): видна читателям до коммита
+        self._inflight: Dict[str, Optional[str]] = {}
+        # sid, к которым обращались: у строки обновится только updated
+        self._touched: Dict[str, None] = {}
+        self._flush_lock = threading.Lock()
+        # sid -> (когда прочитано, json)
+        self._cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._wake = threading.Event()
+        self._stop = False
+
+        for i in range(shards):
+            conn = self._conn(i)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "sid TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.commit()
+
+        self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # --- API хранилища ---
+    def get(self, sid: str) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            for queued in (self._pending, self._inflight):
+                if sid in queued:
+                    raw = queued[sid]
+                    return json.loads(raw) if raw is not None else None
+            hit = self._cache.get(sid)
+            if hit is not None and now - hit[0] < self.cache_ttl:
+                self._cache.move_to_end(sid)
+                return json.loads(hit[1])
+
+        row = self._conn(self._shard(sid)).execute(
+            "SELECT data, updated FROM sessions WHERE sid = ?", (sid,)
+        ).fetchone()
+        if row is None or (self.max_idle is not None and time.time() - row[1] > self.max_idle):
+            with self._lock:
+                self._cache.pop(sid, None)
+            return None
+        raw = self._decode(sid, row[0])
+        with self._lock:
+            self._remember(sid, raw, now)
+        return json.loads(raw)
+
+    def put(self, sid: str, data: Dict[str, Any]) -> None:
+        raw = json.dumps(data, ensure_ascii=False, default=str)
+        self._backpressure()
+        with self._lock:
+            self._pending[sid] = raw
+            self._remember(sid, raw, time.monotonic())
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def delete(self, sid: str) -> None:
+        self._backpressure()
+        with self._lock:
+            self._pending[sid] = None
+            self._cache.pop(sid, None)
+        self._wake.set()
+
+    def touch(self, sid: str) -> None:
+        """Отмечает доступ к сессии: продлевает её относительно max_idle."""
+        with self._lock:
+            if len(self._touched) < self.max_pending:
+                self._touched[sid] = None
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                touched, self._touched = self._touched, {}
+                self._inflight = batch
+            if not batch and not touched:
+                return
+            try:
+                self._write(batch, touched)
+            except BaseException:
+                with self._lock:
+                    # Пачка снова в очереди; более новые изменения тех же sid главнее
+                    self._pending = {**batch, **self._pending}
+                    self._touched = {**touched, **self._touched}
+                raise
+            finally:
+                with self._lock:
+                    self._inflight = {}
+
+    def _write(self, batch: Dict[str, Optional[str]], touched: Optional[Dict[str, None]] = None) -> None:
+        by_shard: Dict[int, list] = {}
+        for sid, raw in batch.items():
+            by_shard.setdefault(self._shard(sid), []).append((sid, raw))
+        touched_by_shard: Dict[int, list] = {}
+        for sid in touched or ():
+            if sid not in batch:
+                touched_by_shard.setdefault(self._shard(sid), []).append(sid)
+        now = time.time()
+        for shard in by_shard.keys() | touched_by_shard.keys():
+            items = by_shard.get(shard, [])
+            conn = self._conn(shard)
+            with conn:
+                conn.executemany(
+                    "UPDATE sessions SET updated = ? WHERE sid = ?",
+                    [(now, sid) for sid in touched_by_shard.get(shard, ())],
+                )
+                conn.executemany(
+                    "INSERT INTO sessions (sid, data, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(sid) DO UPDATE SET data = excluded.data, updated = excluded.updated",
+                    [(sid, self._encode(sid, raw), now) for sid, raw in items if raw is not None],
+                )
+                conn.executemany(
+                    "DELETE FROM sessions WHERE sid = ?",
+                    [(sid,) for sid, raw in items if raw is None],
+                )
+
+    def purge_idle(self) -> int:
+        """Удаляет строки, не обновлявшиеся дольше max_idle."""
+        if self.max_idle is None:
+            return 0
+        cutoff = time.time() - self.max_idle
+        removed = 0
+        for shard in range(self.shards):
+            conn = self._conn(shard)
+            with conn:
+                removed += conn.execute("DELETE FROM sessions WHERE updated < ?", (cutoff,)).rowcount
+        return removed
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._stop = True
+            self._wake.set()
+            self._thread.join()
+        self.flush()
+        with self._lock:
+            conns, self._conns = self._conns, []
+            self._local = threading.local()
+        for conn in conns:
+            conn.close()
+
+    # --- внутреннее ---
+    def _shard(self, sid: str) -> int:
+        return zlib.crc32(sid.encode("utf-8")) % self.shards
+
+    def _conn(self, shard: int) -> sqlite3.Connection:
+        # sqlite3-соединение нельзя делить между потоками — держим своё на поток
+        conns = getattr(self._local, "conns", None)
+        if conns is None:
+            conns = self._local.conns = {}
+        conn = conns.get(shard)
+        if conn is None:
+            # check_same_thread=False только ради close() из другого потока:
+            # работает с соединением по-прежнему лишь его поток
+            conn = sqlite3.connect(str(self.dir / f"shard-{shard:02d}.db"), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conns[shard] = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def _encode(self, sid: str, raw: str):
+        if self.cipher is None:
+            return raw
+        return self.cipher.encrypt(raw.encode("utf-8"), sid.encode("utf-8"))
+
+    def _decode(self, sid: str, data) -> str:
+        if self.cipher is None:
+            return data
+        return self.cipher.decrypt(bytes(data), sid.encode("utf-8")).decode("utf-8")
+
+    def _remember(self, sid: str, raw: str, now: float) -> None:
+        self._cache[sid] = (now, raw)
+        self._cache.move_to_end(sid)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _backpressure(self) -> None:
+        # Очередь полна (запись не успевает или падает) — сбрасываем её сами;
+        # ошибка записи уходит вызывающему, а не копится молча
+        with self._lock:
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self.flush()
+
+    def _run(self) -> None:
+        while not self._stop:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Session store flush failed, %d writes pending", len(self._pending))
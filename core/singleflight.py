@@ -0,0 +1,76 @@
+import functools
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Склейка одинаковых одновременных вызовов: пока по ключу идёт вычисление,
+    остальные вызывающие ждут его и получают тот же результат (или то же
+    исключение). После завершения ключ забывается — это не кэш.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._calls)}
+
+
+def singleflight(key_fn: Callable[..., Hashable], group: Optional[SingleFlight] = None) -> Callable:
+    """
+    Декоратор метода. key_fn(self, *args, **kwargs) строит ключ; вызовы
+    одного экземпляра с одинаковым ключом склеиваются. Отключается
+    атрибутом экземпляра dedupe = False.
+    """
+    flight = group or SingleFlight()
+
+    def deco(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def inner(self, *args, **kwargs):
+            if not getattr(self, "dedupe", True):
+                return fn(self, *args, **kwargs)
+            key = (id(self), key_fn(self, *args, **kwargs))
+            return flight.do(key, fn, self, *args, **kwargs)
+        inner.singleflight = flight
+        return inner
+    return deco
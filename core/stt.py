@@ -1,9 +1,210 @@
-from typing import Optional
+import mmap
+import os
+import pickle
+import struct
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from core.metrics import metrics
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+FRAME_SECONDS = 0.02  # окно для оценки энергии при поиске тишины
+
+
+@dataclass
+class WavLayout:
+    channels: int
+    sampwidth: int
+    rate: int
+    data_offset: int
+    data_size: int
+    format_tag: int = 1  # 1 — PCM, 3 — float
+
+    def header(self, data_size: int) -> bytes:
+        """Канонический 44-байтный RIFF-заголовок этого формата для data_size байт."""
+        return struct.pack(
+            "<4sI4s4sIHHIIHH4sI",
+            b"RIFF", 36 + data_size, b"WAVE",
+            b"fmt ", 16, self.format_tag, self.channels, self.rate,
+            self.rate * self.frame_bytes, self.frame_bytes, self.sampwidth * 8,
+            b"data", data_size,
+        )
+
+    @property
+    def frame_bytes(self) -> int:
+        return self.channels * self.sampwidth
+
+    @property
+    def duration(self) -> float:
+        return self.data_size / (self.frame_bytes * self.rate)
+
+
+def read_wav_layout(buf) -> WavLayout:
+    """Разбирает RIFF-заголовок: где лежат PCM-данные и их формат."""
+    if buf[0:4] != b"RIFF" or buf[8:12] != b"WAVE":
+        raise ValueError("Not a RIFF/WAVE file")
+    pos, fmt = 12, None
+    while pos + 8 <= len(buf):
+        cid, size = buf[pos:pos + 4], struct.unpack("<I", buf[pos + 4:pos + 8])[0]
+        body = pos + 8
+        if cid == b"fmt ":
+            tag, channels, rate, _, _, bits = struct.unpack("<HHIIHH", buf[body:body + 16])
+            fmt = (channels, bits // 8, rate, tag)
+        elif cid == b"data":
+            if fmt is None:
+                raise ValueError("WAV 'data' chunk before 'fmt '")
+            channels, sampwidth, rate, tag = fmt
+            return WavLayout(channels, sampwidth, rate, body, min(size, len(buf) - body), tag)
+        pos = body + size + (size & 1)
+    raise ValueError("WAV without 'data' chunk")
+
+
+def _frame_energy(buf, layout: WavLayout, start: int, end: int) -> List[float]:
+    """Средняя |амплитуда| по окнам FRAME_SECONDS на отрезке [start, end) в байтах."""
+    step = max(layout.frame_bytes, int(layout.rate * FRAME_SECONDS) * layout.frame_bytes)
+    if np is not None and layout.sampwidth == 2:
+        n = (end - start) // step
+        pcm = np.frombuffer(buf, dtype="<i2", count=n * step // 2, offset=start)
+        return np.abs(pcm.reshape(n, -1).astype(np.int32)).mean(axis=1).tolist() if n else []
+    energies = []
+    for off in range(start, end - step + 1, step):
+        window = memoryview(buf)[off:off + step]
+        if layout.sampwidth == 2:
+            samples = window.cast("h")[::8]  # прореживание: для поиска тишины хватает
+            energies.append(sum(abs(s) for s in samples) / max(1, len(samples)))
+        else:
+            energies.append(sum(abs(b - 128) for b in window[::8]) / max(1, len(window[::8])))
+    return energies
+
+
+def plan_segments(
+    buf,
+    layout: WavLayout,
+    segment_seconds: float = 30.0,
+    overlap_seconds: float = 1.0,
+    search_seconds: float = 5.0,
+) -> List[Tuple[int, int]]:
+    """
+    Делит PCM на отрезки ~segment_seconds, режет в самом тихом окне в
+    пределах ±search_seconds от целевой границы (окно не шире половины
+    отрезка), каждый отрезок захватывает overlap_seconds соседей.
+    Возвращает абсолютные (start, end) в байтах.
+    """
+    if segment_seconds <= 0 or overlap_seconds < 0 or search_seconds < 0:
+        raise ValueError("segment_seconds must be > 0, overlap/search must be >= 0")
+    fb = layout.frame_bytes
+    bps = layout.rate * fb
+    begin, stop = layout.data_offset, layout.data_offset + layout.data_size - layout.data_size % fb
+    target = max(fb, int(segment_seconds * bps) // fb * fb)
+    overlap = int(overlap_seconds * bps)
+    # Окно поиска уже половины отрезка: иначе lo не сдвигается вперёд
+    search = max(0, min(int(search_seconds * bps), target // 2 - 1)) // fb * fb
+    step = max(fb, int(layout.rate * FRAME_SECONDS) * fb)
+
+    cuts, pos = [begin], begin
+    while stop - pos > target + search:
+        lo = pos + target - search
+        energy = _frame_energy(buf, layout, lo, lo + 2 * search)
+        quiet = min(range(len(energy)), key=energy.__getitem__) if energy else search // step
+        pos = max(lo + quiet * step, pos + fb)
+        cuts.append(pos)
+    cuts.append(stop)
+
+    align = lambda x: x - (x - begin) % fb
+    return [
+        (align(max(begin, a - overlap)), align(min(stop, b + overlap)))
+        for a, b in zip(cuts, cuts[1:])
+    ]
+
+
+def stitch(texts: List[str], max_overlap_words: int = 20) -> str:
+    """Склеивает тексты отрезков, убирая слова, повторённые из-за перекрытия."""
+    words: List[str] = []
+    for text in texts:
+        nxt = text.split()
+        best = 0
+        for k in range(min(max_overlap_words, len(words), len(nxt)), 0, -1):
+            if [w.lower() for w in words[-k:]] == [w.lower() for w in nxt[:k]]:
+                best = k
+                break
+        words.extend(nxt[best:])
+    return " ".join(words)
+
+
+def _transcribe_range(stt: "STT", path: str, layout: WavLayout, start: int, end: int, lang: Optional[str]) -> str:
+    # Выполняется в процессе пула: файл открывается заново, PCM не пересылается.
+    # Отрезок — самостоятельный WAV того же формата, что и исходный файл
+    with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return stt.transcribe(layout.header(end - start) + mm[start:end], lang=lang)
 
 
 class STT:
-    def transcribe(self, audio_bytes: bytes) -> str:
+    @metrics.timed("stt.transcribe")
+    def transcribe(self, audio_bytes: bytes, lang: Optional[str] = None) -> str:
         return "<text>"
 
-    def from_file(self, path: str, lang: Optional[str] = None) -> str:
-        return "<text:from_file>"
+    @metrics.timed("stt.from_file")
+    def from_file(
+        self,
+        path: str,
+        lang: Optional[str] = None,
+        long_form: Optional[bool] = None,
+        segment_seconds: float = 30.0,
+        overlap_seconds: float = 1.0,
+        workers: Optional[int] = None,
+    ) -> str:
+        """
+        long_form=None включает длинный режим сам для WAV длиннее двух отрезков:
+        файл отображается через mmap, режется по тишине на перекрывающиеся
+        отрезки, они распознаются параллельно в пуле процессов и склеиваются.
+        """
+        if long_form is False or not os.path.isfile(path):
+            return "<text:from_file>"
+        with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            try:
+                layout = read_wav_layout(mm)
+            except ValueError:
+                return "<text:from_file>"
+            if long_form is None and layout.duration <= 2 * segment_seconds:
+                return "<text:from_file>"
+            segments = plan_segments(mm, layout, segment_seconds, overlap_seconds)
+        return self.transcribe_segments(path, segments, lang, workers, layout)
+
+    def transcribe_segments(
+        self,
+        path: str,
+        segments: List[Tuple[int, int]],
+        lang: Optional[str] = None,
+        workers: Optional[int] = None,
+        layout: Optional[WavLayout] = None,
+    ) -> str:
+        """
+        Распознаёт отрезки (start, end) файла этим же экземпляром STT (в
+        процессах пула — его копией; несериализуемый — в потоках). Каждый
+        отрезок уходит в transcribe отдельным WAV с форматом исходного файла.
+        """
+        if layout is None:
+            with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                layout = read_wav_layout(mm)
+        n = len(segments)
+        workers = workers or min(n, os.cpu_count() or 1)
+        args = ([self] * n, [path] * n, [layout] * n, [s for s, _ in segments], [e for _, e in segments], [lang] * n)
+        metrics.incr("stt.segments", n)
+        try:
+            pickle.dumps(self)  # загруженную модель в процесс может быть не передать
+            pool_cls = ProcessPoolExecutor
+        except Exception:
+            pool_cls = ThreadPoolExecutor
+        try:
+            with pool_cls(max_workers=workers) as pool:
+                texts = list(pool.map(_transcribe_range, *args))
+        except (OSError, NotImplementedError, PermissionError):
+            # Без multiprocessing (часть Android-сборок) — хотя бы потоки
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                texts = list(pool.map(_transcribe_range, *args))
+        return stitch(texts)
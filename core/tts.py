@@ -1,5 +1,34 @@
+from typing import Optional
+
+from core.audio_cache import AudioCache, audio_key
+from core.metrics import metrics
+from core.singleflight import singleflight
+
+
 class TTS:
+    # Одинаковые одновременные запросы синтезируются один раз
+    dedupe = True
+
+    def __init__(self, voice: str = "default", rate: float = 1.0, cache: Optional[AudioCache] = None):
+        self.voice = voice
+        self.rate = rate
+        # По умолчанию — только LRU в памяти; AudioCache(directory=...) сохраняет на диск
+        self.cache = cache if cache is not None else AudioCache()
+
+    @metrics.timed("tts.synthesize")
+    @singleflight(lambda self, text: text)
     def synthesize(self, text: str) -> bytes:
+        key = audio_key(text, self.voice, self.rate)
+        audio = self.cache.get(key)
+        if audio is not None:
+            metrics.incr("tts.cache_hit")
+            return audio
+        metrics.incr("tts.cache_miss")
+        audio = self._render(text)
+        self.cache.put(key, audio)
+        return audio
+
+    def _render(self, text: str) -> bytes:
         return f"AUDIO:{text}".encode("utf-8")
 
     def speak(self, text: str) -> bool:
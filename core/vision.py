@@ -1,12 +1,136 @@
-from typing import Any, Dict, List
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from core.metrics import metrics
+from core.singleflight import singleflight
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+
+def image_key(image: Any) -> Hashable:
+    """Ключ содержимого изображения для склейки одинаковых запросов."""
+    if np is not None and isinstance(image, np.ndarray) and image.dtype != object:
+        # Срез кадра (тайл, шаг по осям) не C-contiguous — hashlib его не примет
+        arr = np.ascontiguousarray(image)
+        h = hashlib.blake2b(arr, digest_size=16)
+        h.update(repr((arr.shape, arr.dtype.str)).encode())
+        return h.digest()
+    try:
+        return hashlib.blake2b(image, digest_size=16).digest()
+    except (TypeError, ValueError, BufferError):
+        return id(image)
+
+
+def iter_tiles(height: int, width: int, tile: int, overlap: float = 0.2) -> List[Tuple[int, int, int, int]]:
+    """Окна (x0, y0, x1, y1) с перекрытием; последние прижаты к краю кадра."""
+    stride = max(1, int(tile * (1 - overlap)))
+
+    def starts(size: int) -> List[int]:
+        if size <= tile:
+            return [0]
+        s = list(range(0, size - tile, stride))
+        return s + [size - tile]
+
+    return [
+        (x, y, min(x + tile, width), min(y + tile, height))
+        for y in starts(height) for x in starts(width)
+    ]
+
+
+def nms(boxes, scores, iou_threshold: float = 0.5) -> List[int]:
+    """Векторный NMS (numpy): индексы оставленных рамок по убыванию score."""
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float32)
+    x1, y1, x2, y2 = boxes.T
+    areas = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(int(i))
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou <= iou_threshold]
+    return keep
+
+
+def merge_detections(dets: Sequence[Dict[str, Any]], iou_threshold: float = 0.5) -> List[Dict[str, Any]]:
+    """NMS по каждому классу отдельно — дубли на стыках тайлов схлопываются."""
+    by_label: Dict[str, List[Dict[str, Any]]] = {}
+    for d in dets:
+        by_label.setdefault(d["label"], []).append(d)
+    merged: List[Dict[str, Any]] = []
+    for items in by_label.values():
+        keep = nms([d["bbox"] for d in items], [d["score"] for d in items], iou_threshold)
+        merged.extend(items[i] for i in keep)
+    merged.sort(key=lambda d: d["score"], reverse=True)
+    return merged
 
 
 class Vision:
+    # Одинаковые одновременные запросы анализируются один раз
+    dedupe = True
+
+    @metrics.timed("vision.analyze")
+    @singleflight(lambda self, image: image_key(image))
     def analyze(self, image: bytes) -> Dict[str, Any]:
         return {"labels": ["object"], "confidence": [0.9]}
 
-    def detect(self, image: bytes) -> List[Dict[str, Any]]:
+    @metrics.timed("vision.detect")
+    def detect(
+        self,
+        image: Any,
+        tile: Optional[int] = None,
+        overlap: float = 0.2,
+        iou_threshold: float = 0.5,
+        workers: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        С tile (и numpy-массивом HxW[xC] больше тайла) кадр режется на
+        перекрывающиеся тайлы — срезы-представления без копирования, — пачки
+        тайлов идут в _detect_batch параллельно, рамки переводятся в
+        координаты кадра и сливаются NMS. Иначе — один проход по всему кадру.
+        """
+        if tile is None or np is None or not isinstance(image, np.ndarray):
+            return self._detect_single(image)
+        height, width = image.shape[:2]
+        if height <= tile and width <= tile:
+            return self._detect_single(image)
+
+        windows = iter_tiles(height, width, tile, overlap)
+        views = [image[y0:y1, x0:x1] for x0, y0, x1, y1 in windows]
+        workers = max(1, min(workers or os.cpu_count() or 1, len(views)))
+        chunk = -(-len(views) // workers)
+        batches = [range(i, min(i + chunk, len(views))) for i in range(0, len(views), chunk)]
+        metrics.incr("vision.tiles", len(views))
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda idx: self._detect_batch([views[i] for i in idx]), batches))
+
+        dets: List[Dict[str, Any]] = []
+        for idx, batch in zip(batches, results):
+            for i, tile_dets in zip(idx, batch):
+                x0, y0 = windows[i][0], windows[i][1]
+                for d in tile_dets:
+                    bx1, by1, bx2, by2 = d["bbox"]
+                    dets.append({**d, "bbox": [bx1 + x0, by1 + y0, bx2 + x0, by2 + y0]})
+        return merge_detections(dets, iou_threshold) if dets else []
+
+    def _detect_batch(self, images: List[Any]) -> List[List[Dict[str, Any]]]:
+        # Настоящая модель (ultralytics) принимает список кадров одним батчем
+        return [self._detect_single(img) for img in images]
+
+    def _detect_single(self, image: Any) -> List[Dict[str, Any]]:
         return [{"bbox": [0, 0, 10, 10], "label": "object", "score": 0.9}]
 
+    @metrics.timed("vision.classify")
     def classify(self, image: bytes) -> Dict[str, float]:
         return {"object": 0.9}
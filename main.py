@@ -3,7 +3,6 @@ from __future__ import annotations
 
 import sys
 import threading
-from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from kivy.app import App
@@ -11,6 +10,7 @@ from kivy.lang import Builder
 from kivy.clock import Clock
 from kivy.logger import Logger
 from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.screenmanager import Screen, ScreenManager
 
 # Базовые защитные проверки
 from core.idiot_guard import (
@@ -19,6 +19,10 @@ from core.idiot_guard import (
     process_with_limits,
     sanitize_command,
 )
+from core.errors import ErrorHandler
+from core.metrics import metrics
+from core.scheduler import BACKGROUND, default_scheduler
+from screens.chat import ChatScreen
 
 # ---------------- UI (KV) ----------------
 KV = """
@@ -49,6 +53,9 @@ KV = """
         Button:
             text: "Vision"
             on_release: root.init_vision()
+        Button:
+            text: "Chat"
+            on_release: app.root.current = "chat"
 
     ScrollView:
         do_scroll_x: False
@@ -63,10 +70,32 @@ KV = """
 """
 
 # ---------------- Services ----------------
+def _init_asr():
+    from faster_whisper import WhisperModel  # type: ignore
+    # Лёгкая модель по умолчанию; на Android/Colab может быть недоступна
+    # Подмените на путь к локальной модели, если требуется.
+    # model = WhisperModel("small", device="cpu", compute_type="int8")
+
+
+def _init_tts():
+    import pyttsx3  # type: ignore
+    return pyttsx3.init()
+
+
+def _init_vision():
+    # Импортируем, но не грузим веса, чтобы не падать на Android
+    import ultralytics  # type: ignore
+
+
 class Services:
     """Ленивая инициализация тяжёлых подсистем (по возможности)."""
     def __init__(self):
-        self._executor = ThreadPoolExecutor(max_workers=2)
+        # Общий с Orchestrator планировщик: прогрев идёт как background
+        # и не занимает поток, зарезервированный под интерактивные запросы
+        self._scheduler = default_scheduler()
+        # Инициализация повторяется один раз; если и повтор упал, подсистема
+        # минуту отказывает сразу, а не переинициализируется на каждое нажатие
+        self.errors = ErrorHandler(retries=1, backoff=0.2, min_calls=2, failure_rate=1.0, reset_timeout=60.0)
         self.asr = None
         self.tts = None
         self.vision = None
@@ -76,45 +105,63 @@ class Services:
             "vision": False,
         }
 
+    def _submit_background(self, task):
+        fut = self._scheduler.submit(task, priority=BACKGROUND)
+        fut.add_done_callback(self._report_background)
+        return fut
+
+    @staticmethod
+    def _report_background(fut):
+        # Колбэк идёт в потоке планировщика: исключение задачи только логируем,
+        # fut.result() здесь перевыбросил бы его
+        if fut.cancelled():
+            return
+        error = fut.exception()
+        if error is not None:
+            Logger.error(f"Background task failed: {error!r}")
+            return
+        result = fut.result()
+        if isinstance(result, dict) and result.get("busy"):
+            Logger.warning(f"Background task rejected: {result['reason']}")
+
     # Инициализация аудио-стека: faster-whisper (ASR) + pyttsx3 (TTS)
     def init_audio(self, on_done):
+        @metrics.timed("services.init_audio")
         def task():
             ok = {"asr": False, "tts": False}
             # ASR (faster-whisper) — пытаемся мягко
             try:
-                from faster_whisper import WhisperModel  # type: ignore
-                # Лёгкая модель по умолчанию; на Android/Colab может быть недоступна
-                # Подмените на путь к локальной модели, если требуется.
-                # model = WhisperModel("small", device="cpu", compute_type="int8")
+                with metrics.span("services.init_asr"):
+                    self.errors.call("asr", _init_asr)
                 ok["asr"] = True
             except Exception as e:
                 Logger.warning(f"ASR init failed: {e}")
 
             # TTS (pyttsx3)
             try:
-                import pyttsx3  # type: ignore
-                _ = pyttsx3.init()
+                with metrics.span("services.init_tts"):
+                    _ = self.errors.call("tts", _init_tts)
                 ok["tts"] = True
             except Exception as e:
                 Logger.warning(f"TTS init failed: {e}")
 
             on_done(ok)
 
-        self._executor.submit(task)
+        self._submit_background(task)
 
     # Инициализация Computer Vision (ultralytics/torch)
     def init_vision(self, on_done):
+        @metrics.timed("services.init_vision")
         def task():
             ok = False
             try:
-                # Импортируем, но не грузим веса, чтобы не падать на Android
-                import ultralytics  # type: ignore
+                self.errors.call("vision", _init_vision)
                 ok = True
             except Exception as e:
                 Logger.warning(f"Vision init failed: {e}")
             on_done(ok)
 
-        self._executor.submit(task)
+        self._submit_background(task)
 
 
 # ---------------- Root widget ----------------
@@ -193,8 +240,14 @@ class LVREXApp(App):
     def build(self):
         Builder.load_string(KV)
         self.services = Services()
-        root = Root(self.services)
-        return root
+        sm = ScreenManager()
+        # Чат — стартовый экран; ⚙️ в шапке ведёт к самопроверкам и инициализации
+        sm.add_widget(ChatScreen(settings_callback=lambda *_: setattr(sm, "current", "home")))
+        home = Screen(name="home")
+        home.add_widget(Root(self.services))
+        sm.add_widget(home)
+        sm.current = "chat"
+        return sm
 
 
 def main():
@@ -2,19 +2,31 @@
 import io
 import os
 import struct
+import threading
 import zipfile
+from typing import Iterable, List, Optional, Tuple
+
+_HAS_PREAD = hasattr(os, "pread")
+_HAS_PREADV = hasattr(os, "preadv")
 
 class ZipSegmentFile(io.RawIOBase):
     """
     Прямое чтение одиночного файла внутри ZIP без распаковки.
     Требование: entry должен быть ZIP_STORED (без сжатия).
+
+    Все чтения позиционные (os.pread/preadv) — общего seek на дескрипторе нет,
+    поэтому read_at/readinto_at/read_many можно звать из нескольких потоков.
+    readinto пишет прямо в буфер вызывающего, без промежуточного bytes.
     """
     def __init__(self, zip_path: str, entry_name: str):
         super().__init__()
         self._zip_path = zip_path
         self._entry = entry_name
         self._fh = open(zip_path, "rb")
+        self._fd = self._fh.fileno()
         self._closed = False
+        # Только для платформ без pread (Windows): seek+read под замком
+        self._lock = threading.Lock()
 
         with zipfile.ZipFile(zip_path, "r") as zf:
             info = zf.getinfo(entry_name)
@@ -30,8 +42,7 @@ class ZipSegmentFile(io.RawIOBase):
 
     def _compute_data_offset(self, info: zipfile.ZipInfo) -> int:
         # Локальный заголовок: 30 байт + имя + extra
-        self._fh.seek(info.header_offset)
-        header = self._fh.read(30)
+        header = self._pread(30, info.header_offset)
         sig, = struct.unpack("<I", header[0:4])
         if sig != 0x04034B50:
             raise ValueError("Неверная сигнатура локального заголовка ZIP")
@@ -72,22 +83,93 @@ class ZipSegmentFile(io.RawIOBase):
         return self._pos
 
     def read(self, n: int = -1) -> bytes:
-        if self._pos >= self._size:
-            return b""
         if n is None or n < 0:
             n = self._size - self._pos
-        n = min(n, self._size - self._pos)
-        self._fh.seek(self._data_offset + self._pos)
-        data = self._fh.read(n)
+        data = self.read_at(self._pos, n)
         self._pos += len(data)
         return data
 
     def readinto(self, b) -> int:
-        data = self.read(len(b))
-        n = len(data)
-        b[:n] = data
+        n = self.readinto_at(b, self._pos)
+        self._pos += n
         return n
 
+    # --- позиционное чтение (потокобезопасно, не трогает tell()) ---
+    def read_at(self, offset: int, n: int) -> bytes:
+        self._check_open()
+        n = self._clamp(offset, n)
+        if n <= 0:
+            return b""
+        return self._pread(n, self._data_offset + offset)
+
+    def readinto_at(self, b, offset: int) -> int:
+        self._check_open()
+        view = memoryview(b).cast("B")
+        n = self._clamp(offset, len(view))
+        if n <= 0:
+            return 0
+        return self._preadinto(view[:n], self._data_offset + offset)
+
+    def read_many(self, ranges: Iterable[Tuple[int, int]], buffers: Optional[List] = None) -> List:
+        """
+        Пакетное чтение [(offset, length), ...] относительно начала entry.
+        Диапазоны читаются в порядке смещений (последовательный I/O), результат —
+        в исходном порядке. С buffers — readinto в готовые буферы, вернёт длины.
+        """
+        self._check_open()
+        ranges = list(ranges)
+        out: List = [None] * len(ranges)
+        for i in sorted(range(len(ranges)), key=lambda j: ranges[j][0]):
+            offset, length = ranges[i]
+            if buffers is None:
+                out[i] = self.read_at(offset, length)
+            else:
+                out[i] = self.readinto_at(memoryview(buffers[i])[:length], offset)
+        return out
+
+    def _check_open(self) -> None:
+        # pread по закрытому fd прочитал бы файл, получивший тот же номер
+        if self._closed:
+            raise ValueError("I/O operation on closed file")
+
+    def _clamp(self, offset: int, n: int) -> int:
+        if offset < 0:
+            raise ValueError("negative offset")
+        return max(0, min(n, self._size - offset))
+
+    def _pread(self, n: int, abs_offset: int) -> bytes:
+        if _HAS_PREAD:
+            chunks = []
+            while n > 0:
+                chunk = os.pread(self._fd, n, abs_offset)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                n -= len(chunk)
+                abs_offset += len(chunk)
+            return chunks[0] if len(chunks) == 1 else b"".join(chunks)
+        with self._lock:
+            self._fh.seek(abs_offset)
+            return self._fh.read(n)
+
+    def _preadinto(self, view: memoryview, abs_offset: int) -> int:
+        total = 0
+        if _HAS_PREADV:
+            while total < len(view):
+                got = os.preadv(self._fd, [view[total:]], abs_offset + total)
+                if not got:
+                    break
+                total += got
+            return total
+        with self._lock:
+            self._fh.seek(abs_offset)
+            while total < len(view):
+                got = self._fh.readinto(view[total:])
+                if not got:
+                    break
+                total += got
+        return total
+
     def __enter__(self): return self
     def __exit__(self, exc_type, exc, tb):
         self.close()
@@ -3,11 +3,34 @@ from kivy.uix.screenmanager import Screen
 from kivy.uix.label import Label
 import os
 
+from core.metrics import metrics
+
 class AnalyticsScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(name="analytics", **kwargs)
-        self.add_widget(Label(text=self.get_stats(), font_size=16))
+        self.stats_label = Label(text=self.get_stats(), font_size=16)
+        self.add_widget(self.stats_label)
+
+    def on_pre_enter(self, *args):
+        self.stats_label.text = self.get_stats()
 
     def get_stats(self):
         used_memory = os.path.getsize("memory/memory.json") // 1024
-        return f"Использовано памяти: {used_memory} KB"
+        lines = [f"Использовано памяти: {used_memory} KB"]
+        lines += self.get_latency_lines()
+        return "\n".join(lines)
+
+    def get_latency_lines(self):
+        snap = metrics.snapshot()
+        lines = []
+        for stage, s in sorted(snap["stages"].items()):
+            if not s.get("count"):
+                continue
+            lines.append(
+                f"{stage}: n={s['count']} p50={s['p50']:.1f}ms "
+                f"p95={s['p95']:.1f}ms p99={s['p99']:.1f}ms"
+            )
+        return lines
+
+    def export_json(self, path="logs/metrics.json"):
+        return metrics.dump_json(path)
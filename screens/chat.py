@@ -0,0 +1,54 @@
+# screens/chat.py
+from kivy.clock import Clock
+from kivy.uix.screenmanager import Screen
+from kivy.uix.boxlayout import BoxLayout
+
+from core.interaction import InteractionManager
+from core.pipeline import StageSkipped
+from core.scheduler import default_scheduler
+from ui.components.ChatHistory import ChatHistory
+from ui.components.HeaderBar import HeaderBar
+from ui.components.InputBar import InputBar
+
+
+class ChatScreen(Screen):
+    """
+    Экран чата: история — виртуализированный ChatHistory (RecycleView с
+    кэшем высот), ответ считается InteractionManager.respond в общем
+    планировщике и добавляется в историю уже в главном потоке.
+    """
+    def __init__(self, interaction=None, settings_callback=None, **kwargs):
+        super().__init__(name="chat", **kwargs)
+        self.interaction = interaction or InteractionManager()
+        self.settings_callback = settings_callback
+        self.build_ui()
+
+    def build_ui(self):
+        layout = BoxLayout(orientation="vertical")
+        layout.add_widget(HeaderBar(settings_callback=self.settings_callback))
+        self.history = ChatHistory()
+        layout.add_widget(self.history)
+        layout.add_widget(InputBar(send_callback=self.send))
+        self.add_widget(layout)
+
+    def send(self, text):
+        self.history.add_message(text, is_user=True)
+        fut = default_scheduler().submit(self.interaction.respond, text)
+        fut.add_done_callback(lambda f: Clock.schedule_once(lambda dt: self._on_answer(f), 0))
+
+    def _on_answer(self, fut):
+        try:
+            result = fut.result()
+        except Exception as e:
+            self.history.add_message(f"Ошибка: {e}")
+            return
+        if isinstance(result, dict) and result.get("busy"):  # busy(...) — планировщик перегружен
+            self.history.add_message("Сервис занят, попробуйте ещё раз")
+            return
+        answer = result.get("answer")
+        if answer is not None:
+            self.history.add_message(str(answer))
+        elif isinstance(result.errors.get("answer"), StageSkipped):
+            self.history.add_message("Не нашёл ответа")
+        else:
+            self.history.add_message(f"Ошибка: {result.errors.get('answer')}")
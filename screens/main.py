@@ -1,15 +1,13 @@
 from core.ai import MistralEngine
 from interface.prompt import get_user_prompt
-from datetime import datetime
-import os
+from core.logger import Logger
 
 log_path = "logs/inference.log"
-os.makedirs("logs", exist_ok=True)
+# Один открытый файл и фоновая запись вместо open() на каждый ответ
+inference_log = Logger(path=log_path, level="info")
 
 def log_interaction(prompt: str, response: str):
-    with open(log_path, "a", encoding="utf-8") as log:
-        now = datetime.now()
-        log.write(f"[{now}]\nPrompt: {prompt}\nResponse: {response}\n{'-'*40}\n")
+    inference_log.interaction(prompt, response)
 
 def main():
     ai = MistralEngine()
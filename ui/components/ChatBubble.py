@@ -1,28 +1,60 @@
 # ui/components/ChatBubble.py
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
 from kivy.properties import StringProperty, BooleanProperty
 
-class ChatBubble(BoxLayout):
+BUBBLE_PADDING = 10
+BUBBLE_WIDTH_HINT = 0.8
+BUBBLE_FONT_SIZE = 16
+
+
+class ChatBubble(RecycleDataViewBehavior, BoxLayout):
+    """
+    Пузырь сообщения. Годится и как самостоятельный виджет, и как viewclass
+    для RecycleView (см. ChatHistory) — тогда экземпляры переиспользуются.
+    """
     text = StringProperty("")
     is_user = BooleanProperty(False)
 
-    def __init__(self, text, is_user=False, **kwargs):
-        super().__init__(orientation="horizontal", padding=10, spacing=5, **kwargs)
+    def __init__(self, text="", is_user=False, **kwargs):
+        super().__init__(orientation="horizontal", padding=BUBBLE_PADDING, spacing=5, **kwargs)
         self.text = text
         self.is_user = is_user
+        self.size_hint_y = None
+        self._recycled = False
         self.build_ui()
 
     def build_ui(self):
-        bubble = Label(
+        self.bubble = Label(
             text=self.text,
-            size_hint_x=0.8,
+            size_hint_x=BUBBLE_WIDTH_HINT,
             halign="left" if not self.is_user else "right",
             valign="middle",
             color=(1, 1, 1, 1),
-            font_size=16
+            font_size=BUBBLE_FONT_SIZE
         )
-        bubble.text_size = (bubble.width, None)
-        self.add_widget(bubble)
-        self.size_hint_y = None
-        self.height = bubble.texture_size[1] + 20
+        # Перенос по ширине и высота — после layout, а не в момент создания
+        self.bubble.bind(width=lambda inst, w: setattr(inst, "text_size", (w, None)))
+        self.bubble.bind(texture_size=self._on_texture_size)
+        self.add_widget(self.bubble)
+
+    def _on_texture_size(self, inst, size):
+        if self._recycled:
+            return  # высоту задаёт RecycleView из кэша
+        self.height = size[1] + 2 * BUBBLE_PADDING
+
+    def on_text(self, inst, value):
+        if hasattr(self, "bubble"):
+            self.bubble.text = value
+
+    def on_is_user(self, inst, value):
+        if hasattr(self, "bubble"):
+            self.bubble.halign = "right" if value else "left"
+
+    def refresh_view_attrs(self, rv, index, data):
+        # RecycleView сам выставит высоту из data["size"] — берём её из кэша ChatHistory
+        self._recycled = True
+        self.text = data.get("text", "")
+        self.is_user = data.get("is_user", False)
+        return super().refresh_view_attrs(rv, index, data)
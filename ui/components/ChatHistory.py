@@ -0,0 +1,88 @@
+# ui/components/ChatHistory.py
+from collections import OrderedDict
+from itertools import count
+
+from kivy.core.text import Label as CoreLabel
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+
+from ui.components.ChatBubble import (
+    ChatBubble,
+    BUBBLE_PADDING,
+    BUBBLE_WIDTH_HINT,
+    BUBBLE_FONT_SIZE,
+)
+
+HEIGHT_CACHE_SIZE = 4096
+
+
+class ChatHistory(RecycleView):
+    """
+    Виртуализированная история чата: живут только видимые ChatBubble,
+    при прокрутке они переиспользуются. Высота каждого сообщения считается
+    один раз (CoreLabel без виджета) и кэшируется по (msg_id, ширина).
+    """
+    def __init__(self, cache_size: int = HEIGHT_CACHE_SIZE, **kwargs):
+        super().__init__(**kwargs)
+        self._ids = count()
+        self._heights: "OrderedDict[tuple, float]" = OrderedDict()
+        self._cache_size = cache_size
+        self._text_width = 0
+
+        layout = RecycleBoxLayout(
+            orientation="vertical",
+            size_hint_y=None,
+            default_size_hint=(1, None),
+            key_size="size",
+            spacing=4,
+        )
+        layout.bind(minimum_height=layout.setter("height"))
+        self.add_widget(layout)
+        self.viewclass = ChatBubble
+        self.bind(width=self._on_width)
+
+    # --- публичный API ---
+    def add_message(self, text: str, is_user: bool = False, msg_id=None):
+        msg_id = next(self._ids) if msg_id is None else msg_id
+        self.data.append({
+            "msg_id": msg_id,
+            "text": text,
+            "is_user": is_user,
+            "size": (0, self._height_for(msg_id, text)),
+        })
+        self.scroll_y = 0
+        return msg_id
+
+    def clear(self):
+        self.data = []
+        self._heights.clear()
+
+    # --- кэш высот ---
+    def _height_for(self, msg_id, text: str) -> float:
+        key = (msg_id, self._text_width)
+        h = self._heights.get(key)
+        if h is not None:
+            self._heights.move_to_end(key)
+            return h
+        h = self._measure(text) + 2 * BUBBLE_PADDING
+        self._heights[key] = h
+        if len(self._heights) > self._cache_size:
+            self._heights.popitem(last=False)
+        return h
+
+    def _measure(self, text: str) -> float:
+        width = self._text_width or None
+        lbl = CoreLabel(text=text, font_size=BUBBLE_FONT_SIZE, text_size=(width, None))
+        lbl.refresh()
+        return lbl.texture.size[1] if lbl.texture else 0
+
+    def _on_width(self, inst, width):
+        text_width = int(max(width - 2 * BUBBLE_PADDING, 0) * BUBBLE_WIDTH_HINT)
+        if text_width == self._text_width:
+            return
+        # Ширина изменилась — старые высоты больше не верны
+        self._text_width = text_width
+        self._heights.clear()
+        for item in self.data:
+            item["size"] = (0, self._height_for(item["msg_id"], item["text"]))
+        self.refresh_from_data()